@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Event
+from .models import Event, CalendarSubscription, RecurrenceException
+
+
+class RecurrenceExceptionInline(admin.TabularInline):
+    model = RecurrenceException
+    extra = 0
+    fields = ('original_start', 'is_cancelled', 'start_datetime', 'end_datetime', 'title', 'description')
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
@@ -7,6 +13,8 @@ class EventAdmin(admin.ModelAdmin):
     list_filter = ('event_type', 'start_datetime', 'is_all_day', 'photographer')
     search_fields = ('title', 'description')
     date_hierarchy = 'start_datetime'
+    readonly_fields = ('recurrence_end',)
+    inlines = (RecurrenceExceptionInline,)
     fieldsets = (
         (None, {
             'fields': ('photographer', 'title', 'event_type', 'description')
@@ -14,6 +22,9 @@ class EventAdmin(admin.ModelAdmin):
         ('Время', {
             'fields': ('start_datetime', 'end_datetime', 'is_all_day')
         }),
+        ('Повторение', {
+            'fields': ('recurrence_rule', 'recurrence_end')
+        }),
         ('Связи', {
             'fields': ('client', 'studio')
         }),
@@ -48,6 +59,12 @@ class EventAdmin(admin.ModelAdmin):
         if db_field.name == "studio" and not request.user.is_superuser:
             # Показываем публичные студии и студии, созданные пользователем
             from studios.models import Studio
-            kwargs["queryset"] = Studio.objects.filter(is_public=True) | Studio.objects.filter(created_by=request.user)
+            kwargs["queryset"] = Studio.objects.visible_to(request.user)
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
+
+@admin.register(CalendarSubscription)
+class CalendarSubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('photographer', 'created_at')
+    search_fields = ('photographer__email', 'photographer__last_name')
+    readonly_fields = ('token', 'created_at')
@@ -0,0 +1,139 @@
+"""
+Список событий (повестка) с постраничной навигацией по ключу.
+
+Страница выбирается условием по (start_datetime, id) от последней строки
+предыдущей страницы, а не OFFSET, поэтому стоимость страницы не зависит от
+того, насколько далеко пролистан список; запрос идет по индексу
+event_agenda (photographer, start_datetime, id). Клиент и студия
+подтягиваются тем же запросом через JOIN.
+
+Серии показываются одной строкой. Серия, начавшаяся раньше и еще не
+закончившаяся, в предстоящих стоит по дате следующего вхождения: такие
+серии читаются отдельным запросом целиком (их у фотографа немного), их
+ключ считается по правилу, и они сливаются со страницей остальных событий.
+"""
+from datetime import datetime
+from itertools import chain
+
+from django.core import signing
+from django.db.models import Q
+from django.utils import timezone
+
+from .feed import get_detail_url_template
+from .models import Event
+from .recurrence import build_rrule, get_duration
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+CURSOR_SALT = 'calendar.agenda'
+
+AGENDA_FIELDS = (
+    'id', 'title', 'event_type', 'start_datetime', 'end_datetime', 'is_all_day', 'color', 'recurrence_rule',
+    'client__id', 'client__first_name', 'client__last_name', 'studio__id', 'studio__name',
+)
+
+
+def dump_cursor(event):
+    """
+    Курсор после события; для одной и той же строки всегда один и тот же
+    """
+    return signing.Signer(salt=CURSOR_SALT).sign_object([event.start_datetime.isoformat(), event.pk])
+
+
+def load_cursor(cursor):
+    """
+    Ключ (start_datetime, id) из курсора или None, если курсор поврежден
+    """
+    try:
+        start, pk = signing.Signer(salt=CURSOR_SALT).unsign_object(cursor)
+        return datetime.fromisoformat(start), int(pk)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def get_events_queryset(user, client_id=None, studio_id=None, event_type=None):
+    queryset = Event.objects.filter(photographer=user).select_related('client', 'studio').only(*AGENDA_FIELDS)
+    if client_id:
+        queryset = queryset.filter(client_id=client_id)
+    if studio_id:
+        queryset = queryset.filter(studio_id=studio_id)
+    if event_type:
+        queryset = queryset.filter(event_type=event_type)
+    return queryset
+
+
+def get_agenda_queryset(user, scope='upcoming', client_id=None, studio_id=None, event_type=None, now=None):
+    """
+    События фотографа в порядке повестки: предстоящие по возрастанию даты, прошедшие по убыванию
+    """
+    now = now or timezone.now()
+    queryset = get_events_queryset(user, client_id, studio_id, event_type)
+    if scope == 'past':
+        return queryset.filter(start_datetime__lt=now).order_by('-start_datetime', '-id')
+    return queryset.filter(start_datetime__gte=now).order_by('start_datetime', 'id')
+
+
+def get_ongoing_series(user, client_id=None, studio_id=None, event_type=None, now=None):
+    """
+    Серии, начавшиеся до now и еще не закончившиеся. start_datetime и
+    end_datetime каждой заменены следующим вхождением - ключом в повестке
+    """
+    now = now or timezone.now()
+    queryset = get_events_queryset(user, client_id, studio_id, event_type).filter(
+        Q(recurrence_end__isnull=True) | Q(recurrence_end__gte=now),
+        start_datetime__lt=now,
+    ).exclude(recurrence_rule='')
+    series = []
+    for event in queryset:
+        duration = get_duration(event.start_datetime, event.end_datetime)
+        next_start = build_rrule(event.recurrence_rule, event.start_datetime).after(now, inc=True)
+        if next_start is None:
+            continue
+        event.start_datetime = next_start
+        event.end_datetime = next_start + duration if event.end_datetime else None
+        series.append(event)
+    return series
+
+
+def get_agenda_page(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, descending=False, series=()):
+    """
+    Возвращает (события страницы, курсор следующей страницы или None).
+    Условие по start_datetime продублировано отдельно, чтобы индекс
+    ограничивал диапазон, а OR по id проверялся только на его границе.
+    series - идущие серии из get_ongoing_series, они сливаются с queryset
+    """
+    key = load_cursor(cursor) if cursor else None
+    if key is not None:
+        start, pk = key
+        if descending:
+            queryset = queryset.filter(Q(start_datetime__lt=start) | Q(id__lt=pk), start_datetime__lte=start)
+        else:
+            queryset = queryset.filter(Q(start_datetime__gt=start) | Q(id__gt=pk), start_datetime__gte=start)
+            series = [event for event in series if (event.start_datetime, event.pk) > key]
+    events = list(queryset[:page_size + 1])
+    if series:
+        events = sorted(chain(events, series), key=lambda event: (event.start_datetime, event.pk))[:page_size + 1]
+    next_cursor = dump_cursor(events[page_size - 1]) if len(events) > page_size else None
+    return events[:page_size], next_cursor
+
+
+def serialize_agenda_event(event, url_template):
+    return {
+        'id': event.pk,
+        'title': event.title,
+        'event_type': event.event_type,
+        'start': event.start_datetime,
+        'end': event.end_datetime,
+        'allDay': event.is_all_day,
+        'color': event.color,
+        'recurring': bool(event.recurrence_rule),
+        'url': url_template % event.pk,
+        'client': {'id': event.client.pk, 'name': event.client.get_full_name()} if event.client else None,
+        'studio': {'id': event.studio.pk, 'name': event.studio.name} if event.studio else None,
+    }
+
+
+def serialize_agenda(events):
+    url_template = get_detail_url_template()
+    return [serialize_agenda_event(event, url_template) for event in events]
@@ -6,3 +6,5 @@ class CalendarAppConfig(AppConfig):
     name = 'calendar_app'
     verbose_name = 'Календарь'
 
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,242 @@
+"""
+Проверка двойного бронирования.
+
+Пересечение бронирований одной студии запрещено ограничением
+event_studio_no_overlap (tstzrange + GiST), поэтому гарантируется базой даже
+при одновременном сохранении. Формы заранее ищут конфликтующее событие,
+чтобы назвать его в сообщении об ошибке; пересечение съемок одного
+фотографа проверяется только формами. Индекс используется, только если
+выражение слева от && совпадает с выражением индекса: студии ищутся по
+booking_interval() ('[)', индекс ограничения event_studio_no_overlap), съемки
+фотографа - по event_interval() ('[]', индекс event_photographer_interval).
+Границы интервала справа ('()' для съемок: встык - не пересечение) на выбор
+индекса не влияют. Стоимость проверки не зависит от размера таблицы.
+
+У бронирования студии всегда есть окончание (ограничение
+event_studio_booking_end): пустой интервал [начало, начало) ни с чем не
+пересекается и прошел бы любую проверку.
+
+Вхождения серий не хранятся в строках, поэтому ограничение их не видит.
+Формы проверяют их сами в обе стороны: одиночное событие сравнивается с
+вхождениями серий, развернутыми в его интервале, а новая серия - своими
+вхождениями на SERIES_CHECK_DAYS вперед с одиночными событиями и
+вхождениями других серий.
+"""
+from datetime import timedelta
+
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Event, RecurrenceException, TsTzRange, booking_interval, event_interval
+from .recurrence import get_duration, get_exceptions_filter, iter_occurrences
+
+STUDIO_CONSTRAINT = 'event_studio_no_overlap'
+
+# На сколько дней вперед вхождения новой серии проверяются на пересечения
+SERIES_CHECK_DAYS = 366
+
+
+def get_booking_intervals(start_datetime, end_datetime, recurrence_rule='', exclude_pk=None):
+    """
+    Интервалы проверяемого события: само событие или вхождения серии на
+    SERIES_CHECK_DAYS вперед (с исключениями, если серия уже сохранена)
+    """
+    if not recurrence_rule:
+        return [(start_datetime, end_datetime)]
+    window_end = start_datetime + timedelta(days=SERIES_CHECK_DAYS)
+    exceptions = []
+    if exclude_pk is not None:
+        duration = get_duration(start_datetime, end_datetime)
+        exceptions = RecurrenceException.objects.filter(
+            get_exceptions_filter(start_datetime, window_end, duration), event_id=exclude_pk,
+        )
+    series = {
+        'recurrence_rule': recurrence_rule, 'start_datetime': start_datetime, 'end_datetime': end_datetime,
+        'title': '', 'description': '',
+    }
+    return [
+        (occurrence.start_datetime, occurrence.end_datetime)
+        for occurrence in iter_occurrences(series, start_datetime, window_end, exceptions)
+    ]
+
+
+def find_conflict(events, intervals, interval, bounds, exclude_pk=None):
+    """
+    Первое событие из events, пересекающееся с одним из интервалов.
+    Одиночные события ищутся индексным запросом по выражению interval,
+    серии - разворачиванием вхождений в пределах интервалов. Для вхождения
+    серии возвращается серия с датами этого вхождения
+    """
+    # Пустой интервал ни с чем не пересекается
+    intervals = sorted((start, end) for start, end in intervals if end is not None and end > start)
+    if not intervals:
+        return None
+    if exclude_pk is not None:
+        events = events.exclude(pk=exclude_pk)
+    window_start = intervals[0][0]
+    window_end = max(end for start, end in intervals)
+
+    def overlaps(start, end):
+        return any(start < other_end and other_start < end for other_start, other_end in intervals)
+
+    single = events.alias(booking=interval).filter(
+        recurrence_rule='', booking__overlap=DateTimeTZRange(window_start, window_end, bounds),
+    ).order_by('start_datetime')
+    if len(intervals) == 1:
+        conflict = single.first()
+        if conflict is not None:
+            return conflict
+    else:
+        for conflict in single.iterator():
+            if overlaps(conflict.start_datetime, conflict.end_datetime or conflict.start_datetime):
+                return conflict
+
+    series = list(events.exclude(recurrence_rule='').filter(
+        Q(recurrence_end__isnull=True) | Q(recurrence_end__gt=window_start), start_datetime__lt=window_end,
+    ))
+    if not series:
+        return None
+    duration = max(get_duration(event.start_datetime, event.end_datetime) for event in series)
+    exceptions = {}
+    rows = RecurrenceException.objects.filter(
+        get_exceptions_filter(window_start, window_end, duration), event__in=series,
+    )
+    for exception in rows:
+        exceptions.setdefault(exception.event_id, []).append(exception)
+    conflicts = []
+    for event in series:
+        for occurrence in iter_occurrences(event, window_start, window_end, exceptions.get(event.pk, ())):
+            if overlaps(occurrence.start_datetime, occurrence.end_datetime):
+                # Объект не сохраняется: даты нужны только для сообщения об ошибке
+                event.start_datetime, event.end_datetime = occurrence.start_datetime, occurrence.end_datetime
+                conflicts.append(event)
+                break
+    return min(conflicts, key=lambda event: event.start_datetime, default=None)
+
+
+def find_studio_conflict(studio_id, start_datetime, end_datetime, exclude_pk=None, recurrence_rule=''):
+    """
+    Событие той же студии, пересекающееся с [start_datetime, end_datetime)
+    (для серии - с одним из ее вхождений), или None
+    """
+    return find_conflict(
+        Event.objects.filter(studio_id=studio_id),
+        get_booking_intervals(start_datetime, end_datetime, recurrence_rule, exclude_pk),
+        booking_interval(), '[)', exclude_pk,
+    )
+
+
+def find_photographer_conflict(photographer_id, start_datetime, end_datetime, exclude_pk=None, recurrence_rule=''):
+    """
+    Съемка того же фотографа, пересекающаяся с (start_datetime, end_datetime)
+    (для серии - с одним из ее вхождений), или None
+    """
+    # Открытый интервал: съемки, идущие встык, не конфликтуют
+    return find_conflict(
+        Event.objects.filter(photographer_id=photographer_id, event_type='photoshoot'),
+        get_booking_intervals(start_datetime, end_datetime, recurrence_rule, exclude_pk),
+        event_interval(), '()', exclude_pk,
+    )
+
+
+def moved_booking_interval(delta):
+    """
+    Интервал бронирования события, перенесенного на delta
+    """
+    return TsTzRange(
+        F('start_datetime') + delta, Coalesce(F('end_datetime'), F('start_datetime')) + delta, Value('[)'),
+    )
+
+
+def moved_event_interval(delta):
+    """
+    Открытый интервал события, перенесенного на delta, для проверки съемок
+    фотографа: съемки, идущие встык, не конфликтуют
+    """
+    return TsTzRange(
+        F('start_datetime') + delta, Coalesce(F('end_datetime'), F('start_datetime')) + delta, Value('()'),
+    )
+
+
+def find_bulk_conflicts(event_ids, delta=timedelta(0), studio_id=None):
+    """
+    Пересечения после переноса событий event_ids на delta и, если задана
+    studio_id, переноса их в эту студию. Все события проверяются одним
+    запросом: с остальными событиями студии, при переносе съемок - с
+    остальными съемками того же фотографа (индекс event_photographer_interval),
+    при смене студии - друг с другом (при сдвиге на общее delta события
+    выборки между собой не пересекутся). Возвращает список пар (событие,
+    конфликтующее событие)
+    """
+    moved = Event.objects.filter(pk__in=event_ids, recurrence_rule='').alias(
+        new_booking=moved_booking_interval(delta),
+    )
+    if studio_id is None:
+        target_studio = OuterRef('studio_id')
+    else:
+        target_studio = studio_id
+    others = Event.objects.alias(booking=booking_interval()).filter(
+        studio_id=target_studio,
+        recurrence_rule='',
+        booking__overlap=OuterRef('new_booking'),
+    ).exclude(pk__in=event_ids)
+    conflict = Subquery(others.order_by('start_datetime').values('pk')[:1])
+    if studio_id is not None:
+        siblings = Event.objects.filter(pk__in=event_ids, recurrence_rule='').alias(
+            new_booking=moved_booking_interval(delta),
+        ).filter(new_booking__overlap=OuterRef('new_booking')).exclude(pk=OuterRef('pk'))
+        conflict = Coalesce(conflict, Subquery(siblings.order_by('start_datetime').values('pk')[:1]))
+    if delta:
+        moved = moved.alias(new_interval=moved_event_interval(delta))
+        shoots = Event.objects.alias(interval=event_interval()).filter(
+            photographer_id=OuterRef('photographer_id'),
+            event_type='photoshoot',
+            recurrence_rule='',
+            interval__overlap=OuterRef('new_interval'),
+        ).exclude(pk__in=event_ids)
+        conflict = Coalesce(conflict, Case(When(
+            event_type='photoshoot', then=Subquery(shoots.order_by('start_datetime').values('pk')[:1]),
+        )))
+    elif studio_id is None:
+        moved = moved.filter(studio__isnull=False)
+
+    pairs = list(
+        moved.annotate(conflict_id=conflict).filter(conflict_id__isnull=False)
+        .order_by('start_datetime').values_list('pk', 'conflict_id')
+    )
+    if not pairs:
+        return []
+    events = Event.objects.in_bulk({pk for pair in pairs for pk in pair})
+    conflicts, seen = [], set()
+    for pk, conflict_id in pairs:
+        # Пересечение двух событий выборки достаточно назвать один раз
+        if frozenset((pk, conflict_id)) not in seen:
+            seen.add(frozenset((pk, conflict_id)))
+            conflicts.append((events[pk], events[conflict_id]))
+    return conflicts
+
+
+def describe_conflict(event, user):
+    """
+    Текст ошибки о конфликтующем событии. Название показывается только для
+    событий user: в общей студии конфликт бывает с чужой съемкой, и о ней
+    сообщается только занятое время
+    """
+    start = timezone.localtime(event.start_datetime)
+    end = timezone.localtime(event.end_datetime or event.start_datetime)
+    if start.date() == end.date():
+        period = f'{start:%d.%m.%Y %H:%M}–{end:%H:%M}'
+    else:
+        period = f'{start:%d.%m.%Y %H:%M} – {end:%d.%m.%Y %H:%M}'
+    if event.photographer_id != getattr(user, 'pk', user):
+        return f'Студия занята в это время ({period})'
+    return f'Время пересекается с событием «{event.title}» ({period})'
+
+
+def is_studio_conflict_error(error):
+    """
+    Нарушено ли ограничение на пересечение бронирований студии
+    """
+    return STUDIO_CONSTRAINT in str(error)
@@ -0,0 +1,208 @@
+"""
+Массовые операции над событиями: перенос, смена студии, смена цвета и удаление.
+
+Изменение применяется к выбранным событиям одним UPDATE в одной
+транзакции. UPDATE обходит сигналы Event, поэтому то, что они
+поддерживают, обновляется здесь один раз на всю операцию: версия
+синхронизации, дата изменения и сброс напоминания пишутся тем же UPDATE,
+сводка загрузки студий - одним пакетным upsert приращений, статистика
+съемок клиентов - одним UPDATE по затронутым клиентам, кэш ленты
+сбрасывается один раз, а открытые вкладки получают одно сообщение refetch.
+
+Пересечения бронирований студии и, при переносе, съемок фотографа
+проверяются для всех событий одним запросом до изменения
+(find_bulk_conflicts); ограничение
+event_studio_no_overlap проверяется в конце оператора, поэтому события,
+идущие встык, переносятся вместе без ложных конфликтов.
+
+Серии переносятся через save(): от их начала зависят окончание повторений
+и материализованные вхождения. Вхождения серий ограничение не видит, поэтому
+каждая выбранная серия после изменения проверяется так же, как в форме
+события (find_studio_conflict / find_photographer_conflict по правилу
+повторения); при пересечении транзакция откатывается целиком. Студия
+назначается только съемкам.
+
+Удаление идет через QuerySet.delete() ради каскада на исключения и
+вхождения, но внутри bulk_delete(): сигналы по каждой строке пропускаются,
+а записи об удалении для синхронизации вставляются одним bulk_create,
+сводка и статистика обновляются как при остальных операциях.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .booking import describe_conflict, find_bulk_conflicts, find_photographer_conflict, find_studio_conflict
+from .client_stats import update_events_client_stats
+from .live import publish
+from .models import Event
+from .occupancy import apply_occupancy, booking_state, get_occupancy_deltas
+from .signals import bulk_delete, invalidate_feeds
+from sync.changes import record_tombstones
+from sync.fields import NextSyncVersion
+
+BULK_OPERATIONS = ('shift', 'studio', 'color', 'delete')
+
+# Больше событий за одну операцию не меняем
+MAX_BULK_EVENTS = 2000
+
+# Сколько пересечений называть пользователю
+MAX_REPORTED_CONFLICTS = 10
+
+BULK_FIELDS = ('id', 'studio_id', 'client_id', 'event_type', 'start_datetime', 'end_datetime', 'recurrence_rule')
+
+
+class BulkOperationError(Exception):
+    """
+    Операция не применена; messages - причины для пользователя
+    """
+    def __init__(self, messages):
+        super().__init__('; '.join(messages))
+        self.messages = messages
+
+
+def raise_conflicts(user, conflicts):
+    """
+    Вызывает BulkOperationError с описанием пар (событие, конфликтующее событие), если они есть
+    """
+    if not conflicts:
+        return
+    messages = [
+        f'«{event.title}»: {describe_conflict(conflict, user)}' for event, conflict in conflicts[:MAX_REPORTED_CONFLICTS]
+    ]
+    if len(conflicts) > MAX_REPORTED_CONFLICTS:
+        messages.append(f'И еще пересечений: {len(conflicts) - MAX_REPORTED_CONFLICTS}')
+    raise BulkOperationError(messages)
+
+
+def check_conflicts(user, events, delta=timedelta(0), studio_id=None):
+    """
+    Вызывает BulkOperationError, если после операции пересекутся бронирования студии или съемки фотографа
+    """
+    event_ids = [event.pk for event in events if not event.recurrence_rule]
+    raise_conflicts(user, find_bulk_conflicts(event_ids, delta, studio_id))
+
+
+def check_series_conflicts(user, series, photographer=True):
+    """
+    Вызывает BulkOperationError, если вхождения уже измененных серий пересекаются
+    с другими событиями. Проверка та же, что у серии в EventForm.check_conflicts;
+    события выборки к этому моменту тоже изменены, поэтому сравниваются новые
+    положения. photographer=False - только студия (время серий не менялось)
+    """
+    conflicts = []
+    for event in series:
+        conflict = None
+        if event.studio_id is not None:
+            conflict = find_studio_conflict(
+                event.studio_id, event.start_datetime, event.end_datetime, event.pk, event.recurrence_rule
+            )
+        if conflict is None and photographer and event.event_type == 'photoshoot':
+            conflict = find_photographer_conflict(
+                event.photographer_id, event.start_datetime, event.end_datetime, event.pk, event.recurrence_rule
+            )
+        if conflict is not None:
+            conflicts.append((event, conflict))
+    raise_conflicts(user, conflicts)
+
+
+def shift_event(event, delta):
+    event.start_datetime += delta
+    if event.end_datetime is not None:
+        event.end_datetime += delta
+
+
+def move_occupancy(events, change):
+    """
+    Переносит вклад событий в сводку загрузки одним upsert.
+    change изменяет событие в памяти так же, как UPDATE изменил строку
+    """
+    deltas = Counter()
+    for event in events:
+        deltas.update(get_occupancy_deltas(booking_state(event), sign=-1))
+        change(event)
+        deltas.update(get_occupancy_deltas(booking_state(event)))
+    apply_occupancy(deltas)
+
+
+def shift_series(event_ids, delta):
+    """
+    Переносит серии по одной: save() пересчитывает окончание повторений,
+    а сигналы сбрасывают материализованные вхождения. Возвращает серии
+    """
+    series = list(Event.objects.filter(pk__in=event_ids))
+    for event in series:
+        shift_event(event, delta)
+        event.save()
+    return series
+
+
+def apply_bulk_operation(user, queryset, operation, delta=None, studio=None, color=None):
+    """
+    Применяет операцию к событиям queryset (только события user).
+    Возвращает число затронутых событий. При пересечении бронирований или
+    слишком большой выборке ничего не меняет и вызывает BulkOperationError
+    """
+    if operation not in BULK_OPERATIONS:
+        raise ValueError(f'Неизвестная операция: {operation}')
+    with transaction.atomic():
+        events = list(
+            queryset.filter(photographer=user).select_for_update(of=('self',)).only(*BULK_FIELDS).order_by()
+        )
+        if len(events) > MAX_BULK_EVENTS:
+            raise BulkOperationError([f'Можно изменить не больше {MAX_BULK_EVENTS} событий за раз'])
+        if not events:
+            return 0
+        event_ids = [event.pk for event in events]
+
+        if operation == 'delete':
+            with bulk_delete():
+                Event.objects.filter(pk__in=event_ids).delete()
+            record_tombstones(Event, event_ids, user.pk)
+            move_occupancy(events, lambda event: setattr(event, 'studio_id', None))
+            update_events_client_stats(events)
+            invalidate_feeds(user.pk)
+            transaction.on_commit(lambda: publish(user.pk, {'type': 'refetch'}))
+            return len(event_ids)
+
+        changes = {'updated_at': timezone.now(), 'sync_version': NextSyncVersion()}
+        if operation == 'shift':
+            check_conflicts(user, events, delta=delta)
+            series_ids = [event.pk for event in events if event.recurrence_rule]
+            events = [event for event in events if not event.recurrence_rule]
+            changes.update(
+                start_datetime=F('start_datetime') + delta,
+                end_datetime=F('end_datetime') + delta,
+                reminder_sent_at=None,
+            )
+        elif operation == 'studio':
+            studio_id = studio.pk if studio else None
+            if studio_id is not None:
+                posts = sum(1 for event in events if event.event_type != 'photoshoot')
+                if posts:
+                    raise BulkOperationError([f'Студию можно указать только у съемок, выбрано других событий: {posts}'])
+                open_ended = sum(1 for event in events if event.end_datetime is None)
+                if open_ended:
+                    raise BulkOperationError([f'Студию нельзя указать у событий без окончания: {open_ended}'])
+                check_conflicts(user, events, studio_id=studio_id)
+            changes['studio_id'] = studio_id
+        else:
+            changes['color'] = color
+
+        Event.objects.filter(pk__in=[event.pk for event in events]).update(**changes)
+        if operation == 'shift':
+            move_occupancy(events, lambda event: shift_event(event, delta))
+            check_series_conflicts(user, shift_series(series_ids, delta))
+        elif operation == 'studio':
+            move_occupancy(events, lambda event: setattr(event, 'studio_id', studio_id))
+            if studio_id is not None:
+                series_ids = [event.pk for event in events if event.recurrence_rule]
+                check_series_conflicts(user, Event.objects.filter(pk__in=series_ids), photographer=False)
+        if operation in ('shift', 'studio'):
+            update_events_client_stats(events)
+
+        invalidate_feeds(user.pk)
+        transaction.on_commit(lambda: publish(user.pk, {'type': 'refetch'}))
+    return len(event_ids)
@@ -0,0 +1,96 @@
+"""
+Кэш ленты календаря.
+
+Готовые JSON-ответы ленты хранятся в отдельном кэше (алиас calendar_feed в
+settings.CACHES) под ключом, включающим счетчик поколений фотографа. Сигналы
+увеличивают счетчик при изменении событий, а также при переименовании
+клиентов и студий, чьи имена денормализованы в ленту; старые записи после
+этого просто перестают запрашиваться и вытесняются по TTL или размеру кэша.
+"""
+import time
+
+from django.core.cache import caches
+
+FEED_CACHE_ALIAS = 'calendar_feed'
+
+FEED_GENERATION_KEY = 'calendar:feed-generation:%s'
+
+# Сколько секунд другие запросы ждут, пока первый промах пересобирает запись
+REBUILD_LOCK_TIMEOUT = 10
+REBUILD_POLL_INTERVAL = 0.05
+
+
+def get_feed_cache():
+    return caches[FEED_CACHE_ALIAS]
+
+
+def get_feed_generation(user_id):
+    """
+    Возвращает счетчик поколений ленты фотографа.
+    Если значения нет в кэше, оно инициализируется текущим временем в
+    миллисекундах, поэтому потеря ключа никогда не возвращает старое значение.
+    """
+    cache = get_feed_cache()
+    key = FEED_GENERATION_KEY % user_id
+    generation = cache.get(key)
+    if generation is None:
+        generation = int(time.time() * 1000)
+        if not cache.add(key, generation, timeout=None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def bump_feed_generation(*user_ids):
+    """
+    Увеличивает счетчики поколений лент фотографов
+    """
+    cache = get_feed_cache()
+    now = int(time.time() * 1000)
+    cache.set_many({
+        FEED_GENERATION_KEY % user_id: max(now, get_feed_generation(user_id) + 1)
+        for user_id in set(user_ids)
+    }, timeout=None)
+
+
+def get_feed_cache_key(user_id, event_types, start, end):
+    """
+    Ключ записи ленты: фотограф, поколение, типы событий и окно
+    """
+    return 'calendar:feed:%s:%s:%s:%s:%s' % (
+        user_id,
+        get_feed_generation(user_id),
+        ','.join(sorted(event_types)) or 'all',
+        start.isoformat(),
+        end.isoformat(),
+    )
+
+
+def get_or_build(key, build, cache=None):
+    """
+    Возвращает значение из кэша или строит его вызовом build().
+
+    Защита от лавины промахов: пересобирает запись только запрос, захвативший
+    блокировку через cache.add(); остальные ждут появления записи и строят ее
+    сами, только если ожидание превысило REBUILD_LOCK_TIMEOUT.
+    """
+    cache = cache or get_feed_cache()
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=REBUILD_LOCK_TIMEOUT):
+        try:
+            value = build()
+            cache.set(key, value)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + REBUILD_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    return build()
@@ -0,0 +1,46 @@
+"""
+Проверки настроек календаря (manage.py check и запуск сервера).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from .cache import FEED_CACHE_ALIAS
+from .reminders import MAX_BIRTHDAY_REMINDER_DAYS
+
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+@register(Tags.caches)
+def check_feed_cache(app_configs, **kwargs):
+    """
+    Счетчик поколений и готовые ответы ленты должны лежать в общем кэше: в
+    локальной памяти сброс в одном процессе не виден остальным, и они
+    продолжают отдавать старую ленту и 304 по старому ETag
+    """
+    backend = settings.CACHES.get(FEED_CACHE_ALIAS, {}).get('BACKEND')
+    if settings.DEBUG or backend != LOCAL_CACHE_BACKEND:
+        return []
+    return [Warning(
+        'Кэш ленты календаря (%s) хранится в локальной памяти процесса.' % FEED_CACHE_ALIAS,
+        hint=(
+            'При нескольких процессах сервера задайте общий кэш: '
+            'CALENDAR_FEED_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache.'
+        ),
+        id='calendar_app.W001',
+    )]
+
+
+@register()
+def check_birthday_reminder_days(app_configs, **kwargs):
+    """
+    Период напоминаний о днях рождения короче года, иначе send_reminders
+    выбирал бы одних и тех же клиентов по диапазонам двух лет
+    """
+    days = settings.CLIENT_BIRTHDAY_REMINDER_DAYS
+    if 0 <= days <= MAX_BIRTHDAY_REMINDER_DAYS:
+        return []
+    return [Error(
+        'CLIENT_BIRTHDAY_REMINDER_DAYS=%s вне допустимого диапазона.' % days,
+        hint='Задайте число дней от 0 до %s.' % MAX_BIRTHDAY_REMINDER_DAYS,
+        id='calendar_app.E001',
+    )]
@@ -0,0 +1,108 @@
+"""
+Статистика съемок клиентов.
+
+Число съемок, последняя и следующая съемка и любимая студия хранятся в
+колонках Client, поэтому список клиентов сортируется и фильтруется по ним
+через индексы, а не подзапросами к Event для каждой строки. При изменении
+событий статистика пересчитывается только для затронутых клиентов одним
+UPDATE с подзапросами по индексу event_client_shoots: сигналы Event
+передают старого и нового клиента события, пакетный импорт и массовые
+операции - всех клиентов порции сразу.
+
+Последняя и следующая съемки зависят от текущего времени: когда следующая
+съемка проходит, статистику клиента обновляет команда
+rebuild_client_stats --due, которая запускается по расписанию.
+
+Повторяющаяся серия считается одной съемкой в момент своего начала: ее
+вхождения не хранятся в строках Event.
+"""
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Event
+from clients.models import Client
+
+SHOOT_TYPE = 'photoshoot'
+
+
+def client_stats_state(event):
+    """
+    Часть события, влияющая на статистику клиента: (клиент, начало, студия) или None
+    """
+    if not event.client_id or event.event_type != SHOOT_TYPE:
+        return None
+    return event.client_id, event.start_datetime, event.studio_id
+
+
+def get_stats_expressions(now):
+    """
+    Выражения колонок статистики для UPDATE клиентов
+    """
+    shoots = Event.objects.filter(client=OuterRef('pk'), event_type=SHOOT_TYPE).order_by()
+    return {
+        'shoot_count': Coalesce(
+            Subquery(shoots.values('client').annotate(count=Count('pk')).values('count')), 0
+        ),
+        'last_shoot_at': Subquery(
+            shoots.filter(start_datetime__lte=now).order_by('-start_datetime').values('start_datetime')[:1]
+        ),
+        'next_shoot_at': Subquery(
+            shoots.filter(start_datetime__gt=now).order_by('start_datetime').values('start_datetime')[:1]
+        ),
+        # Студия, где прошло больше всего съемок; при равенстве - где была самая поздняя
+        'favorite_studio': Subquery(
+            shoots.filter(studio__isnull=False).values('studio')
+            .annotate(count=Count('pk'), last=Max('start_datetime'))
+            .order_by('-count', '-last').values('studio')[:1]
+        ),
+    }
+
+
+def refresh_client_stats(client_ids, now=None):
+    """
+    Пересчитывает статистику клиентов одним UPDATE; возвращает число обновленных клиентов
+    """
+    client_ids = {pk for pk in client_ids if pk}
+    if not client_ids:
+        return 0
+    return Client.objects.filter(pk__in=client_ids).update(**get_stats_expressions(now or timezone.now()))
+
+
+def update_client_stats(old_state, new_state):
+    """
+    Пересчитывает статистику старого и нового клиента события, если событие для нее изменилось
+    """
+    if old_state == new_state:
+        return
+    refresh_client_stats(state[0] for state in (old_state, new_state) if state)
+
+
+def update_events_client_stats(events):
+    """
+    Пересчитывает статистику клиентов событий, измененных без сигналов (bulk_create, UPDATE)
+    """
+    refresh_client_stats(state[0] for state in map(client_stats_state, events) if state)
+
+
+def rebuild_client_stats(photographer_ids=None, due=False, now=None, batch_size=5000):
+    """
+    Пересчитывает статистику порциями клиентов; due - только у клиентов,
+    чья следующая съемка уже прошла. Возвращает число обновленных клиентов
+    """
+    now = now or timezone.now()
+    clients = Client.objects.all()
+    if photographer_ids:
+        clients = clients.filter(photographer_id__in=photographer_ids)
+    if due:
+        clients = clients.filter(next_shoot_at__lte=now)
+
+    count = 0
+    client_ids = list(clients.order_by('pk').values_list('pk', flat=True)[:batch_size])
+    while client_ids:
+        count += refresh_client_stats(client_ids, now=now)
+        # После пересчета due-клиенты выпадают из выборки, поэтому продолжаем по ключу
+        client_ids = list(
+            clients.filter(pk__gt=client_ids[-1]).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+    return count
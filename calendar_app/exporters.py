@@ -0,0 +1,53 @@
+"""
+Потоковая выгрузка событий фотографа в CSV.
+
+Колонки совпадают с колонками импорта (CSV_COLUMNS). Имена клиента и
+студии берутся тем же запросом через LEFT JOIN, а не отдельным запросом на
+строку; события читаются кортежами порциями по EXPORT_CHUNK_SIZE.
+"""
+from django.utils import timezone
+
+from photohub.export import EXPORT_CHUNK_SIZE, iter_csv
+from .importers import CSV_COLUMNS
+from .models import Event
+
+EXPORT_FIELDS = (
+    'title', 'event_type', 'start_datetime', 'end_datetime',
+    'client__first_name', 'client__last_name', 'studio__name',
+    'description', 'is_all_day', 'color', 'recurrence_rule',
+)
+
+
+def get_export_queryset(user, start=None, end=None):
+    """
+    События фотографа, начинающиеся в [start, end), если границы заданы
+    """
+    queryset = Event.objects.filter(photographer=user)
+    if start:
+        queryset = queryset.filter(start_datetime__gte=start)
+    if end:
+        queryset = queryset.filter(start_datetime__lt=end)
+    return queryset.order_by('start_datetime', 'pk').values_list(*EXPORT_FIELDS)
+
+
+def format_datetime(value, all_day):
+    if value is None:
+        return ''
+    value = timezone.localtime(value)
+    return value.strftime('%Y-%m-%d') if all_day else value.strftime('%Y-%m-%d %H:%M')
+
+
+def iter_events_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Строки CSV; время в текущем часовом поясе, у событий на весь день - только даты
+    """
+    rows = (
+        [
+            title, event_type, format_datetime(start, all_day), format_datetime(end, all_day),
+            f'{first_name or ""} {last_name or ""}'.strip(), studio or '',
+            description, 'да' if all_day else '', color, rrule,
+        ]
+        for title, event_type, start, end, first_name, last_name, studio, description, all_day, color, rrule
+        in queryset.iterator(chunk_size=chunk_size)
+    )
+    return iter_csv(CSV_COLUMNS, rows)
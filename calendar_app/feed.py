@@ -0,0 +1,350 @@
+"""
+Формирование ленты событий для FullCalendar.
+
+Все представления календаря строят ленту через этот модуль: один запрос
+с проекцией values() (клиент и студия подтягиваются JOIN'ом), один
+заранее вычисленный шаблон URL и порционное чтение через iterator().
+Количество запросов не зависит от количества событий.
+
+Повторяющиеся события (серии) хранятся одной строкой и разворачиваются во
+вхождения только внутри окна ленты; исключения всех серий окна читаются
+одним дополнительным запросом, материализованные вхождения - еще одним.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Greatest
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .cache import get_feed_cache, get_feed_cache_key, get_feed_generation, get_or_build
+from .models import Event, EventOccurrence, RecurrenceException, event_interval
+from .recurrence import get_duration, get_exceptions_filter, iter_occurrences
+
+# Размер порции при чтении событий из базы
+FEED_CHUNK_SIZE = 2000
+
+# Окно по умолчанию, если FullCalendar не передал start/end
+DEFAULT_WINDOW = timedelta(days=30)
+
+# Наибольшая длина окна: каждая серия разворачивается по всему окну
+MAX_WINDOW = timedelta(days=366)
+
+FeedValidator = namedtuple('FeedValidator', ['etag', 'last_modified'])
+
+FEED_FIELDS = (
+    'id',
+    'title',
+    'event_type',
+    'start_datetime',
+    'end_datetime',
+    'is_all_day',
+    'color',
+    'description',
+    'client__first_name',
+    'client__last_name',
+    'studio__name',
+    'recurrence_rule',
+    'materialized_from',
+    'materialized_until',
+)
+
+
+def parse_event_types(value):
+    """
+    Разбирает список типов событий вида "photoshoot,post".
+    Неизвестные типы отбрасываются, пустое значение означает "все типы".
+    """
+    if not value:
+        return []
+    known = {key for key, label in Event.EVENT_TYPE_CHOICES}
+    types = []
+    for item in value.split(','):
+        item = item.strip()
+        if item in known and item not in types:
+            types.append(item)
+    return types
+
+
+def parse_window_bound(value, default):
+    """
+    Разбирает границу окна из параметров FullCalendar (ISO 8601).
+    Наивные значения считаются заданными в текущем часовом поясе.
+    """
+    if not value:
+        return default
+    value = value.replace('Z', '+00:00')
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        # "+" в смещении часового пояса мог превратиться в пробел при разборе query string
+        try:
+            parsed = datetime.fromisoformat(value.replace(' ', '+'))
+        except ValueError:
+            return default
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def get_feed_window(params):
+    """
+    Возвращает (start, end) окна ленты по GET-параметрам запроса
+    """
+    now = timezone.now()
+    start = parse_window_bound(params.get('start'), now - DEFAULT_WINDOW)
+    end = parse_window_bound(params.get('end'), now + DEFAULT_WINDOW)
+    if end - start > MAX_WINDOW:
+        end = start + MAX_WINDOW
+    return start, end
+
+
+def get_initial_window(now=None):
+    """
+    Возвращает окно, которое встраивается в страницу календаря при первой отрисовке:
+    текущий месяц с запасом на соседние недели, видимые в месячной сетке
+    """
+    now = timezone.localtime(now or timezone.now())
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return month_start - timedelta(days=7), next_month + timedelta(days=14)
+
+
+def filter_overlapping(queryset, start, end, interval=None):
+    """
+    Оставляет события, пересекающиеся с окном [start, end).
+
+    Событие [начало, окончание] попадает в окно, если начало < end и
+    coalesce(окончание, начало) >= start. Условие записано через оператор &&
+    над тем же выражением, что и GiST-индекс event_photographer_interval;
+    дублирующее условие по start_datetime позволяет планировщику выбрать
+    и B-tree индекс event_photographer_type_start. Для выборки по студиям
+    передается interval=booking_interval() - выражение индекса ограничения
+    event_studio_no_overlap (событие, закончившееся ровно в start, тогда не попадает).
+
+    Серии отбираются отдельно (частичный индекс event_series_start): серия
+    началась до конца окна и ее последнее вхождение не закончилось до начала
+    окна. Вхождения разворачиваются уже при сериализации.
+    """
+    single = Q(recurrence_rule='', interval__overlap=DateTimeTZRange(start, end, '[)'))
+    series = ~Q(recurrence_rule='') & (Q(recurrence_end__isnull=True) | Q(recurrence_end__gte=start))
+    return queryset.alias(interval=interval or event_interval()).filter(single | series, start_datetime__lt=end)
+
+
+def get_feed_queryset(user, start=None, end=None, event_types=None):
+    """
+    Возвращает queryset событий фотографа для ленты.
+    Фильтрация по окну выполняется только если переданы обе границы.
+    """
+    queryset = Event.objects.filter(photographer=user)
+    if start is not None and end is not None:
+        queryset = filter_overlapping(queryset, start, end)
+    if event_types:
+        queryset = queryset.filter(event_type__in=event_types)
+    return queryset
+
+
+def get_detail_url_template():
+    """
+    Возвращает шаблон URL страницы события с подстановкой %d вместо pk,
+    чтобы не вызывать reverse() для каждой строки
+    """
+    return reverse('calendar:event_detail', args=[0]).replace('/0/', '/%d/')
+
+
+def format_feed_event(row, url_template, type_labels):
+    """
+    Преобразует строку values() в словарь события FullCalendar
+    """
+    start = row['start_datetime'].isoformat()
+    end = row['end_datetime'].isoformat() if row['end_datetime'] is not None else start
+    if row['client__first_name'] is not None:
+        client = f"{row['client__first_name']} {row['client__last_name']}"
+    else:
+        client = None
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'start': start,
+        'end': end,
+        'allDay': row['is_all_day'],
+        'color': row['color'],
+        'url': url_template % row['id'],
+        'extendedProps': {
+            'event_type': row['event_type'],
+            'event_type_display': type_labels.get(row['event_type'], row['event_type']),
+            'description': row['description'],
+            'client': client,
+            'studio': row['studio__name'],
+        }
+    }
+
+
+def get_series_occurrences(series_rows, start, end):
+    """
+    Возвращает {id серии: [Occurrence, ...]} для вхождений в окне [start, end).
+
+    Серии, у которых материализованный диапазон покрывает окно, читаются из
+    EventOccurrence одним запросом; остальные разворачиваются по правилу,
+    а их исключения читаются одним запросом для всех серий сразу.
+    """
+    occurrences = {row['id']: [] for row in series_rows}
+    materialized = [
+        row['id'] for row in series_rows
+        if row['materialized_from'] is not None
+        and row['materialized_from'] <= start and row['materialized_until'] >= end
+    ]
+    if materialized:
+        rows = EventOccurrence.objects.filter(
+            event_id__in=materialized, start_datetime__lt=end, end_datetime__gte=start
+        ).order_by('start_datetime')
+        for occurrence in rows:
+            occurrences[occurrence.event_id].append(occurrence)
+
+    expanded = [row for row in series_rows if row['id'] not in materialized]
+    if expanded:
+        duration = max(get_duration(row['start_datetime'], row['end_datetime']) for row in expanded)
+        exceptions = {}
+        rows = RecurrenceException.objects.filter(
+            get_exceptions_filter(start, end, duration), event_id__in=[row['id'] for row in expanded]
+        )
+        for exception in rows:
+            exceptions.setdefault(exception.event_id, []).append(exception)
+        for row in expanded:
+            occurrences[row['id']] = sorted(
+                iter_occurrences(row, start, end, exceptions.get(row['id'], ())),
+                key=lambda occurrence: occurrence.start_datetime,
+            )
+    return occurrences
+
+
+def iter_feed_events(queryset, start=None, end=None, chunk_size=FEED_CHUNK_SIZE):
+    """
+    Генератор словарей событий в формате FullCalendar.
+
+    Если задано окно, серии разворачиваются во вхождения после обычных событий;
+    без окна серия отдается одним событием с датами первого вхождения.
+    """
+    url_template = get_detail_url_template()
+    type_labels = {key: str(label) for key, label in Event.EVENT_TYPE_CHOICES}
+    expand = start is not None and end is not None
+
+    series_rows = []
+    rows = queryset.order_by('start_datetime', 'id').values(*FEED_FIELDS)
+    for row in rows.iterator(chunk_size=chunk_size):
+        if expand and row['recurrence_rule']:
+            series_rows.append(row)
+            continue
+        yield format_feed_event(row, url_template, type_labels)
+
+    if not series_rows:
+        return
+    occurrences = get_series_occurrences(series_rows, start, end)
+    for row in series_rows:
+        for occurrence in occurrences[row['id']]:
+            data = format_feed_event(
+                dict(
+                    row,
+                    start_datetime=occurrence.start_datetime,
+                    end_datetime=occurrence.end_datetime,
+                    title=occurrence.title,
+                    description=occurrence.description,
+                ),
+                url_template,
+                type_labels,
+            )
+            data['id'] = f"{row['id']}-{int(occurrence.original_start.timestamp())}"
+            data['groupId'] = row['id']
+            data['extendedProps']['recurring'] = True
+            data['extendedProps']['occurrence_start'] = occurrence.original_start.isoformat()
+            yield data
+
+
+def serialize_feed(queryset, start=None, end=None, chunk_size=FEED_CHUNK_SIZE):
+    """
+    Возвращает список событий в формате FullCalendar
+    """
+    return list(iter_feed_events(queryset, start, end, chunk_size=chunk_size))
+
+
+def get_feed_validator(queryset, user_id):
+    """
+    Возвращает валидаторы ответа ленты (ETag и Last-Modified) без сериализации событий.
+
+    Валидатор строится одним агрегирующим запросом: число событий в окне и
+    максимальная дата обновления события, его клиента и студии (имена клиента
+    и студии попадают в extendedProps). Счетчик поколений учитывает удаления
+    и события, ушедшие из окна.
+    """
+    stats = queryset.aggregate(
+        count=Count('id'),
+        last_modified=Max(Greatest('updated_at', 'client__updated_at', 'studio__updated_at')),
+    )
+    generation = get_feed_generation(user_id)
+    generated_at = datetime.fromtimestamp(generation / 1000, tz=dt_timezone.utc)
+    last_modified = max(stats['last_modified'] or generated_at, generated_at)
+    last_timestamp = int(stats['last_modified'].timestamp() * 1000000) if stats['last_modified'] else 0
+    return FeedValidator(
+        etag=f"{stats['count']}-{last_timestamp}-{generation}",
+        last_modified=last_modified,
+    )
+
+
+class CalendarFeed:
+    """
+    Лента событий фотографа для одного запроса.
+
+    Валидаторы и тело ответа вычисляются лениво: при попадании в кэш не
+    выполняется ни одного запроса к событиям, при промахе сначала считается
+    валидатор, чтобы ответ 304 не требовал сериализации.
+    """
+    def __init__(self, user, start, end, event_types, cacheable=True):
+        self.user = user
+        self.start = start
+        self.end = end
+        self.event_types = event_types
+        self.cacheable = cacheable
+
+    @cached_property
+    def queryset(self):
+        if self.event_types is None:
+            return Event.objects.none()
+        return get_feed_queryset(self.user, self.start, self.end, self.event_types)
+
+    @cached_property
+    def cache_key(self):
+        if not self.cacheable or self.event_types is None:
+            return None
+        return get_feed_cache_key(self.user.pk, self.event_types, self.start, self.end)
+
+    @cached_property
+    def cached(self):
+        """Закэшированная пара (валидатор, тело) или None"""
+        if self.cache_key is None:
+            return None
+        return get_feed_cache().get(self.cache_key)
+
+    @cached_property
+    def validator(self):
+        if self.cached is not None:
+            return self.cached[0]
+        return get_feed_validator(self.queryset, self.user.pk)
+
+    def build(self):
+        events = serialize_feed(self.queryset, self.start, self.end)
+        body = DjangoJSONEncoder(ensure_ascii=False).encode(events).encode()
+        return self.validator, body
+
+    def render(self):
+        """
+        Возвращает JSON-тело ленты в байтах
+        """
+        if self.cached is not None:
+            return self.cached[1]
+        if self.cache_key is None:
+            return self.build()[1]
+        return get_or_build(self.cache_key, self.build)[1]
@@ -1,33 +1,80 @@
 from django import forms
+from django.urls import reverse_lazy
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 
+from .booking import describe_conflict, find_photographer_conflict, find_studio_conflict
 from .models import Event
+from .recurrence import validate_rrule
+from .widgets import AutocompleteSelect
 from clients.models import Client
 from studios.models import Studio
 
+
+def validate_event_period(start_datetime, end_datetime, is_all_day, allow_past=False):
+    """
+    Общие правила проверки времени события для форм и пакетного импорта.
+    Возвращает (start_datetime, end_datetime, errors), где errors - список пар (поле, сообщение)
+    """
+    errors = []
+    if start_datetime and end_datetime:
+        # Если событие на весь день, устанавливаем время начала на 00:00 и время окончания на 23:59
+        if is_all_day:
+            start_datetime = start_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
+            end_datetime = end_datetime.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+        # Проверяем, что дата окончания не раньше даты начала
+        if end_datetime < start_datetime:
+            errors.append(('end_datetime', _('Дата и время окончания не может быть раньше даты и времени начала')))
+
+    if start_datetime and not allow_past:
+        if start_datetime < timezone.now():
+            errors.append(('start_datetime', _('Дата и время начала не может быть раньше даты и времени текущего момента')))
+
+    return start_datetime, end_datetime, errors
+
+
+def clean_recurrence(rule, start_datetime=None):
+    """
+    Нормализует правило повторения (без префикса RRULE:, в верхнем регистре)
+    и проверяет его. Пустое правило означает одиночное событие
+    """
+    rule = (rule or '').strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[len('RRULE:'):]
+    rule = rule.upper()
+    if rule:
+        error = validate_rrule(rule, start_datetime)
+        if error:
+            raise forms.ValidationError(error)
+    return rule
+
+
 class EventForm(forms.ModelForm):
     """
     Форма для создания и редактирования событий
     """
     class Meta:
         model = Event
-        fields = ['title',  'start_datetime', 'end_datetime', 'client', 'studio', 'description', 'is_all_day', 'color']
+        fields = ['title',  'start_datetime', 'end_datetime', 'client', 'studio', 'description', 'is_all_day', 'color',
+                  'recurrence_rule']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Название события'}),
             'start_datetime': forms.DateTimeInput(attrs={'class': 'form-control datepicker', 'placeholder': 'Дата и время начала'}),
             'end_datetime': forms.DateTimeInput(attrs={'class': 'form-control datepicker', 'placeholder': 'Дата и время окончания'}),
-            'client': forms.Select(attrs={'class': 'form-select'}),
-            'studio': forms.Select(attrs={'class': 'form-select'}),
+            'client': AutocompleteSelect(reverse_lazy('clients:client_autocomplete'), attrs={'class': 'form-select'}),
+            'studio': AutocompleteSelect(reverse_lazy('studios:studio_autocomplete'), attrs={'class': 'form-select'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Описание события (необязательно)'}),
             'is_all_day': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'color': forms.TextInput(attrs={'class': 'form-control', 'type': 'color'}),
+            'recurrence_rule': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'FREQ=WEEKLY;BYDAY=MO'}),
         }
     
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
+        self.user = user
         
         # Устанавливаем начальные значения для дат, если это новое событие
         if not self.instance.pk:
@@ -42,37 +89,59 @@ class EventForm(forms.ModelForm):
             self.initial['start_datetime'] = rounded_now
             self.initial['end_datetime'] = rounded_now + timedelta(hours=1)
 
-        # Фильтруем клиентов и студии по пользователю, если он передан
+        # Фильтруем клиентов и студии по пользователю, если он передан.
+        # Списки целиком не выводятся: варианты подгружает автодополнение
         if user:
             self.fields['client'].queryset = Client.objects.filter(photographer=user)
-            self.fields['studio'].queryset = Studio.objects.filter(is_public=True) | Studio.objects.filter(created_by=user)
+            self.fields['studio'].queryset = Studio.objects.visible_to(user)
     
+    def clean_recurrence_rule(self):
+        return clean_recurrence(self.cleaned_data.get('recurrence_rule'), self.cleaned_data.get('start_datetime'))
+
     def clean(self):
         """
         Проверка корректности данных формы
         """
         cleaned_data = super().clean()
-        start_datetime = cleaned_data.get('start_datetime')
-        end_datetime = cleaned_data.get('end_datetime')
-        is_all_day = cleaned_data.get('is_all_day')
-        
+        start_datetime, end_datetime, errors = validate_event_period(
+            cleaned_data.get('start_datetime'),
+            cleaned_data.get('end_datetime'),
+            cleaned_data.get('is_all_day'),
+        )
         if start_datetime and end_datetime:
-            # Если событие на весь день, устанавливаем время начала на 00:00 и время окончания на 23:59
-            if is_all_day:
-                start_datetime = start_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_datetime = end_datetime.replace(hour=23, minute=59, second=59, microsecond=999999)
-                cleaned_data['start_datetime'] = start_datetime
-                cleaned_data['end_datetime'] = end_datetime
+            cleaned_data['start_datetime'] = start_datetime
+            cleaned_data['end_datetime'] = end_datetime
+        for field, message in errors:
+            self.add_error(field, message)
+        # Бронирование без окончания - пустой интервал, который не пересекается ни с чем
+        if cleaned_data.get('studio') and start_datetime and not end_datetime:
+            self.add_error('end_datetime', _('Укажите окончание бронирования студии'))
+            return cleaned_data
+        if not errors and start_datetime and 'recurrence_rule' in cleaned_data:
+            self.check_conflicts(start_datetime, end_datetime, cleaned_data.get('studio'), cleaned_data['recurrence_rule'])
 
-            # Проверяем, что дата окончания не раньше даты начала
-            if end_datetime < start_datetime:
-                self.add_error('end_datetime', _('Дата и время окончания не может быть раньше даты и времени начала'))
+        return cleaned_data
 
-        if start_datetime:
-            if start_datetime < timezone.now():
-                self.add_error('start_datetime', _('Дата и время начала не может быть раньше даты и времени текущего момента'))
+    def check_conflicts(self, start_datetime, end_datetime, studio, recurrence_rule=''):
+        """
+        Проверка двойного бронирования студии и фотографа (для серии - по ее вхождениям).
+        Ошибка по студии добавляется к полю studio: тогда ModelForm не проверяет
+        ограничение event_studio_no_overlap повторно с безымянным сообщением
+        """
+        exclude_pk = self.instance.pk
+        photographer_id = self.instance.photographer_id or (self.user.pk if self.user else None)
+        if studio is not None:
+            conflict = find_studio_conflict(studio.pk, start_datetime, end_datetime, exclude_pk, recurrence_rule)
+            if conflict is not None:
+                self.add_error('studio', f'Студия занята. {describe_conflict(conflict, photographer_id)}')
+                return
 
-        return cleaned_data
+        if photographer_id and self.instance.event_type == 'photoshoot':
+            conflict = find_photographer_conflict(
+                photographer_id, start_datetime, end_datetime, exclude_pk, recurrence_rule
+            )
+            if conflict is not None:
+                self.add_error(None, f'У вас уже есть съемка в это время. {describe_conflict(conflict, photographer_id)}')
 
 
 class EventFormPost(forms.ModelForm):
@@ -83,7 +152,7 @@ class EventFormPost(forms.ModelForm):
     class Meta:
         model = Event
         fields = ['title', 'start_datetime', 'end_datetime', 'description',
-                  'is_all_day', 'color']
+                  'is_all_day', 'color', 'recurrence_rule']
         widgets = {
             'title': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Название события'}),
             'start_datetime': forms.DateTimeInput(
@@ -94,6 +163,7 @@ class EventFormPost(forms.ModelForm):
                 attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Описание события (необязательно)'}),
             'is_all_day': forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             'color': forms.TextInput(attrs={'class': 'form-control', 'type': 'color'}),
+            'recurrence_rule': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'FREQ=WEEKLY;BYDAY=MO'}),
         }
 
     def __init__(self, *args, **kwargs):
@@ -116,29 +186,246 @@ class EventFormPost(forms.ModelForm):
 
 
 
+    def clean_recurrence_rule(self):
+        return clean_recurrence(self.cleaned_data.get('recurrence_rule'), self.cleaned_data.get('start_datetime'))
+
     def clean(self):
         """
         Проверка корректности данных формы
         """
         cleaned_data = super().clean()
-        start_datetime = cleaned_data.get('start_datetime')
-        end_datetime = cleaned_data.get('end_datetime')
-        is_all_day = cleaned_data.get('is_all_day')
-
+        start_datetime, end_datetime, errors = validate_event_period(
+            cleaned_data.get('start_datetime'),
+            cleaned_data.get('end_datetime'),
+            cleaned_data.get('is_all_day'),
+        )
         if start_datetime and end_datetime:
-            # Если событие на весь день, устанавливаем время начала на 00:00 и время окончания на 23:59
-            if is_all_day:
-                start_datetime = start_datetime.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_datetime = end_datetime.replace(hour=23, minute=59, second=59, microsecond=999999)
-                cleaned_data['start_datetime'] = start_datetime
-                cleaned_data['end_datetime'] = end_datetime
-
-            # Проверяем, что дата окончания не раньше даты начала
-            if end_datetime < start_datetime:
-                self.add_error('end_datetime', _('Дата и время окончания не может быть раньше даты и времени начала'))
-
-        if start_datetime:
-            if start_datetime < timezone.now():
-                self.add_error('start_datetime', _('Дата и время окончания не может быть раньше даты и времени начала'))
-
-        return cleaned_data
\ No newline at end of file
+            cleaned_data['start_datetime'] = start_datetime
+            cleaned_data['end_datetime'] = end_datetime
+        for field, message in errors:
+            self.add_error(field, message)
+
+        return cleaned_data
+
+class EventImportForm(forms.Form):
+    """
+    Форма загрузки файла для импорта событий (.ics или .csv)
+    """
+    file = forms.FileField(
+        label=_('Файл'),
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.ics,.csv'})
+    )
+    event_type = forms.ChoiceField(
+        label=_('Тип по умолчанию'),
+        choices=Event.EVENT_TYPE_CHOICES,
+        initial='photoshoot',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+        help_text=_('Используется, если тип события не указан в файле')
+    )
+
+    def clean_file(self):
+        """
+        Проверка формата файла
+        """
+        file = self.cleaned_data.get('file')
+        if file and not file.name.lower().endswith(('.ics', '.csv')):
+            raise forms.ValidationError(_('Поддерживаются только файлы .ics и .csv'))
+        return file
+
+
+class FreeSlotForm(forms.Form):
+    """
+    Параметры поиска свободного времени в студиях (GET-параметры API)
+    """
+    MAX_DAYS = 62
+    MAX_STUDIOS = 50
+
+    studio = forms.ModelMultipleChoiceField(queryset=Studio.objects.none(), label=_('Студии'))
+    duration = forms.IntegerField(label=_('Продолжительность, минут'), min_value=15, max_value=24 * 60)
+    start = forms.DateField(label=_('С даты'))
+    end = forms.DateField(label=_('По дату'))
+    work_start = forms.TimeField(label=_('Начало рабочего дня'), required=False)
+    work_end = forms.TimeField(label=_('Конец рабочего дня'), required=False)
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['studio'].queryset = Studio.objects.visible_to(user)
+
+    def clean_studio(self):
+        studios = self.cleaned_data['studio']
+        if len(studios) > self.MAX_STUDIOS:
+            raise forms.ValidationError(_('Можно выбрать не больше %(count)d студий') % {'count': self.MAX_STUDIOS})
+        return studios
+
+    def clean_work_start(self):
+        return self.cleaned_data.get('work_start') or time(9, 0)
+
+    def clean_work_end(self):
+        return self.cleaned_data.get('work_end') or time(21, 0)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end:
+            if end < start:
+                self.add_error('end', _('Дата окончания не может быть раньше даты начала'))
+            elif (end - start).days >= self.MAX_DAYS:
+                self.add_error('end', _('Диапазон не может быть длиннее %(days)d дней') % {'days': self.MAX_DAYS})
+        work_start, work_end = cleaned_data.get('work_start'), cleaned_data.get('work_end')
+        if work_start and work_end and work_end <= work_start:
+            self.add_error('work_end', _('Конец рабочего дня должен быть позже начала'))
+        duration = cleaned_data.get('duration')
+        if duration:
+            cleaned_data['duration'] = timedelta(minutes=duration)
+        return cleaned_data
+
+
+class AgendaFilterForm(forms.Form):
+    """
+    Фильтры списка событий (GET-параметры страницы и API повестки)
+    """
+    SCOPE_CHOICES = [
+        ('upcoming', _('Предстоящие')),
+        ('past', _('Прошедшие')),
+    ]
+
+    scope = forms.ChoiceField(label=_('События'), choices=SCOPE_CHOICES, required=False)
+    event_type = forms.ChoiceField(
+        label=_('Тип события'), choices=[('', _('Все'))] + Event.EVENT_TYPE_CHOICES, required=False
+    )
+    client = forms.IntegerField(label=_('Клиент'), required=False, widget=forms.HiddenInput)
+    studio = forms.IntegerField(label=_('Студия'), required=False, widget=forms.HiddenInput)
+    cursor = forms.CharField(required=False, widget=forms.HiddenInput)
+    limit = forms.IntegerField(required=False, min_value=1, max_value=200, widget=forms.HiddenInput)
+
+    def clean_scope(self):
+        return self.cleaned_data.get('scope') or 'upcoming'
+
+
+class BulkEventForm(forms.Form):
+    """
+    Массовая операция над событиями: выбранные события (ids) или фильтр и операция с параметрами
+    """
+    OPERATION_CHOICES = [
+        ('shift', _('Перенести')),
+        ('studio', _('Сменить студию')),
+        ('color', _('Сменить цвет')),
+        ('delete', _('Удалить')),
+    ]
+    # Самый большой перенос, минут
+    MAX_SHIFT = 366 * 24 * 60
+
+    operation = forms.ChoiceField(
+        label=_('Операция'), choices=OPERATION_CHOICES, widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    ids = forms.CharField(required=False, widget=forms.HiddenInput)
+    date_from = forms.DateField(
+        label=_('С даты'), required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label=_('По дату'), required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    event_type = forms.ChoiceField(
+        label=_('Тип события'), choices=[('', _('Все'))] + Event.EVENT_TYPE_CHOICES, required=False,
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    filter_studio = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    filter_client = forms.IntegerField(required=False, widget=forms.HiddenInput)
+    shift_minutes = forms.IntegerField(
+        label=_('Сдвиг, минут'), required=False, min_value=-MAX_SHIFT, max_value=MAX_SHIFT,
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    studio = forms.ModelChoiceField(
+        label=_('Студия'), queryset=Studio.objects.none(), required=False, empty_label=_('Без студии'),
+        widget=AutocompleteSelect(reverse_lazy('studios:studio_autocomplete'), attrs={'class': 'form-select'})
+    )
+    color = forms.RegexField(
+        label=_('Цвет'), regex=r'^#[0-9a-fA-F]{6}$', required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'type': 'color'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        self.user = kwargs.pop('user')
+        super().__init__(*args, **kwargs)
+        self.fields['studio'].queryset = Studio.objects.visible_to(self.user)
+
+    def clean_ids(self):
+        value = self.cleaned_data.get('ids') or ''
+        try:
+            return [int(pk) for pk in value.replace(' ', '').split(',') if pk]
+        except ValueError:
+            raise forms.ValidationError(_('Некорректный список событий'))
+
+    def clean(self):
+        cleaned_data = super().clean()
+        has_filter = any(cleaned_data.get(name) for name in (
+            'date_from', 'date_to', 'event_type', 'filter_studio', 'filter_client',
+        ))
+        # Без выбора и без фильтра операция применилась бы ко всем событиям
+        if not cleaned_data.get('ids') and not has_filter:
+            raise forms.ValidationError(_('Выберите события или задайте фильтр'))
+        date_from, date_to = cleaned_data.get('date_from'), cleaned_data.get('date_to')
+        if date_from and date_to and date_to < date_from:
+            self.add_error('date_to', _('Дата окончания не может быть раньше даты начала'))
+
+        operation = cleaned_data.get('operation')
+        if operation == 'shift':
+            if not cleaned_data.get('shift_minutes'):
+                self.add_error('shift_minutes', _('Укажите сдвиг'))
+            else:
+                cleaned_data['delta'] = timedelta(minutes=cleaned_data['shift_minutes'])
+        elif operation == 'color' and not cleaned_data.get('color'):
+            self.add_error('color', _('Укажите цвет'))
+        return cleaned_data
+
+    def get_queryset(self):
+        """
+        События фотографа, выбранные списком и/или фильтром
+        """
+        data = self.cleaned_data
+        queryset = Event.objects.filter(photographer=self.user)
+        if data['ids']:
+            queryset = queryset.filter(pk__in=data['ids'])
+        if data['date_from']:
+            queryset = queryset.filter(
+                start_datetime__gte=timezone.make_aware(datetime.combine(data['date_from'], time.min))
+            )
+        if data['date_to']:
+            queryset = queryset.filter(
+                start_datetime__lt=timezone.make_aware(datetime.combine(data['date_to'] + timedelta(days=1), time.min))
+            )
+        if data['event_type']:
+            queryset = queryset.filter(event_type=data['event_type'])
+        if data['filter_studio']:
+            queryset = queryset.filter(studio_id=data['filter_studio'])
+        if data['filter_client']:
+            queryset = queryset.filter(client_id=data['filter_client'])
+        return queryset
+
+
+class EventExportForm(forms.Form):
+    """
+    Период выгрузки событий в CSV (GET-параметры); пустые даты - без ограничения
+    """
+    start = forms.DateField(label=_('С даты'), required=False)
+    end = forms.DateField(label=_('По дату'), required=False)
+    gzip = forms.BooleanField(label=_('Сжать gzip'), required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start, end = cleaned_data.get('start'), cleaned_data.get('end')
+        if start and end and end < start:
+            self.add_error('end', _('Дата окончания не может быть раньше даты начала'))
+        return cleaned_data
+
+    def get_period(self):
+        """
+        Границы [start, end) в текущем часовом поясе; дата окончания включается целиком
+        """
+        start, end = self.cleaned_data['start'], self.cleaned_data['end']
+        if start:
+            start = timezone.make_aware(datetime.combine(start, time.min))
+        if end:
+            end = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+        return start, end
@@ -0,0 +1,202 @@
+"""
+Формирование календаря в формате iCalendar (RFC 5545) для подписки из
+приложений календаря на телефоне.
+
+Календарь отдается потоком: события читаются порциями через iterator(),
+каждая порция сразу превращается в строки VEVENT, поэтому память не растет
+с числом событий.
+
+Серия повторяющегося события выгружается одним VEVENT с RRULE; отмененные
+вхождения попадают в EXDATE, измененные - в отдельные VEVENT с тем же UID
+и RECURRENCE-ID.
+"""
+from datetime import timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from .models import Event
+
+ICS_CHUNK_SIZE = 500
+
+# Тело календаря кэшируется, только если оно не больше этого размера
+ICS_CACHE_MAX_BYTES = 2 * 1024 * 1024
+
+ICS_CACHE_KEY = 'calendar:ics:%s:%s'
+
+PRODID = '-//PhotoHub//Calendar//RU'
+
+UID_DOMAIN = 'photohub'
+
+
+def escape_text(value):
+    """
+    Экранирование значения TEXT по RFC 5545
+    """
+    return (
+        value.replace('\\', '\\\\')
+        .replace(';', '\\;')
+        .replace(',', '\\,')
+        .replace('\r\n', '\\n')
+        .replace('\n', '\\n')
+    )
+
+
+def fold_line(line):
+    """
+    Перенос строки длиннее 75 октетов (продолжение начинается с пробела)
+    """
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Не разрезаем многобайтовый символ UTF-8
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+        limit = 74
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_datetime(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_date(value):
+    return timezone.localtime(value).strftime('%Y%m%d')
+
+
+def get_ics_queryset(user):
+    """
+    События фотографа для подписки с клиентом и студией в одном запросе
+    """
+    return (
+        Event.objects.filter(photographer=user)
+        .select_related('client', 'studio')
+        .prefetch_related('recurrence_exceptions')
+        .only(
+            'id', 'title', 'event_type', 'start_datetime', 'end_datetime', 'is_all_day',
+            'description', 'updated_at', 'recurrence_rule',
+            'client__first_name', 'client__last_name',
+            'studio__name', 'studio__city', 'studio__district', 'studio__street', 'studio__building',
+        )
+        .order_by('start_datetime', 'id')
+    )
+
+
+def format_moment(name, value, is_all_day):
+    """
+    Свойство с датой (для событий на весь день) или временем в UTC
+    """
+    if is_all_day:
+        return f'{name};VALUE=DATE:{format_date(value)}'
+    return f'{name}:{format_datetime(value)}'
+
+
+def render_vevent(event, start, end, title, description, extra=()):
+    """
+    Блок VEVENT события или вхождения серии; extra - дополнительные свойства
+    (RRULE, EXDATE, RECURRENCE-ID)
+    """
+    lines = [
+        'BEGIN:VEVENT',
+        f'UID:event-{event.pk}@{UID_DOMAIN}',
+        f'DTSTAMP:{format_datetime(event.updated_at)}',
+        *extra,
+    ]
+    end = end or start
+    lines.append(format_moment('DTSTART', start, event.is_all_day))
+    # В iCalendar DTEND для событий на весь день не включается
+    lines.append(format_moment('DTEND', end + timedelta(days=1) if event.is_all_day else end, event.is_all_day))
+    lines.append(f'SUMMARY:{escape_text(title)}')
+
+    parts = []
+    if event.client:
+        parts.append(f'Клиент: {event.client.get_full_name()}')
+    if description:
+        parts.append(description)
+    if parts:
+        description = escape_text('\n'.join(parts))
+        lines.append(f'DESCRIPTION:{description}')
+    if event.studio:
+        location = f'{event.studio.name}, {event.studio.get_full_address()}'
+        lines.append(f'LOCATION:{escape_text(location)}')
+    lines.append(f'CATEGORIES:{escape_text(str(event.get_event_type_display()))}')
+    lines.append('END:VEVENT')
+    return ''.join(fold_line(line) for line in lines)
+
+
+def render_event(event):
+    """
+    Возвращает блок VEVENT для события; для серии - вместе с измененными вхождениями
+    """
+    if not event.recurrence_rule:
+        return render_vevent(event, event.start_datetime, event.end_datetime, event.title, event.description)
+
+    exceptions = list(event.recurrence_exceptions.all())
+    extra = [f'RRULE:{event.recurrence_rule}']
+    extra += [
+        format_moment('EXDATE', exception.original_start, event.is_all_day)
+        for exception in exceptions if exception.is_cancelled
+    ]
+    blocks = [render_vevent(event, event.start_datetime, event.end_datetime, event.title, event.description, extra)]
+
+    duration = (event.end_datetime or event.start_datetime) - event.start_datetime
+    for exception in exceptions:
+        if exception.is_cancelled:
+            continue
+        start = exception.start_datetime or exception.original_start
+        blocks.append(render_vevent(
+            event,
+            start,
+            exception.end_datetime or start + duration,
+            exception.title or event.title,
+            exception.description or event.description,
+            [format_moment('RECURRENCE-ID', exception.original_start, event.is_all_day)],
+        ))
+    return ''.join(blocks)
+
+
+def iter_ics(queryset, name='PhotoHub', chunk_size=ICS_CHUNK_SIZE):
+    """
+    Генератор календаря в формате iCalendar, по одному фрагменту на порцию событий
+    """
+    yield ''.join(fold_line(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        f'PRODID:{PRODID}',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ])
+    chunk = []
+    for event in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(render_event(event))
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+    yield 'END:VCALENDAR\r\n'
+
+
+def iter_ics_cached(queryset, cache, cache_key, name='PhotoHub'):
+    """
+    Отдает календарь потоком и сохраняет тело в кэш, если оно небольшое
+    """
+    parts = []
+    size = 0
+    for part in iter_ics(queryset, name=name):
+        data = part.encode('utf-8')
+        if parts is not None:
+            size += len(data)
+            if size > ICS_CACHE_MAX_BYTES:
+                parts = None
+            else:
+                parts.append(data)
+        yield data
+    if parts is not None:
+        cache.set(cache_key, b''.join(parts))
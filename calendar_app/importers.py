@@ -0,0 +1,403 @@
+"""
+Пакетный импорт событий из файлов iCalendar (.ics) и CSV.
+
+Файл читается потоком, строки проверяются теми же правилами, что и в
+EventForm (поля формы и validate_event_period), но без создания формы на
+каждую строку. Клиенты и студии ищутся по имени в словарях, построенных
+одним запросом каждый, а события вставляются через bulk_create порциями
+внутри одной транзакции.
+
+Файлы читаются в UTF-8 (с BOM или без), а если начало файла не UTF-8 -
+в cp1251, в которой сохраняет CSV русский Excel. Если файл не читается и
+так, import_file() пробрасывает UnicodeDecodeError, транзакция
+откатывается, и представление показывает ENCODING_ERROR у поля файла.
+"""
+import codecs
+import csv
+import io
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .booking import is_studio_conflict_error
+from .client_stats import update_events_client_stats
+from .forms import EventForm, clean_recurrence, validate_event_period
+from .live import publish
+from .models import Event
+from .occupancy import add_events_occupancy
+from .recurrence import get_recurrence_end
+from .signals import invalidate_feeds
+from clients.models import Client
+from studios.models import Studio
+
+IMPORT_BATCH_SIZE = 1000
+
+# Колонки CSV: обязательны title и start
+CSV_COLUMNS = ('title', 'event_type', 'start', 'end', 'client', 'studio', 'description', 'all_day', 'color', 'rrule')
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'да', '+'}
+
+# Кодировка файлов, начало которых не читается как UTF-8
+FALLBACK_ENCODING = 'cp1251'
+
+# Сколько байт из начала файла проверяется на UTF-8
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+ENCODING_ERROR = 'Не удалось прочитать файл: сохраните его в кодировке UTF-8 или Windows-1251'
+
+
+def normalize_name(value):
+    return ' '.join(value.split()).casefold()
+
+
+def format_errors(error):
+    return '; '.join(str(message) for message in error.messages)
+
+
+class EventImporter:
+    """
+    Импорт событий фотографа.
+
+    progress - необязательная функция progress(processed, created, errors),
+    вызывается после каждой вставленной порции.
+    """
+    def __init__(self, user, default_event_type='photoshoot', batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.user = user
+        self.default_event_type = default_event_type
+        self.batch_size = batch_size
+        self.progress = progress
+        self.processed = 0
+        self.created = 0
+        self.errors = []
+        self.fields = EventForm.base_fields
+        self.event_types = {key for key, label in Event.EVENT_TYPE_CHOICES}
+        self.event_type_labels = {normalize_name(str(label)): key for key, label in Event.EVENT_TYPE_CHOICES}
+        self._clients = None
+        self._studios = None
+
+    @property
+    def clients(self):
+        """Словарь "имя фамилия" -> id клиента (один запрос)"""
+        if self._clients is None:
+            self._clients = {}
+            rows = Client.objects.filter(photographer=self.user).values_list('id', 'first_name', 'last_name')
+            for client_id, first_name, last_name in rows:
+                self._clients.setdefault(normalize_name(f'{first_name} {last_name}'), client_id)
+        return self._clients
+
+    @property
+    def studios(self):
+        """Словарь название -> id доступной студии (один запрос), свои студии приоритетнее"""
+        if self._studios is None:
+            self._studios = {}
+            rows = Studio.objects.visible_to(self.user).values_list('id', 'name', 'created_by_id')
+            for studio_id, name, created_by_id in rows:
+                key = normalize_name(name)
+                if key not in self._studios or created_by_id == self.user.pk:
+                    self._studios[key] = studio_id
+        return self._studios
+
+    def error(self, line, message):
+        self.errors.append((line, message))
+
+    def resolve_event_type(self, value):
+        value = (value or '').strip()
+        if not value:
+            return self.default_event_type
+        if value in self.event_types:
+            return value
+        return self.event_type_labels.get(normalize_name(value))
+
+    def build_event(self, line, data):
+        """
+        Проверяет одну запись и возвращает несохраненное событие или None.
+        data - словарь с ключами title, event_type, start, end, client, studio,
+        description, all_day, color, rrule (значения - строки или уже разобранные datetime)
+        """
+        if data.get('recurrence_id'):
+            self.error(line, 'Измененные вхождения серий (RECURRENCE-ID) не импортируются')
+            return None
+
+        cleaned = {}
+        try:
+            for name, key in (('title', 'title'), ('start_datetime', 'start'), ('end_datetime', 'end'),
+                              ('description', 'description')):
+                cleaned[name] = self.fields[name].clean(data.get(key) or '')
+            color = (data.get('color') or '').strip()
+            cleaned['color'] = self.fields['color'].clean(color) if color else Event._meta.get_field('color').default
+        except ValidationError as error:
+            self.error(line, format_errors(error))
+            return None
+
+        event_type = self.resolve_event_type(data.get('event_type'))
+        if event_type is None:
+            self.error(line, f"Неизвестный тип события: {data.get('event_type')}")
+            return None
+
+        all_day = data.get('all_day')
+        if isinstance(all_day, str):
+            all_day = all_day.strip().casefold() in TRUE_VALUES
+        start_datetime, end_datetime, errors = validate_event_period(
+            cleaned['start_datetime'], cleaned['end_datetime'], bool(all_day), allow_past=True
+        )
+        if errors:
+            self.error(line, '; '.join(str(message) for field, message in errors))
+            return None
+        try:
+            recurrence_rule = clean_recurrence(data.get('rrule'), start_datetime)
+        except ValidationError as error:
+            self.error(line, format_errors(error))
+            return None
+
+        event = Event(
+            photographer=self.user,
+            title=cleaned['title'],
+            event_type=event_type,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            description=cleaned['description'],
+            is_all_day=bool(all_day),
+            color=cleaned['color'],
+            recurrence_rule=recurrence_rule,
+            # bulk_create не вызывает save(), поэтому окончание серии вычисляется здесь
+            recurrence_end=get_recurrence_end(recurrence_rule, start_datetime, end_datetime),
+        )
+        # У постов нет клиента и студии (см. EventFormPost)
+        if event_type == 'photoshoot':
+            for name, lookup in (('client', self.clients), ('studio', self.studios)):
+                value = (data.get(name) or '').strip()
+                if not value:
+                    continue
+                related_id = lookup.get(normalize_name(value))
+                if related_id is None:
+                    self.error(line, f'Не найден объект "{value}" ({name}), событие импортировано без него')
+                elif name == 'studio' and end_datetime is None:
+                    self.error(line, 'У бронирования студии нет окончания, событие импортировано без студии')
+                else:
+                    setattr(event, f'{name}_id', related_id)
+        event._import_line = line
+        return event
+
+    def run(self, records):
+        """
+        Импортирует записи вида (номер строки, словарь данных).
+        Возвращает число созданных событий.
+        """
+        batch = []
+        with transaction.atomic():
+            for line, data in records:
+                self.processed += 1
+                event = self.build_event(line, data)
+                if event is not None:
+                    batch.append(event)
+                if len(batch) >= self.batch_size:
+                    self.flush(batch)
+                    batch = []
+            self.flush(batch)
+        # bulk_create не отправляет post_save, поэтому кэш лент сбрасывается один раз,
+        # а открытые вкладки календаря перечитывают ленту
+        invalidate_feeds(self.user.pk)
+        transaction.on_commit(lambda: publish(self.user.pk, {'type': 'refetch'}))
+        return self.created
+
+    def flush(self, batch):
+        if batch:
+            try:
+                with transaction.atomic():
+                    Event.objects.bulk_create(batch, batch_size=self.batch_size)
+            except IntegrityError as error:
+                if not is_studio_conflict_error(error):
+                    raise
+                batch = self.insert_one_by_one(batch)
+            # bulk_create не отправляет сигналы, сводка загрузки студий и статистика клиентов обновляются здесь
+            add_events_occupancy(batch)
+            update_events_client_stats(batch)
+            self.created += len(batch)
+        if self.progress:
+            self.progress(self.processed, self.created, len(self.errors))
+
+    def insert_one_by_one(self, batch):
+        """
+        Вставка порции по одному событию, если в ней есть пересечение бронирований студии.
+        Медленный путь нужен только для порций с конфликтами; возвращает вставленные события
+        """
+        inserted = []
+        for event in batch:
+            try:
+                with transaction.atomic():
+                    Event.objects.bulk_create([event])
+            except IntegrityError as error:
+                if not is_studio_conflict_error(error):
+                    raise
+                self.error(event._import_line, 'Студия уже забронирована на это время, событие не импортировано')
+            else:
+                inserted.append(event)
+        return inserted
+
+    def import_csv(self, stream):
+        return self.run(iter_csv_records(stream))
+
+    def import_ics(self, stream):
+        return self.run(iter_ics_records(stream))
+
+    def import_file(self, uploaded_file):
+        """
+        Импорт загруженного файла; формат определяется по расширению
+        """
+        if uploaded_file.name.lower().endswith('.ics'):
+            return self.import_ics(uploaded_file)
+        return self.import_csv(uploaded_file)
+
+
+def detect_encoding(stream):
+    """
+    utf-8-sig, если начало потока читается как UTF-8, иначе FALLBACK_ENCODING.
+    Позиция потока не меняется
+    """
+    if not stream.seekable():
+        return 'utf-8-sig'
+    position = stream.tell()
+    sample = stream.read(ENCODING_SAMPLE_SIZE)
+    stream.seek(position)
+    try:
+        # final=False: символ, разрезанный границей образца, не ошибка
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return FALLBACK_ENCODING
+    return 'utf-8-sig'
+
+
+def text_stream(stream):
+    """
+    Оборачивает бинарный поток (например, UploadedFile) в текстовый
+    """
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding=detect_encoding(stream), newline='')
+
+
+def iter_csv_records(stream):
+    """
+    Читает CSV построчно. Поддерживаются разделители "," и ";".
+    """
+    stream = text_stream(stream)
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    columns = [column.strip().lower() for column in next(csv.reader([header], delimiter=delimiter))]
+    reader = csv.DictReader(stream, fieldnames=columns, delimiter=delimiter)
+    for line, row in enumerate(reader, start=2):
+        yield line, {key: row.get(key) for key in CSV_COLUMNS}
+
+
+def unescape_text(value):
+    """
+    Обратное преобразование экранирования TEXT по RFC 5545
+    """
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            char = next(chars, '')
+            result.append('\n' if char in 'nN' else char)
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def parse_ics_datetime(value, params):
+    """
+    Разбирает DTSTART/DTEND. Возвращает (datetime, весь день)
+    """
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        parsed = datetime.strptime(value[:8], '%Y%m%d')
+        return timezone.make_aware(parsed), True
+    if value.endswith('Z'):
+        return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=ZoneInfo('UTC')), False
+    parsed = datetime.strptime(value, '%Y%m%dT%H%M%S')
+    tzid = params.get('TZID')
+    if tzid:
+        try:
+            return parsed.replace(tzinfo=ZoneInfo(tzid)), False
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    return timezone.make_aware(parsed), False
+
+
+def iter_ics_lines(stream):
+    """
+    Построчное чтение с объединением перенесенных строк (RFC 5545, 3.1)
+    """
+    current = None
+    start_line = 0
+    for number, raw in enumerate(text_stream(stream), start=1):
+        raw = raw.rstrip('\r\n')
+        if raw[:1] in (' ', '\t') and current is not None:
+            current += raw[1:]
+            continue
+        if current is not None:
+            yield start_line, current
+        current, start_line = raw, number
+    if current:
+        yield start_line, current
+
+
+def iter_ics_records(stream):
+    """
+    Читает VEVENT из потока iCalendar
+    """
+    event = None
+    for line, content in iter_ics_lines(stream):
+        name_part, _, value = content.partition(':')
+        name, *raw_params = name_part.split(';')
+        name = name.upper()
+        params = dict(param.split('=', 1) for param in raw_params if '=' in param)
+
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {'line': line}
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            yield event.pop('line'), ics_event_to_record(event)
+            event = None
+        elif event is not None and name in ('SUMMARY', 'DESCRIPTION', 'LOCATION', 'CATEGORIES', 'COLOR'):
+            event[name] = unescape_text(value)
+        elif event is not None and name in ('RRULE', 'RECURRENCE-ID'):
+            event[name] = value
+        elif event is not None and name in ('DTSTART', 'DTEND'):
+            try:
+                event[name] = parse_ics_datetime(value, params)
+            except ValueError:
+                event[name] = (value, False)
+
+
+def ics_event_to_record(event):
+    """
+    Преобразует VEVENT в запись импорта. Клиент берется из строки "Клиент: ..."
+    в описании, студия - из LOCATION (название до первой запятой)
+    """
+    start, all_day = event.get('DTSTART', ('', False))
+    end, _ = event.get('DTEND', (None, False))
+    if all_day and isinstance(end, datetime):
+        # В iCalendar DTEND для событий на весь день не включается
+        end = end - timedelta(days=1)
+
+    description_lines = event.get('DESCRIPTION', '').split('\n')
+    client = ''
+    if description_lines and description_lines[0].startswith('Клиент: '):
+        client = description_lines.pop(0)[len('Клиент: '):]
+    location = event.get('LOCATION', '')
+
+    return {
+        'title': event.get('SUMMARY', ''),
+        'event_type': event.get('CATEGORIES', '').split(',')[0],
+        'start': start,
+        'end': end or start,
+        'client': client,
+        'studio': location.split(',')[0] if location else '',
+        'description': '\n'.join(description_lines).strip(),
+        'all_day': all_day,
+        'color': event.get('COLOR', ''),
+        'rrule': event.get('RRULE', ''),
+        'recurrence_id': event.get('RECURRENCE-ID', ''),
+    }
@@ -0,0 +1,189 @@
+"""
+Живое обновление календаря через Server-Sent Events.
+
+Сигналы Event после фиксации транзакции публикуют изменения в канал
+фотографа, а асинхронное представление event_stream передает их во все
+открытые вкладки. Соединение обслуживает асинхронный генератор, поэтому
+под ASGI сотни простаивающих подключений не занимают по потоку.
+
+Брокер сообщений подключаемый (settings.CALENDAR_LIVE['BACKEND']):
+LocalBroker работает в памяти одного процесса (разработка, тесты),
+RedisBroker доставляет сообщения между воркерами через Redis Pub/Sub.
+"""
+import asyncio
+import json
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from .feed import FEED_FIELDS, format_feed_event, get_detail_url_template
+from .models import Event
+
+CHANNEL = 'calendar:live:%s'
+
+# Комментарий-пинг раз в столько секунд не дает прокси закрыть простаивающее соединение
+HEARTBEAT_INTERVAL = 15
+
+# Через сколько миллисекунд браузер переподключается после обрыва
+RECONNECT_DELAY = 5000
+
+
+class LocalSubscription:
+    def __init__(self, broker, channel, max_queue):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queue)
+
+    def put(self, message):
+        """Вызывается в цикле событий подписчика"""
+        if self.queue.full():
+            # Отставший клиент вместо пропущенных изменений перечитывает ленту
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = {'type': 'refetch'}
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout):
+        """Следующее сообщение или None, если за timeout секунд ничего не пришло"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    Брокер в памяти процесса. Публиковать можно из любого потока:
+    сообщение передается в цикл событий подписчика
+    """
+    def __init__(self, max_queue=100):
+        self.max_queue = max_queue
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.put, message)
+
+    def subscribe(self, channel):
+        subscription = LocalSubscription(self, channel, self.max_queue)
+        with self._lock:
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.channel, None)
+
+
+class RedisSubscription:
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.subscribed = False
+
+    async def get(self, timeout):
+        if not self.subscribed:
+            await self.pubsub.subscribe(self.channel)
+            self.subscribed = True
+        message = await self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisBroker:
+    """
+    Брокер на Redis Pub/Sub для нескольких воркеров. Требует пакет redis
+    """
+    def __init__(self, url='redis://127.0.0.1:6379/0'):
+        try:
+            import redis
+        except ImportError as error:
+            raise ImproperlyConfigured('Для RedisBroker установите пакет redis') from error
+        self.url = url
+        self.publisher = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self.publisher.publish(channel, json.dumps(message, cls=DjangoJSONEncoder))
+
+    def subscribe(self, channel):
+        from redis import asyncio as redis_asyncio
+
+        # Асинхронный клиент привязан к циклу событий, поэтому создается на каждое подключение
+        return RedisSubscription(redis_asyncio.Redis.from_url(self.url), channel)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    config = getattr(settings, 'CALENDAR_LIVE', {})
+    backend = import_string(config.get('BACKEND', 'calendar_app.live.LocalBroker'))
+    return backend(**config.get('OPTIONS', {}))
+
+
+def publish(user_id, message):
+    get_broker().publish(CHANNEL % user_id, message)
+
+
+def publish_event_change(action, event_id, photographer_id):
+    """
+    Публикует изменение события. action - created, updated или deleted.
+    Серии разворачиваются только внутри окна, поэтому для них клиент перечитывает ленту
+    """
+    if action == 'deleted':
+        publish(photographer_id, {'type': 'deleted', 'id': event_id})
+        return
+    row = Event.objects.filter(pk=event_id).values(*FEED_FIELDS).first()
+    if row is None:
+        return
+    if row['recurrence_rule']:
+        publish(photographer_id, {'type': 'refetch'})
+        return
+    type_labels = {key: str(label) for key, label in Event.EVENT_TYPE_CHOICES}
+    publish(photographer_id, {
+        'type': action,
+        'event': format_feed_event(row, get_detail_url_template(), type_labels),
+    })
+
+
+def format_message(message):
+    """
+    Сообщение в формате text/event-stream
+    """
+    data = json.dumps(message, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {message['type']}\ndata: {data}\n\n"
+
+
+async def iter_live_events(user_id, broker=None, heartbeat=HEARTBEAT_INTERVAL):
+    """
+    Асинхронный поток SSE для открытой вкладки календаря фотографа
+    """
+    subscription = (broker or get_broker()).subscribe(CHANNEL % user_id)
+    try:
+        yield f'retry: {RECONNECT_DELAY}\n\n'
+        while True:
+            message = await subscription.get(timeout=heartbeat)
+            if message is None:
+                yield ': ping\n\n'
+            else:
+                yield format_message(message)
+    finally:
+        await subscription.close()
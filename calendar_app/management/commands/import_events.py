@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from calendar_app.importers import ENCODING_ERROR, EventImporter
+from calendar_app.models import Event
+
+
+class Command(BaseCommand):
+    help = 'Импорт событий фотографа из файла .ics или .csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email фотографа')
+        parser.add_argument('path', help='Путь к файлу .ics или .csv')
+        parser.add_argument(
+            '--event-type',
+            default='photoshoot',
+            choices=[key for key, label in Event.EVENT_TYPE_CHOICES],
+            help='Тип события, если он не указан в файле'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер порции для bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Пользователь {options["email"]} не найден')
+
+        def progress(processed, created, errors):
+            self.stdout.write(f'Обработано: {processed}, создано: {created}, ошибок: {errors}')
+
+        importer = EventImporter(
+            user,
+            default_event_type=options['event_type'],
+            batch_size=options['batch_size'],
+            progress=progress,
+        )
+        try:
+            with open(options['path'], 'rb') as file:
+                if options['path'].lower().endswith('.ics'):
+                    importer.import_ics(file)
+                else:
+                    importer.import_csv(file)
+        except UnicodeDecodeError:
+            raise CommandError(ENCODING_ERROR)
+
+        for line, message in importer.errors:
+            self.stderr.write(f'Строка {line}: {message}')
+        self.stdout.write(self.style.SUCCESS(f'Импортировано событий: {importer.created} из {importer.processed}'))
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from calendar_app.models import Event
+from calendar_app.recurrence import materialize
+
+
+class Command(BaseCommand):
+    help = 'Материализация вхождений повторяющихся событий для часто запрашиваемого окна'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days-back', type=int, default=30, help='Начало окна: столько дней назад')
+        parser.add_argument('--days', type=int, default=90, help='Конец окна: столько дней вперед')
+        parser.add_argument('--email', help='Только серии этого фотографа')
+
+    def handle(self, *args, **options):
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        window_start = today - timedelta(days=options['days_back'])
+        window_end = today + timedelta(days=options['days'])
+
+        series = Event.objects.exclude(recurrence_rule='').filter(
+            Q(recurrence_end__isnull=True) | Q(recurrence_end__gte=window_start),
+            start_datetime__lt=window_end,
+        )
+        if options['email']:
+            series = series.filter(photographer__email=options['email'])
+
+        total = 0
+        for count, event in enumerate(series.iterator(), start=1):
+            total += materialize(event, window_start, window_end)
+            if count % 100 == 0:
+                self.stdout.write(f'Обработано серий: {count}')
+        self.stdout.write(self.style.SUCCESS(f'Материализовано вхождений: {total}'))
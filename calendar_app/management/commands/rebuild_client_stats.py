@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from calendar_app.client_stats import rebuild_client_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчет статистики съемок клиентов по событиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--photographer', type=int, action='append', help='Только клиенты этого фотографа (можно несколько раз)'
+        )
+        parser.add_argument(
+            '--due', action='store_true', help='Только клиенты, чья следующая съемка уже прошла (запуск по расписанию)'
+        )
+
+    def handle(self, *args, **options):
+        count = rebuild_client_stats(options['photographer'], due=options['due'])
+        self.stdout.write(self.style.SUCCESS(f'Обновлено клиентов: {count}'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from calendar_app.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = 'Пересборка сводки загрузки студий по событиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--studio', type=int, action='append', help='Только эта студия (можно несколько раз)')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = rebuild_occupancy(options['studio'])
+        self.stdout.write(self.style.SUCCESS(f'Записано строк сводки: {count}'))
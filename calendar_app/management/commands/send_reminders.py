@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calendar_app.reminders import REMINDER_BATCH_SIZE, send_birthday_reminders, send_due_reminders
+
+
+class Command(BaseCommand):
+    help = 'Отправка напоминаний о предстоящих событиях и днях рождения клиентов (разово из cron или в цикле с --loop)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, проверяя напоминания каждые --interval секунд')
+        parser.add_argument('--interval', type=int, default=60, help='Пауза между проверками в режиме --loop')
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE, help='Событий в одной порции писем')
+
+    def handle(self, *args, **options):
+        while True:
+            sent = send_due_reminders(batch_size=options['batch_size'])
+            sent += send_birthday_reminders(batch_size=options['batch_size'])
+            if sent or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f'Отправлено напоминаний: {sent}'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,26 @@
+# Generated by Django 5.2 on 2026-10-18 19:03
+
+import calendar_app.models
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGistExtension
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0005_alter_event_description'),
+    ]
+
+    operations = [
+        BtreeGistExtension(),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['photographer', 'event_type', 'start_datetime'], name='event_photographer_type_start'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GistIndex(models.F('photographer'), calendar_app.models.TsTzRange(models.F('start_datetime'), django.db.models.functions.comparison.Coalesce(models.F('end_datetime'), models.F('start_datetime')), models.Value('[]')), name='event_photographer_interval'),
+        ),
+    ]
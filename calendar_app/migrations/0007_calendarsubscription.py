@@ -0,0 +1,29 @@
+# Generated by Django 5.2 on 2026-10-18 19:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0006_event_interval_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalendarSubscription',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True, verbose_name='токен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата создания')),
+                ('photographer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='calendar_subscription', to=settings.AUTH_USER_MODEL, verbose_name='фотограф')),
+            ],
+            options={
+                'verbose_name': 'подписка на календарь',
+                'verbose_name_plural': 'подписки на календарь',
+            },
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 5.2 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0007_calendarsubscription'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField(verbose_name='исходное начало вхождения')),
+                ('start_datetime', models.DateTimeField(verbose_name='дата и время начала')),
+                ('end_datetime', models.DateTimeField(verbose_name='дата и время окончания')),
+                ('title', models.CharField(max_length=255, verbose_name='название')),
+                ('description', models.TextField(blank=True, verbose_name='описание')),
+            ],
+            options={
+                'verbose_name': 'вхождение серии',
+                'verbose_name_plural': 'вхождения серий',
+                'ordering': ['start_datetime'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RecurrenceException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField(verbose_name='исходное начало вхождения')),
+                ('is_cancelled', models.BooleanField(default=False, verbose_name='отменено')),
+                ('start_datetime', models.DateTimeField(blank=True, null=True, verbose_name='новое начало')),
+                ('end_datetime', models.DateTimeField(blank=True, null=True, verbose_name='новое окончание')),
+                ('title', models.CharField(blank=True, max_length=255, verbose_name='новое название')),
+                ('description', models.TextField(blank=True, max_length=500, verbose_name='новое описание')),
+            ],
+            options={
+                'verbose_name': 'исключение из серии',
+                'verbose_name_plural': 'исключения из серии',
+                'ordering': ['original_start'],
+            },
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='materialized_from',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='вхождения материализованы с'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='materialized_until',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='вхождения материализованы до'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_end',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Окончание последнего повторения; пусто для бесконечной серии', null=True, verbose_name='окончание серии'),
+        ),
+        migrations.AddField(
+            model_name='event',
+            name='recurrence_rule',
+            field=models.CharField(blank=True, help_text='Правило RRULE (RFC 5545), например FREQ=WEEKLY;BYDAY=MO', max_length=255, verbose_name='правило повторения'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('recurrence_rule', ''), _negated=True), fields=['photographer', 'start_datetime'], name='event_series_start'),
+        ),
+        migrations.AddField(
+            model_name='eventoccurrence',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occurrences', to='calendar_app.event', verbose_name='событие'),
+        ),
+        migrations.AddField(
+            model_name='eventoccurrence',
+            name='photographer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_occurrences', to=settings.AUTH_USER_MODEL, verbose_name='фотограф'),
+        ),
+        migrations.AddField(
+            model_name='recurrenceexception',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurrence_exceptions', to='calendar_app.event', verbose_name='событие'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['event', 'start_datetime'], name='occurrence_event_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='recurrenceexception',
+            constraint=models.UniqueConstraint(fields=('event', 'original_start'), name='recurrence_exception_unique'),
+        ),
+    ]
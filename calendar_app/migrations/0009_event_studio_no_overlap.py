@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-18 19:24
+
+import logging
+
+import calendar_app.models
+import django.contrib.postgres.constraints
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def detach_overlapping_bookings(apps, schema_editor):
+    """
+    До ограничения бронирования студий не проверялись. Из пересекающихся
+    бронирований одной студии остается раньше начавшееся, у остальных
+    студия снимается (события остаются в календаре), их id пишутся в журнал
+    """
+    Event = apps.get_model('calendar_app', 'Event')
+    bookings = Event.objects.filter(studio__isnull=False, recurrence_rule='').order_by(
+        'studio_id', 'start_datetime', 'pk',
+    ).values_list('pk', 'studio_id', 'start_datetime', 'end_datetime')
+    detached = []
+    studio_id, busy_until = None, None
+    for pk, booking_studio_id, start, end in bookings.iterator(chunk_size=5000):
+        if booking_studio_id != studio_id:
+            studio_id, busy_until = booking_studio_id, None
+        # Пустой интервал [начало, начало) ни с чем не пересекается
+        if end is None or end <= start:
+            continue
+        if busy_until is not None and start < busy_until:
+            detached.append(pk)
+            continue
+        busy_until = end
+    if detached:
+        Event.objects.filter(pk__in=detached).update(studio=None)
+        logger.warning(
+            'Студия снята с %d пересекающихся бронирований (id событий: %s)',
+            len(detached), ', '.join(map(str, detached)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0008_event_recurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(detach_overlapping_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('studio__isnull', False), ('recurrence_rule', '')), expressions=[(calendar_app.models.TsTzRange(models.F('start_datetime'), django.db.models.functions.comparison.Coalesce(models.F('end_datetime'), models.F('start_datetime')), models.Value('[)')), '&&'), ('studio', '=')], name='event_studio_no_overlap', violation_error_message='Студия уже забронирована на это время'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0009_event_studio_no_overlap'),
+        ('studios', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudioOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='день')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='час')),
+                ('minutes', models.IntegerField(default=0, verbose_name='забронировано минут')),
+                ('studio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='studios.studio', verbose_name='студия/локация')),
+            ],
+            options={
+                'verbose_name': 'загрузка студии',
+                'verbose_name_plural': 'загрузка студий',
+                'ordering': ['studio', 'day', 'hour'],
+                'constraints': [models.UniqueConstraint(fields=('studio', 'day', 'hour'), name='studio_occupancy_unique')],
+            },
+        ),
+    ]
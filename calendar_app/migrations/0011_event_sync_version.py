@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import sync.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0010_studiooccupancy'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='sync_version',
+            field=models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['photographer', 'sync_version'], name='event_sync'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0011_event_sync_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['photographer', 'start_datetime', 'id'], name='event_agenda'),
+        ),
+    ]
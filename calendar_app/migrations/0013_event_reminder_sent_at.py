@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-18 20:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0012_event_agenda_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='напоминание отправлено'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('recurrence_rule', ''), ('reminder_sent_at__isnull', True)), fields=['start_datetime'], name='event_reminder_due'),
+        ),
+    ]
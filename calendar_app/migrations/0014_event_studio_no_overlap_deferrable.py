@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 21:05
+
+import calendar_app.models
+import django.contrib.postgres.constraints
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0013_event_reminder_sent_at'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='event',
+            name='event_studio_no_overlap',
+        ),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('studio__isnull', False), ('recurrence_rule', '')), deferrable=models.Deferrable['IMMEDIATE'], expressions=[(calendar_app.models.TsTzRange(models.F('start_datetime'), django.db.models.functions.comparison.Coalesce(models.F('end_datetime'), models.F('start_datetime')), models.Value('[)')), '&&'), ('studio', '=')], name='event_studio_no_overlap', violation_error_message='Студия уже забронирована на это время'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+# Начальное заполнение статистики съемок клиентов (дальше ее поддерживают сигналы Event)
+FILL_CLIENT_STATS_SQL = """
+UPDATE clients_client AS client SET
+    shoot_count = stats.shoot_count,
+    last_shoot_at = stats.last_shoot_at,
+    next_shoot_at = stats.next_shoot_at
+FROM (
+    SELECT client_id,
+           COUNT(*) AS shoot_count,
+           MAX(start_datetime) FILTER (WHERE start_datetime <= NOW()) AS last_shoot_at,
+           MIN(start_datetime) FILTER (WHERE start_datetime > NOW()) AS next_shoot_at
+    FROM calendar_app_event
+    WHERE event_type = 'photoshoot' AND client_id IS NOT NULL
+    GROUP BY client_id
+) AS stats
+WHERE client.id = stats.client_id;
+
+UPDATE clients_client AS client SET favorite_studio_id = favorite.studio_id
+FROM (
+    SELECT DISTINCT ON (client_id) client_id, studio_id
+    FROM calendar_app_event
+    WHERE event_type = 'photoshoot' AND client_id IS NOT NULL AND studio_id IS NOT NULL
+    GROUP BY client_id, studio_id
+    ORDER BY client_id, COUNT(*) DESC, MAX(start_datetime) DESC
+) AS favorite
+WHERE client.id = favorite.client_id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0014_event_studio_no_overlap_deferrable'),
+        ('clients', '0008_client_shoot_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('client__isnull', False)), fields=['client', 'event_type', 'start_datetime'], name='event_client_shoots'),
+        ),
+        migrations.RunSQL(FILL_CLIENT_STATS_SQL, migrations.RunSQL.noop),
+    ]
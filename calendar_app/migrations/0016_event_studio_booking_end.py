@@ -0,0 +1,91 @@
+# Generated by Django 5.2 on 2026-10-19 10:20
+
+import logging
+from collections import Counter
+from datetime import timedelta
+
+import sync.fields
+from django.db import migrations, models
+from django.db.models import F, Min, Q
+from django.db.models.functions import Coalesce
+
+from calendar_app.occupancy import UPSERT_SQL, get_occupancy_deltas
+
+logger = logging.getLogger(__name__)
+
+# Окончание бронирования без окончания: через час после начала, но не позже
+# начала следующего бронирования той же студии
+DEFAULT_BOOKING_LENGTH = timedelta(hours=1)
+
+
+def fill_booking_end(apps, schema_editor):
+    """
+    Задает окончание бронированиям студии без окончания. Если время уже
+    занято другим бронированием, со события снимается студия. Вклад новых
+    интервалов добавляется в сводку загрузки студий
+    """
+    Event = apps.get_model('calendar_app', 'Event')
+    StudioOccupancy = apps.get_model('calendar_app', 'StudioOccupancy')
+    open_ended = Event.objects.filter(studio__isnull=False, end_datetime__isnull=True)
+
+    # Серии ограничением не проверяются и в сводку не входят
+    open_ended.exclude(recurrence_rule='').update(
+        end_datetime=F('start_datetime') + DEFAULT_BOOKING_LENGTH,
+        recurrence_end=F('recurrence_end') + DEFAULT_BOOKING_LENGTH,
+        sync_version=sync.fields.NextSyncVersion(),
+    )
+
+    bookings = Event.objects.filter(recurrence_rule='').alias(
+        booking_end=Coalesce('end_datetime', 'start_datetime'),
+    )
+    deltas = Counter()
+    detached = []
+    rows = list(
+        open_ended.filter(recurrence_rule='').order_by('studio_id', 'start_datetime', 'pk')
+        .values_list('pk', 'studio_id', 'start_datetime')
+    )
+    # Строки обновляются по одной, чтобы следующие проверки видели уже заданные окончания
+    for pk, studio_id, start in rows:
+        others = bookings.filter(studio_id=studio_id).exclude(pk=pk)
+        end = start + DEFAULT_BOOKING_LENGTH
+        next_start = others.filter(start_datetime__gt=start, start_datetime__lt=end).aggregate(
+            next_start=Min('start_datetime'),
+        )['next_start']
+        if next_start is not None:
+            end = next_start
+        busy = others.filter(
+            Q(booking_end__gt=F('start_datetime')), start_datetime__lt=end, booking_end__gt=start,
+        ).exists()
+        if busy:
+            Event.objects.filter(pk=pk).update(studio=None, sync_version=sync.fields.NextSyncVersion())
+            detached.append(pk)
+            continue
+        Event.objects.filter(pk=pk).update(end_datetime=end, sync_version=sync.fields.NextSyncVersion())
+        deltas.update(get_occupancy_deltas((studio_id, start, end)))
+
+    occupancy = [(studio_id, day, hour, minutes) for (studio_id, day, hour), minutes in deltas.items() if minutes]
+    if occupancy:
+        table = schema_editor.connection.ops.quote_name(StudioOccupancy._meta.db_table)
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(UPSERT_SQL.format(table=table), occupancy)
+    if detached:
+        logger.warning(
+            'Время занято другим бронированием, студия снята с %d событий без окончания (id событий: %s)',
+            len(detached), ', '.join(map(str, detached)),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0015_event_client_shoots'),
+        ('sync', '0002_sync_version_function'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_booking_end, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='event',
+            constraint=models.CheckConstraint(condition=models.Q(('studio__isnull', True), ('end_datetime__isnull', False), _connector='OR'), name='event_studio_booking_end', violation_error_message='Укажите окончание бронирования студии'),
+        ),
+    ]
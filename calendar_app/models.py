@@ -1,9 +1,43 @@
+import secrets
+
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GistIndex
 from django.db import models
-from django.urls import reverse
+from django.db.models import Deferrable, F, Func, Q, Value
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from users.models import CustomUser
 from clients.models import Client
 from studios.models import Studio
+from sync.fields import sync_version_field
+from .recurrence import get_recurrence_end
+
+
+class TsTzRange(Func):
+    """
+    Функция PostgreSQL TSTZRANGE(start, end, bounds)
+    """
+    function = 'TSTZRANGE'
+    output_field = DateTimeRangeField()
+
+
+def event_interval():
+    """
+    Интервал события [начало, окончание] как tstzrange.
+    События без даты окончания считаются мгновенными.
+    Выражение должно совпадать с выражением GiST-индекса, иначе индекс не используется.
+    """
+    return TsTzRange(F('start_datetime'), Coalesce(F('end_datetime'), F('start_datetime')), Value('[]'))
+
+
+def booking_interval():
+    """
+    Интервал бронирования [начало, окончание): съемки, идущие встык, не пересекаются.
+    Выражение должно совпадать с выражением ограничения event_studio_no_overlap
+    """
+    return TsTzRange(F('start_datetime'), Coalesce(F('end_datetime'), F('start_datetime')), Value('[)'))
+
 
 class Event(models.Model):
     """
@@ -48,17 +82,94 @@ class Event(models.Model):
     description = models.TextField(_('описание'), blank=True, max_length=500)
     is_all_day = models.BooleanField(_('весь день'), default=False)
     color = models.CharField(_('цвет'), max_length=20, default='#3788d8')
+    recurrence_rule = models.CharField(
+        _('правило повторения'),
+        max_length=255,
+        blank=True,
+        help_text=_('Правило RRULE (RFC 5545), например FREQ=WEEKLY;BYDAY=MO')
+    )
+    recurrence_end = models.DateTimeField(
+        _('окончание серии'),
+        null=True,
+        blank=True,
+        editable=False,
+        help_text=_('Окончание последнего повторения; пусто для бесконечной серии')
+    )
+    materialized_from = models.DateTimeField(_('вхождения материализованы с'), null=True, blank=True, editable=False)
+    materialized_until = models.DateTimeField(_('вхождения материализованы до'), null=True, blank=True, editable=False)
+    reminder_sent_at = models.DateTimeField(_('напоминание отправлено'), null=True, blank=True, editable=False)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     updated_at = models.DateTimeField(_('дата обновления'), auto_now=True)
+    sync_version = sync_version_field()
     
     class Meta:
         verbose_name = _('событие')
         verbose_name_plural = _('события')
         ordering = ['start_datetime']
+        indexes = [
+            models.Index(
+                fields=['photographer', 'event_type', 'start_datetime'],
+                name='event_photographer_type_start',
+            ),
+            GistIndex(
+                F('photographer'),
+                event_interval(),
+                name='event_photographer_interval',
+            ),
+            models.Index(
+                fields=['photographer', 'start_datetime'],
+                condition=~Q(recurrence_rule=''),
+                name='event_series_start',
+            ),
+            models.Index(fields=['photographer', 'sync_version'], name='event_sync'),
+            models.Index(fields=['photographer', 'start_datetime', 'id'], name='event_agenda'),
+            models.Index(
+                fields=['start_datetime'],
+                condition=Q(reminder_sent_at__isnull=True, recurrence_rule=''),
+                name='event_reminder_due',
+            ),
+            # Статистика съемок клиента (calendar_app.client_stats)
+            models.Index(
+                fields=['client', 'event_type', 'start_datetime'],
+                condition=Q(client__isnull=False),
+                name='event_client_shoots',
+            ),
+        ]
+        constraints = [
+            # Студию нельзя забронировать дважды на пересекающееся время.
+            # Серии проверить ограничением нельзя: их вхождения не хранятся в строках,
+            # их проверяют формы (calendar_app.booking).
+            # Проверка в конце оператора: массовый перенос событий, идущих встык, не конфликтует сам с собой
+            ExclusionConstraint(
+                name='event_studio_no_overlap',
+                expressions=[
+                    (booking_interval(), RangeOperators.OVERLAPS),
+                    ('studio', RangeOperators.EQUAL),
+                ],
+                condition=Q(studio__isnull=False, recurrence_rule=''),
+                deferrable=Deferrable.IMMEDIATE,
+                violation_error_message=_('Студия уже забронирована на это время'),
+            ),
+            # Бронирование без окончания - пустой интервал, ограничение выше его бы не заметило
+            models.CheckConstraint(
+                condition=Q(studio__isnull=True) | Q(end_datetime__isnull=False),
+                name='event_studio_booking_end',
+                violation_error_message=_('Укажите окончание бронирования студии'),
+            ),
+        ]
         
     def __str__(self):
         return self.title
     
+    def save(self, *args, **kwargs):
+        """Вычисляем окончание серии для выборки повторяющихся событий по окну"""
+        self.recurrence_end = get_recurrence_end(self.recurrence_rule, self.start_datetime, self.end_datetime)
+        super().save(*args, **kwargs)
+
+    @property
+    def is_recurring(self):
+        return bool(self.recurrence_rule)
+
     @property
     def event_type_display(self):
         """Возвращает отображаемое значение типа события"""
@@ -74,26 +185,147 @@ class Event(models.Model):
 
 
     @staticmethod
-    def serialize_for_calendar(events):
-        return [
-            {
-                'id': event.id,
-                'title': event.title,
-                'start': event.start_datetime.isoformat(),
-                'end': event.end_datetime.isoformat() if event.end_datetime is not None else event.start_datetime.isoformat(),
-                'allDay': event.is_all_day,
-                'color': event.color,
-                'url': reverse('calendar:event_detail', args=[event.id]),
-                'extendedProps': {
-                    'event_type': event.event_type,
-                    'event_type_display': str(event.get_event_type_display()),  # <- используй встроенный Django метод
-                    'description': event.description,
-                    'client': event.client.get_full_name() if event.client else None,
-                    'studio': event.studio.name if event.studio else None,
-                }
-            }
-            for event in events
+    def serialize_for_calendar(events, start=None, end=None):
+        """Сериализует queryset событий в формат FullCalendar; серии разворачиваются в окне start-end"""
+        from .feed import serialize_feed
+        return serialize_feed(events, start, end)
+
+
+class CalendarSubscription(models.Model):
+    """
+    Токен подписки на календарь фотографа в формате iCalendar
+    """
+    photographer = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='calendar_subscription',
+        verbose_name=_('фотограф')
+    )
+    token = models.CharField(_('токен'), max_length=64, unique=True)
+    created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('подписка на календарь')
+        verbose_name_plural = _('подписки на календарь')
+
+    def __str__(self):
+        return f"{self.photographer} ({self.created_at:%d.%m.%Y})"
+
+    @staticmethod
+    def generate_token():
+        return secrets.token_urlsafe(32)
+
+    @classmethod
+    def for_user(cls, user, regenerate=False):
+        """Возвращает подписку пользователя, создавая ее при необходимости"""
+        subscription, created = cls.objects.get_or_create(
+            photographer=user, defaults={'token': cls.generate_token()}
+        )
+        if regenerate and not created:
+            subscription.token = cls.generate_token()
+            subscription.save(update_fields=['token'])
+        return subscription
+
+
+class RecurrenceException(models.Model):
+    """
+    Исключение из серии повторяющегося события: отмена или изменение одного вхождения
+    """
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name='recurrence_exceptions',
+        verbose_name=_('событие')
+    )
+    original_start = models.DateTimeField(_('исходное начало вхождения'))
+    is_cancelled = models.BooleanField(_('отменено'), default=False)
+    start_datetime = models.DateTimeField(_('новое начало'), null=True, blank=True)
+    end_datetime = models.DateTimeField(_('новое окончание'), null=True, blank=True)
+    title = models.CharField(_('новое название'), max_length=255, blank=True)
+    description = models.TextField(_('новое описание'), blank=True, max_length=500)
+
+    class Meta:
+        verbose_name = _('исключение из серии')
+        verbose_name_plural = _('исключения из серии')
+        ordering = ['original_start']
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'original_start'], name='recurrence_exception_unique'),
         ]
 
+    def __str__(self):
+        return f"{self.event} ({self.original_start:%d.%m.%Y %H:%M})"
+
+    def apply(self, occurrence):
+        """Применяет изменения к вхождению серии"""
+        start = self.start_datetime or occurrence.start_datetime
+        if self.end_datetime:
+            end = self.end_datetime
+        else:
+            end = start + (occurrence.end_datetime - occurrence.start_datetime)
+        return occurrence._replace(
+            start_datetime=start,
+            end_datetime=end,
+            title=self.title or occurrence.title,
+            description=self.description or occurrence.description,
+        )
 
 
+class EventOccurrence(models.Model):
+    """
+    Материализованное вхождение серии для часто запрашиваемых окон
+    """
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name='occurrences',
+        verbose_name=_('событие')
+    )
+    photographer = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='event_occurrences',
+        verbose_name=_('фотограф')
+    )
+    original_start = models.DateTimeField(_('исходное начало вхождения'))
+    start_datetime = models.DateTimeField(_('дата и время начала'))
+    end_datetime = models.DateTimeField(_('дата и время окончания'))
+    title = models.CharField(_('название'), max_length=255)
+    description = models.TextField(_('описание'), blank=True)
+
+    class Meta:
+        verbose_name = _('вхождение серии')
+        verbose_name_plural = _('вхождения серий')
+        ordering = ['start_datetime']
+        indexes = [
+            models.Index(fields=['event', 'start_datetime'], name='occurrence_event_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} ({self.start_datetime:%d.%m.%Y %H:%M})"
+
+
+class StudioOccupancy(models.Model):
+    """
+    Сводка загрузки студии: забронированные минуты за час дня (местное время).
+    Поддерживается сигналами Event и пересобирается командой rebuild_occupancy
+    """
+    studio = models.ForeignKey(
+        Studio,
+        on_delete=models.CASCADE,
+        related_name='occupancy',
+        verbose_name=_('студия/локация')
+    )
+    day = models.DateField(_('день'))
+    hour = models.PositiveSmallIntegerField(_('час'))
+    minutes = models.IntegerField(_('забронировано минут'), default=0)
+
+    class Meta:
+        verbose_name = _('загрузка студии')
+        verbose_name_plural = _('загрузка студий')
+        ordering = ['studio', 'day', 'hour']
+        constraints = [
+            models.UniqueConstraint(fields=['studio', 'day', 'hour'], name='studio_occupancy_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.studio} {self.day:%d.%m.%Y} {self.hour:02d}:00 — {self.minutes} мин"
@@ -0,0 +1,188 @@
+"""
+Загрузка студий.
+
+Забронированное время хранится в сводной таблице StudioOccupancy: минуты
+за каждый час каждого дня (в местном времени) по студии. Сводка
+обновляется приращениями из сигналов Event и пакетного импорта, а
+аналитика по дням, неделям и часам недели читает только ее, поэтому
+стоимость отчета зависит от длины периода, а не от числа бронирований.
+
+Повторяющиеся серии в сводку не попадают: их вхождения не хранятся в
+строках Event (как и в ограничении event_studio_no_overlap).
+"""
+from collections import Counter
+from datetime import date, timedelta, timezone as dt_timezone
+
+from django.db import connection
+from django.db.models import Sum
+from django.db.models.functions import ExtractIsoWeekDay, TruncWeek
+from django.utils import timezone
+
+from .models import Event, StudioOccupancy
+
+MINUTES_PER_DAY = 24 * 60
+
+# Самый длинный период отчета
+MAX_PERIOD_DAYS = 3 * 366
+
+UPSERT_SQL = (
+    'INSERT INTO {table} (studio_id, day, hour, minutes) VALUES (%s, %s, %s, %s) '
+    'ON CONFLICT (studio_id, day, hour) DO UPDATE SET minutes = {table}.minutes + EXCLUDED.minutes'
+)
+
+
+def booking_state(event):
+    """
+    Часть события, влияющая на сводку: (студия, начало, окончание) или None
+    """
+    if not event.studio_id or event.recurrence_rule or event.end_datetime is None:
+        return None
+    if event.end_datetime <= event.start_datetime:
+        return None
+    return event.studio_id, event.start_datetime, event.end_datetime
+
+
+def split_by_hour(start, end):
+    """
+    Разбивает интервал [start, end) по часам местного времени: {(день, час): секунды}
+    """
+    buckets = Counter()
+    cursor = start
+    while cursor < end:
+        local = timezone.localtime(cursor)
+        hour_start = local.replace(minute=0, second=0, microsecond=0)
+        # Следующий час считается в UTC, чтобы переход на летнее время не дублировал часы
+        next_hour = min(hour_start.astimezone(dt_timezone.utc) + timedelta(hours=1), end)
+        buckets[local.date(), local.hour] += (next_hour - cursor).total_seconds()
+        cursor = next_hour
+    return buckets
+
+
+def get_occupancy_deltas(state, sign=1):
+    """
+    Вклад бронирования в сводку: {(студия, день, час): минуты}.
+    Вклад детерминирован, поэтому удаление вычитает ровно то, что было добавлено
+    """
+    if state is None:
+        return Counter()
+    studio_id, start, end = state
+    return Counter({
+        (studio_id, day, hour): sign * round(seconds / 60)
+        for (day, hour), seconds in split_by_hour(start, end).items()
+    })
+
+
+def apply_occupancy(deltas):
+    """
+    Прибавляет приращения к сводке одним пакетным upsert
+    """
+    rows = [(studio_id, day, hour, minutes) for (studio_id, day, hour), minutes in deltas.items() if minutes]
+    if not rows:
+        return
+    sql = UPSERT_SQL.format(table=connection.ops.quote_name(StudioOccupancy._meta.db_table))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def update_occupancy(old_state, new_state):
+    """
+    Переносит вклад события из старого состояния в новое
+    """
+    if old_state == new_state:
+        return
+    deltas = get_occupancy_deltas(new_state)
+    deltas.update(get_occupancy_deltas(old_state, sign=-1))
+    apply_occupancy(deltas)
+
+
+def add_events_occupancy(events):
+    """
+    Добавляет вклад событий, созданных без сигналов (bulk_create)
+    """
+    deltas = Counter()
+    for event in events:
+        deltas.update(get_occupancy_deltas(booking_state(event)))
+    apply_occupancy(deltas)
+
+
+def rebuild_occupancy(studio_ids=None, batch_size=5000):
+    """
+    Пересобирает сводку по событиям; возвращает число записанных строк
+    """
+    events = Event.objects.filter(studio__isnull=False, recurrence_rule='', end_datetime__isnull=False)
+    rows = StudioOccupancy.objects.all()
+    if studio_ids:
+        events = events.filter(studio_id__in=studio_ids)
+        rows = rows.filter(studio_id__in=studio_ids)
+
+    totals = Counter()
+    for event in events.only('studio_id', 'start_datetime', 'end_datetime', 'recurrence_rule').iterator(chunk_size=batch_size):
+        totals.update(get_occupancy_deltas(booking_state(event)))
+
+    rows.delete()
+    StudioOccupancy.objects.bulk_create(
+        (
+            StudioOccupancy(studio_id=studio_id, day=day, hour=hour, minutes=minutes)
+            for (studio_id, day, hour), minutes in totals.items() if minutes
+        ),
+        batch_size=batch_size,
+    )
+    return sum(1 for minutes in totals.values() if minutes)
+
+
+def parse_period(params, today=None):
+    """
+    Период отчета из GET-параметров start/end (YYYY-MM-DD); по умолчанию последний год.
+    Некорректная дата вызывает ValueError
+    """
+    today = today or timezone.localdate()
+    start = date.fromisoformat(params['start']) if params.get('start') else today - timedelta(days=364)
+    end = date.fromisoformat(params['end']) if params.get('end') else today
+    if end < start or (end - start).days > MAX_PERIOD_DAYS:
+        raise ValueError(f'Некорректный период: {start} - {end}')
+    return start, end
+
+
+def get_studio_occupancy(studio_id, start, end):
+    """
+    Загрузка студии за период [start, end] по дням, неделям и часам недели.
+    Загрузка (utilization) - доля забронированного времени от календарного
+    """
+    rows = StudioOccupancy.objects.filter(studio_id=studio_id, day__range=(start, end))
+    total_days = (end - start).days + 1
+
+    days = [
+        {'day': row['day'], 'minutes': row['minutes'], 'utilization': row['minutes'] / MINUTES_PER_DAY}
+        for row in rows.values('day').annotate(minutes=Sum('minutes')).order_by('day')
+    ]
+
+    weeks = []
+    for row in rows.annotate(week=TruncWeek('day')).values('week').annotate(minutes=Sum('minutes')).order_by('week'):
+        week_start = max(row['week'], start)
+        week_end = min(row['week'] + timedelta(days=6), end)
+        capacity = ((week_end - week_start).days + 1) * MINUTES_PER_DAY
+        weeks.append({'week': row['week'], 'minutes': row['minutes'], 'utilization': row['minutes'] / capacity})
+
+    # Сколько раз каждый день недели встречается в периоде
+    weekday_counts = Counter((start + timedelta(days=offset)).isoweekday() for offset in range(total_days))
+    hours_of_week = [
+        {
+            'weekday': row['weekday'],
+            'hour': row['hour'],
+            'minutes': row['minutes'],
+            'utilization': row['minutes'] / (weekday_counts[row['weekday']] * 60),
+        }
+        for row in rows.annotate(weekday=ExtractIsoWeekDay('day'))
+        .values('weekday', 'hour').annotate(minutes=Sum('minutes')).order_by('weekday', 'hour')
+    ]
+
+    booked = sum(day['minutes'] for day in days)
+    return {
+        'start': start,
+        'end': end,
+        'minutes': booked,
+        'utilization': booked / (total_days * MINUTES_PER_DAY),
+        'days': days,
+        'weeks': weeks,
+        'hours_of_week': hours_of_week,
+    }
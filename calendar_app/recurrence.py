@@ -0,0 +1,225 @@
+"""
+Повторяющиеся события.
+
+Серия хранится одной строкой Event с правилом RRULE (RFC 5545). Вхождения
+разворачиваются лениво и только внутри запрошенного окна; исключения
+(отмененные вхождения) и изменения отдельных вхождений хранятся в
+RecurrenceException. Для часто запрашиваемых окон вхождения можно
+материализовать в EventOccurrence (команда materialize_occurrences), тогда
+лента читает их одним индексным запросом без разворачивания.
+"""
+from collections import namedtuple
+from datetime import timedelta, timezone as dt_timezone
+
+from dateutil.parser import parse as parse_datetime
+from dateutil.rrule import rrule as RRule, rrulestr
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+# Ограничение на число вхождений серии с COUNT, чтобы правило не разворачивалось бесконечно долго
+MAX_COUNT = 5000
+
+# Предел вхождений за одно разворачивание: защищает ленту и проверки от частых
+# правил, сохраненных до запрета повторений чаще раза в день
+MAX_OCCURRENCES = 5000
+
+# Правила чаще раза в день дают тысячи вхождений даже в небольшом окне
+SUB_DAILY_FREQS = {'SECONDLY', 'MINUTELY', 'HOURLY'}
+
+Occurrence = namedtuple(
+    'Occurrence', ['original_start', 'start_datetime', 'end_datetime', 'title', 'description']
+)
+
+
+def build_rrule(rule, dtstart):
+    """
+    Строит правило dateutil. Вхождения считаются в местном времени,
+    чтобы серия сохраняла время по часам при переходе на летнее время
+    """
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[len('RRULE:'):]
+    return rrulestr(rule, dtstart=timezone.localtime(dtstart))
+
+
+def get_rule_parts(rule):
+    """
+    Части правила вида FREQ=WEEKLY;COUNT=10 в виде словаря с именами в верхнем регистре
+    """
+    rule = rule.strip()
+    if rule.upper().startswith('RRULE:'):
+        rule = rule[len('RRULE:'):]
+    parts = {}
+    for part in rule.split(';'):
+        name, sep, value = part.partition('=')
+        if sep:
+            parts[name.strip().upper()] = value.strip()
+    return parts
+
+
+def validate_rrule(rule, dtstart=None):
+    """
+    Проверяет правило повторения; возвращает текст ошибки или None
+    """
+    try:
+        rrule = build_rrule(rule, dtstart or timezone.now())
+    except (ValueError, TypeError) as error:
+        return f'Некорректное правило повторения: {error}'
+    if not isinstance(rrule, RRule):
+        return 'Укажите одно правило RRULE, например FREQ=WEEKLY;BYDAY=MO'
+    parts = get_rule_parts(rule)
+    if parts.get('FREQ', '').upper() in SUB_DAILY_FREQS:
+        return 'Серия не может повторяться чаще раза в день'
+    if 'COUNT' in parts and int(parts['COUNT']) > MAX_COUNT:
+        return f'Серия не может содержать больше {MAX_COUNT} повторений'
+    return None
+
+
+def get_duration(start_datetime, end_datetime):
+    return end_datetime - start_datetime if end_datetime else timedelta(0)
+
+
+def get_recurrence_end(rule, start_datetime, end_datetime):
+    """
+    Окончание последнего вхождения серии или None для бесконечной серии
+    """
+    if not rule:
+        return None
+    rrule = build_rrule(rule, start_datetime)
+    parts = get_rule_parts(rule)
+    if 'UNTIL' not in parts and 'COUNT' not in parts:
+        return None
+    if 'UNTIL' in parts:
+        until = parse_datetime(parts['UNTIL'])
+        if timezone.is_naive(until):
+            until = timezone.make_aware(until)
+        last = rrule.before(until, inc=True)
+    else:
+        last = None
+        for last in rrule:
+            pass
+    if last is None:
+        return start_datetime + get_duration(start_datetime, end_datetime)
+    return last + get_duration(start_datetime, end_datetime)
+
+
+def iter_starts(rrule, start, end):
+    """
+    Начала вхождений правила в [start, end], не больше MAX_OCCURRENCES
+    """
+    for occurrence_start in rrule.xafter(start, count=MAX_OCCURRENCES, inc=True):
+        if occurrence_start > end:
+            return
+        yield occurrence_start
+
+
+def get_exceptions_filter(window_start, window_end, duration=timedelta(0)):
+    """
+    Условие на исключения, которые могут попасть в окно: исходное вхождение
+    пересекается с окном (duration - наибольшая длительность вхождения) или
+    измененное вхождение перенесено в окно. Исключения старых вхождений серии
+    не читаются, поэтому стоимость зависит от окна, а не от возраста серии
+    """
+    return (
+        Q(original_start__gte=window_start - duration, original_start__lt=window_end)
+        | Q(start_datetime__gte=window_start - duration, start_datetime__lt=window_end)
+        | Q(end_datetime__gte=window_start) & (
+            Q(start_datetime__lt=window_end) | Q(start_datetime__isnull=True, original_start__lt=window_end)
+        )
+    )
+
+
+def iter_occurrences(series, window_start, window_end, exceptions=()):
+    """
+    Вхождения серии, пересекающиеся с окном [window_start, window_end).
+
+    series - объект или словарь с полями recurrence_rule, start_datetime,
+    end_datetime, title, description; exceptions - исключения серии
+    (достаточно отобранных get_exceptions_filter для этого окна).
+    Перебор ограничен окном и MAX_OCCURRENCES, поэтому бесконечные серии безопасны.
+    """
+    get = series.get if isinstance(series, dict) else lambda name: getattr(series, name)
+    start_datetime = get('start_datetime')
+    duration = get_duration(start_datetime, get('end_datetime'))
+    overrides = {exception.original_start: exception for exception in exceptions}
+
+    # Вхождения, начавшиеся до окна, но еще не закончившиеся, тоже попадают в окно
+    rrule = build_rrule(get('recurrence_rule'), start_datetime)
+    for original_start in iter_starts(rrule, window_start - duration, window_end):
+        # Как и значения из базы, вхождения отдаются в UTC
+        original_start = original_start.astimezone(dt_timezone.utc)
+        exception = overrides.pop(original_start, None)
+        occurrence = Occurrence(
+            original_start, original_start, original_start + duration, get('title'), get('description')
+        )
+        if exception is not None:
+            if exception.is_cancelled:
+                continue
+            occurrence = exception.apply(occurrence)
+        if overlaps(occurrence, window_start, window_end):
+            yield occurrence
+
+    # Вхождения, перенесенные в окно из-за его пределов. Исходное начало должно
+    # оставаться вхождением серии (правило могли изменить); все такие начала
+    # проверяются одним разворачиванием, а не отдельным обходом правила на каждое
+    moved = [exception for exception in overrides.values() if not exception.is_cancelled]
+    if not moved:
+        return
+    first = min(exception.original_start for exception in moved)
+    last = max(exception.original_start for exception in moved)
+    starts = {start.astimezone(dt_timezone.utc) for start in iter_starts(rrule, first, last)}
+    for exception in moved:
+        if exception.original_start not in starts:
+            continue
+        occurrence = exception.apply(Occurrence(
+            exception.original_start, exception.original_start, exception.original_start + duration,
+            get('title'), get('description')
+        ))
+        if overlaps(occurrence, window_start, window_end):
+            yield occurrence
+
+
+def overlaps(occurrence, window_start, window_end):
+    """
+    Та же семантика пересечения, что и в запросе ленты: [начало, окончание] и [start, end)
+    """
+    return occurrence.start_datetime < window_end and occurrence.end_datetime >= window_start
+
+
+def materialize(event, window_start, window_end):
+    """
+    Сохраняет вхождения серии в окне в EventOccurrence и запоминает материализованный диапазон
+    """
+    from .models import Event, EventOccurrence
+
+    duration = get_duration(event.start_datetime, event.end_datetime)
+    exceptions = list(event.recurrence_exceptions.filter(get_exceptions_filter(window_start, window_end, duration)))
+    occurrences = [
+        EventOccurrence(
+            event=event,
+            photographer_id=event.photographer_id,
+            original_start=occurrence.original_start,
+            start_datetime=occurrence.start_datetime,
+            end_datetime=occurrence.end_datetime,
+            title=occurrence.title,
+            description=occurrence.description,
+        )
+        for occurrence in iter_occurrences(event, window_start, window_end, exceptions)
+    ]
+    with transaction.atomic():
+        EventOccurrence.objects.filter(event=event).delete()
+        EventOccurrence.objects.bulk_create(occurrences)
+        # update() без сигналов, чтобы не сбрасывать только что построенные вхождения
+        Event.objects.filter(pk=event.pk).update(materialized_from=window_start, materialized_until=window_end)
+    return len(occurrences)
+
+
+def clear_materialized(event_id):
+    """
+    Удаляет материализованные вхождения серии после ее изменения
+    """
+    from .models import Event, EventOccurrence
+
+    EventOccurrence.objects.filter(event_id=event_id).delete()
+    Event.objects.filter(pk=event_id).update(materialized_from=None, materialized_until=None)
@@ -0,0 +1,227 @@
+"""
+Напоминания о предстоящих событиях по email.
+
+Каждый проход выбирает порцию событий, начинающихся в ближайшие
+CALENDAR_REMINDER_LEAD_HOURS часов и еще без напоминания, одним запросом
+по частичному индексу event_reminder_due. Строки блокируются через
+SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько экземпляров команды
+не отправят одно напоминание дважды. Порция отмечается одним UPDATE и
+фиксируется до отправки: письма уходят вне транзакции, и сбой почты не
+откатывает отметку у уже доставленных. Письма отправляются по событиям
+через общее соединение; если отправка упала, отметка снимается только с
+событий, письма которых не ушли, и ошибка пробрасывается дальше.
+
+Фотограф получает напоминание о съемках и постах, клиент с email - о своих
+съемках. Серии не напоминаются: их вхождения не хранятся в строках Event.
+
+О днях рождения клиентов в ближайшие CLIENT_BIRTHDAY_REMINDER_DAYS дней
+фотограф получает одно письмо на порцию клиентов. Клиенты выбираются по
+индексу client_birthday_due и так же блокируются SKIP LOCKED; год
+напомненного дня рождения запоминается в birthday_reminder_year и, как и
+отметка событий, фиксируется до отправки. Период короче года
+(MAX_BIRTHDAY_REMINDER_DAYS): в более длинном одно число ММДД попадает в
+диапазоны двух лет, и клиент, отмеченный годом ближайшего дня рождения,
+выбирался бы снова по диапазону следующего года бесконечно.
+"""
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.template import engines
+from django.utils import timezone
+
+from .models import Event
+from clients.birthdays import get_birthday_segments, set_next_birthday
+from clients.models import Client
+
+REMINDER_BATCH_SIZE = 500
+
+# Самый длинный период напоминаний о днях рождения: каждое число ММДД в нем встречается один раз
+MAX_BIRTHDAY_REMINDER_DAYS = 364
+
+# Шаблоны компилируются один раз и переиспользуются для всех писем
+PHOTOGRAPHER_SUBJECT = engines['django'].from_string(
+    '{% autoescape off %}Напоминание: {{ event.event_type_display }} «{{ event.title }}» '
+    '{{ start|date:"d.m.Y H:i" }}{% endautoescape %}'
+)
+PHOTOGRAPHER_BODY = engines['django'].from_string(
+    '{% autoescape off %}Здравствуйте, {{ event.photographer.first_name }}!\n\n'
+    '{{ event.event_type_display }} «{{ event.title }}» начнется {{ start|date:"d.m.Y" }} в {{ start|date:"H:i" }}.\n'
+    '{% if event.client %}Клиент: {{ event.client.get_full_name }}{% if event.client.phone_number %}, '
+    '{{ event.client.phone_number }}{% endif %}\n{% endif %}'
+    '{% if event.studio %}Место: {{ event.studio.name }}, {{ event.studio.get_full_address }}\n{% endif %}'
+    '{% if event.description %}\n{{ event.description }}\n{% endif %}'
+    '\nPhotoHub{% endautoescape %}'
+)
+CLIENT_SUBJECT = engines['django'].from_string(
+    '{% autoescape off %}Напоминание о фотосъемке {{ start|date:"d.m.Y H:i" }}{% endautoescape %}'
+)
+CLIENT_BODY = engines['django'].from_string(
+    '{% autoescape off %}Здравствуйте, {{ event.client.first_name }}!\n\n'
+    'Напоминаем о фотосъемке {{ start|date:"d.m.Y" }} в {{ start|date:"H:i" }}.\n'
+    '{% if event.studio %}Место: {{ event.studio.name }}, {{ event.studio.get_full_address }}\n{% endif %}'
+    '\nФотограф: {{ event.photographer.get_full_name }}'
+    '{% if event.photographer.phone_number %}, {{ event.photographer.phone_number }}{% endif %}'
+    '{% endautoescape %}'
+)
+
+BIRTHDAY_SUBJECT = engines['django'].from_string(
+    '{% autoescape off %}Скоро дни рождения клиентов{% endautoescape %}'
+)
+BIRTHDAY_BODY = engines['django'].from_string(
+    '{% autoescape off %}Здравствуйте, {{ photographer.first_name }}!\n\n'
+    'Скоро дни рождения ваших клиентов:\n'
+    '{% for client in clients %}- {{ client.get_full_name }}: {{ client.next_birthday|date:"d.m" }}'
+    '{% if client.days_left == 0 %} (сегодня){% endif %}, исполнится {{ client.age }}'
+    '{% if client.phone_number %}, {{ client.phone_number }}{% endif %}\n{% endfor %}'
+    '\nPhotoHub{% endautoescape %}'
+)
+
+
+def get_reminder_lead():
+    return timedelta(hours=settings.CALENDAR_REMINDER_LEAD_HOURS)
+
+
+def get_due_events(now, lead):
+    """
+    События, о которых пора напомнить: начало в (now, now + lead], напоминание еще не отправлено
+    """
+    return Event.objects.filter(
+        reminder_sent_at__isnull=True,
+        recurrence_rule='',
+        start_datetime__gt=now,
+        start_datetime__lte=now + lead,
+    ).select_related('photographer', 'client', 'studio').order_by('start_datetime')
+
+
+def build_messages(event, connection):
+    """
+    Письма-напоминания о событии фотографу и, для съемок, клиенту
+    """
+    context = {'event': event, 'start': timezone.localtime(event.start_datetime)}
+    messages = []
+    if event.photographer.email:
+        messages.append(EmailMessage(
+            PHOTOGRAPHER_SUBJECT.render(context),
+            PHOTOGRAPHER_BODY.render(context),
+            to=[event.photographer.email],
+            connection=connection,
+        ))
+    if event.event_type == 'photoshoot' and event.client and event.client.email:
+        messages.append(EmailMessage(
+            CLIENT_SUBJECT.render(context),
+            CLIENT_BODY.render(context),
+            to=[event.client.email],
+            reply_to=[event.photographer.email] if event.photographer.email else None,
+            connection=connection,
+        ))
+    return messages
+
+
+def deliver(connection, batches, release):
+    """
+    Отправляет письма уже отмеченных строк; batches - пары (ключ строк, письма).
+    Если отправка упала, release получает ключи, письма которых не ушли
+    """
+    sent = 0
+    for index, (key, messages) in enumerate(batches):
+        if not messages:
+            continue
+        try:
+            sent += connection.send_messages(messages) or 0
+        except Exception:
+            release([key for key, messages in batches[index:]])
+            raise
+    return sent
+
+
+def send_due_reminders(now=None, lead=None, batch_size=REMINDER_BATCH_SIZE, connection=None):
+    """
+    Отправляет все напоминания, которым пришло время. Возвращает число отправленных писем
+    """
+    now = now or timezone.now()
+    lead = lead or get_reminder_lead()
+    connection = connection or get_connection()
+    sent = 0
+    # Соединение открывается один раз на все порции
+    with connection:
+        while True:
+            with transaction.atomic():
+                events = list(
+                    get_due_events(now, lead).select_for_update(skip_locked=True, of=('self',))[:batch_size]
+                )
+                if not events:
+                    break
+                Event.objects.filter(pk__in=[event.pk for event in events]).update(reminder_sent_at=now)
+            sent += deliver(
+                connection,
+                [(event.pk, build_messages(event, connection)) for event in events],
+                lambda event_ids: Event.objects.filter(
+                    pk__in=event_ids, reminder_sent_at=now
+                ).update(reminder_sent_at=None),
+            )
+    return sent
+
+
+def get_due_birthdays(segments):
+    """
+    Клиенты с днем рождения в диапазонах segments, о котором фотограф еще не получил напоминание
+    """
+    condition = Q()
+    for year, first, last in segments:
+        condition |= Q(birth_day__range=(first, last)) & (
+            Q(birthday_reminder_year__isnull=True) | Q(birthday_reminder_year__lt=year)
+        )
+    return Client.objects.filter(condition).select_related('photographer').order_by('photographer_id', 'pk')
+
+
+def release_birthdays(groups):
+    """
+    Снимает отметку с клиентов, письмо о которых не ушло: год напоминания
+    снова меньше года ближайшего дня рождения
+    """
+    client_ids = [pk for group in groups for pk in group]
+    Client.objects.filter(pk__in=client_ids).update(birthday_reminder_year=F('birthday_reminder_year') - 1)
+
+
+def send_birthday_reminders(today=None, days=None, batch_size=REMINDER_BATCH_SIZE, connection=None):
+    """
+    Отправляет фотографам письма о ближайших днях рождения клиентов. Возвращает число отправленных писем
+    """
+    today = today or timezone.localdate()
+    days = settings.CLIENT_BIRTHDAY_REMINDER_DAYS if days is None else days
+    if not 0 <= days <= MAX_BIRTHDAY_REMINDER_DAYS:
+        raise ValueError(f'Период напоминаний о днях рождения должен быть от 0 до {MAX_BIRTHDAY_REMINDER_DAYS} дней')
+    segments = get_birthday_segments(today, days)
+    connection = connection or get_connection()
+    sent = 0
+    with connection:
+        while True:
+            with transaction.atomic():
+                clients = list(get_due_birthdays(segments).select_for_update(skip_locked=True, of=('self',))[:batch_size])
+                if not clients:
+                    break
+                years = {}
+                for client in clients:
+                    set_next_birthday(client, today)
+                    years.setdefault(client.next_birthday.year, []).append(client.pk)
+                for year, client_ids in years.items():
+                    Client.objects.filter(pk__in=client_ids).update(birthday_reminder_year=year)
+            batches = []
+            for photographer, group in groupby(clients, key=lambda client: client.photographer):
+                group = sorted(group, key=lambda client: client.days_left)
+                context = {'photographer': photographer, 'clients': group}
+                messages = []
+                if photographer.email:
+                    messages.append(EmailMessage(
+                        BIRTHDAY_SUBJECT.render(context),
+                        BIRTHDAY_BODY.render(context),
+                        to=[photographer.email],
+                        connection=connection,
+                    ))
+                batches.append(([client.pk for client in group], messages))
+            sent += deliver(connection, batches, release_birthdays)
+    return sent
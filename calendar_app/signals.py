@@ -0,0 +1,232 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_feed_generation
+from .client_stats import client_stats_state, refresh_client_stats, update_client_stats
+from .live import publish_event_change
+from .models import Event, RecurrenceException
+from .occupancy import booking_state, update_occupancy
+from .recurrence import clear_materialized
+from clients.models import Client
+from studios.models import Studio
+
+# Поля, денормализованные в ленту календаря (extendedProps.client / extendedProps.studio)
+# и в подписку iCalendar (LOCATION - название и адрес студии)
+FEED_NAME_FIELDS = {
+    Client: ('first_name', 'last_name'),
+    Studio: ('name', 'city', 'district', 'street', 'building'),
+}
+
+# Идет массовое удаление событий (bulk.py): записи об удалении, сводка
+# загрузки, статистика клиентов, кэш ленты и вкладки обновляются им один раз
+# на всю операцию, а не сигналами по каждой строке
+bulk_deleting = ContextVar('bulk_deleting', default=False)
+
+
+@contextmanager
+def bulk_delete():
+    """
+    Отключает обработку удаления отдельных событий и их исключений внутри блока
+    """
+    token = bulk_deleting.set(True)
+    try:
+        yield
+    finally:
+        bulk_deleting.reset(token)
+
+
+def invalidate_feeds(*user_ids):
+    """
+    Сбрасывает кэш лент фотографов сразу и еще раз после фиксации транзакции,
+    чтобы запрос, прочитавший старые данные до коммита, не закэшировал их
+    """
+    if not user_ids:
+        return
+    bump_feed_generation(*user_ids)
+    transaction.on_commit(lambda: bump_feed_generation(*user_ids))
+
+
+def _feed_photographers(sender, instance):
+    """
+    Фотографы, в чьих лентах отображается клиент или студия
+    """
+    if sender is Client:
+        return [instance.photographer_id]
+    return list(
+        Event.objects.filter(studio=instance).values_list('photographer_id', flat=True).distinct()
+    )
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+def event_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш ленты фотографа при изменении или удалении события
+    """
+    if bulk_deleting.get():
+        return
+    invalidate_feeds(instance.photographer_id)
+
+
+@receiver(post_save, sender=Event)
+def event_saved_live(sender, instance, created, **kwargs):
+    """
+    Отправляет измененное событие в открытые вкладки календаря фотографа после фиксации
+    """
+    action = 'created' if created else 'updated'
+    event_id, photographer_id = instance.pk, instance.photographer_id
+    transaction.on_commit(lambda: publish_event_change(action, event_id, photographer_id))
+
+
+@receiver(post_delete, sender=Event)
+def event_deleted_live(sender, instance, **kwargs):
+    """
+    Сообщает открытым вкладкам календаря об удалении события
+    """
+    if bulk_deleting.get():
+        return
+    event_id, photographer_id = instance.pk, instance.photographer_id
+    transaction.on_commit(lambda: publish_event_change('deleted', event_id, photographer_id))
+
+
+@receiver(post_save, sender=Event)
+def series_changed(sender, instance, created, **kwargs):
+    """
+    Сбрасывает материализованные вхождения измененной серии
+    """
+    if not created and instance.materialized_from is not None:
+        clear_materialized(instance.pk)
+
+
+@receiver(pre_save, sender=Event)
+def remember_booking(sender, instance, **kwargs):
+    """
+    Запоминает бронирование студии и клиента до сохранения события.
+    При переносе события напоминание отправляется заново
+    """
+    instance._booking_state = None
+    instance._client_stats_state = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).only(
+            'studio_id', 'client_id', 'event_type', 'start_datetime', 'end_datetime', 'recurrence_rule'
+        ).first()
+        if previous is not None:
+            instance._booking_state = booking_state(previous)
+            instance._client_stats_state = client_stats_state(previous)
+            if previous.start_datetime != instance.start_datetime:
+                instance.reminder_sent_at = None
+
+
+@receiver(post_save, sender=Event)
+def booking_saved(sender, instance, **kwargs):
+    """
+    Обновляет сводку загрузки студий при создании или изменении события
+    """
+    update_occupancy(getattr(instance, '_booking_state', None), booking_state(instance))
+
+
+@receiver(post_delete, sender=Event)
+def booking_deleted(sender, instance, **kwargs):
+    """
+    Вычитает удаленное событие из сводки загрузки студий
+    """
+    if bulk_deleting.get():
+        return
+    update_occupancy(booking_state(instance), None)
+
+
+@receiver(post_save, sender=Event)
+def client_stats_saved(sender, instance, **kwargs):
+    """
+    Пересчитывает статистику съемок клиента (и прежнего клиента при смене) после сохранения события
+    """
+    update_client_stats(getattr(instance, '_client_stats_state', None), client_stats_state(instance))
+
+
+@receiver(post_delete, sender=Event)
+def client_stats_deleted(sender, instance, **kwargs):
+    """
+    Пересчитывает статистику съемок клиента удаленного события
+    """
+    if bulk_deleting.get():
+        return
+    update_client_stats(client_stats_state(instance), None)
+
+
+@receiver(pre_delete, sender=Studio)
+def remember_favorite_clients(sender, instance, **kwargs):
+    """
+    Запоминает клиентов, у которых студия любимая: SET_NULL обнулит ее без сигналов
+    """
+    instance._favorite_clients = list(Client.objects.filter(favorite_studio=instance).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Studio)
+def favorite_studio_deleted(sender, instance, **kwargs):
+    """
+    Выбирает клиентам новую любимую студию вместо удаленной
+    """
+    refresh_client_stats(getattr(instance, '_favorite_clients', ()))
+
+
+@receiver(post_save, sender=RecurrenceException)
+@receiver(post_delete, sender=RecurrenceException)
+def recurrence_exception_changed(sender, instance, **kwargs):
+    """
+    Сбрасывает материализованные вхождения и кэш ленты при изменении исключения из серии
+    """
+    if bulk_deleting.get():
+        # Исключения удаляются каскадом вместе с сериями
+        return
+    photographer_id = Event.objects.filter(pk=instance.event_id).values_list('photographer_id', flat=True).first()
+    if photographer_id is None:
+        # Исключение удалено каскадом вместе с серией
+        return
+    clear_materialized(instance.event_id)
+    invalidate_feeds(photographer_id)
+
+
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Studio)
+def remember_feed_name(sender, instance, **kwargs):
+    """
+    Запоминает имя клиента или студии до сохранения
+    """
+    fields = FEED_NAME_FIELDS[sender]
+    instance._feed_name = None
+    if instance.pk:
+        instance._feed_name = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_save, sender=Studio)
+def feed_name_changed(sender, instance, created, **kwargs):
+    """
+    Сбрасывает кэш лент при переименовании клиента или студии и при изменении адреса студии
+    """
+    if created or instance._feed_name is None:
+        return
+    if instance._feed_name != tuple(getattr(instance, field) for field in FEED_NAME_FIELDS[sender]):
+        invalidate_feeds(*_feed_photographers(sender, instance))
+
+
+@receiver(pre_delete, sender=Client)
+@receiver(pre_delete, sender=Studio)
+def remember_feed_photographers(sender, instance, **kwargs):
+    """
+    Запоминает затронутых фотографов до того, как события отвяжутся (SET_NULL без сигналов)
+    """
+    instance._feed_photographers = _feed_photographers(sender, instance)
+
+
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Studio)
+def feed_relation_deleted(sender, instance, **kwargs):
+    """
+    Сбрасывает кэш лент после удаления клиента или студии
+    """
+    invalidate_feeds(*getattr(instance, '_feed_photographers', ()))
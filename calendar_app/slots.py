@@ -0,0 +1,139 @@
+"""
+Поиск свободного времени в студиях.
+
+Занятые интервалы читаются одним запросом на вид ресурса. Бронирования
+выбранных студий отбираются по booking_interval() - выражению индекса
+ограничения event_studio_no_overlap, съемки фотографа - по event_interval(),
+выражению индекса event_photographer_interval. Серии в эти индексы не входят
+и отбираются по началу и recurrence_end (для студий - по индексу внешнего
+ключа studio_id), а разворачиваются только внутри окна поиска. Свободные промежутки считаются проходом по отсортированным
+объединенным интервалам, поэтому число запросов не зависит ни от длины
+диапазона, ни от числа студий.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .feed import FEED_CHUNK_SIZE, filter_overlapping, get_series_occurrences
+from .models import Event, booking_interval
+
+BUSY_FIELDS = (
+    'id',
+    'studio_id',
+    'start_datetime',
+    'end_datetime',
+    'title',
+    'description',
+    'recurrence_rule',
+    'materialized_from',
+    'materialized_until',
+)
+
+
+def get_busy_intervals(queryset, start, end, key, interval=None):
+    """
+    Возвращает {key(строка): [(начало, окончание), ...]} для событий, пересекающихся с [start, end).
+    События без продолжительности время не занимают; interval - см. filter_overlapping
+    """
+    busy = defaultdict(list)
+    series_rows = []
+    rows = filter_overlapping(queryset, start, end, interval).values(*BUSY_FIELDS)
+    for row in rows.iterator(chunk_size=FEED_CHUNK_SIZE):
+        if row['recurrence_rule']:
+            series_rows.append(row)
+        elif row['end_datetime'] is not None and row['end_datetime'] > row['start_datetime']:
+            busy[key(row)].append((row['start_datetime'], row['end_datetime']))
+
+    if series_rows:
+        occurrences = get_series_occurrences(series_rows, start, end)
+        for row in series_rows:
+            busy[key(row)].extend(
+                (occurrence.start_datetime, occurrence.end_datetime)
+                for occurrence in occurrences[row['id']]
+                if occurrence.end_datetime > occurrence.start_datetime
+            )
+    return busy
+
+
+def merge_intervals(intervals):
+    """
+    Объединяет пересекающиеся и идущие встык интервалы; результат отсортирован
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_working_windows(start_date, end_date, work_start, work_end):
+    """
+    Рабочие часы каждого дня диапазона [start_date, end_date] в текущем часовом поясе
+    """
+    day = start_date
+    while day <= end_date:
+        yield (
+            timezone.make_aware(datetime.combine(day, work_start)),
+            timezone.make_aware(datetime.combine(day, work_end)),
+        )
+        day += timedelta(days=1)
+
+
+def iter_gaps(windows, busy, duration):
+    """
+    Свободные промежутки не короче duration внутри окон.
+    windows и busy отсортированы, busy объединены (см. merge_intervals)
+    """
+    first = 0
+    for window_start, window_end in windows:
+        # Интервалы, закончившиеся до окна, не нужны и следующим окнам
+        while first < len(busy) and busy[first][1] <= window_start:
+            first += 1
+        cursor = window_start
+        index = first
+        while index < len(busy) and busy[index][0] < window_end:
+            if busy[index][0] - cursor >= duration:
+                yield cursor, busy[index][0]
+            cursor = max(cursor, busy[index][1])
+            index += 1
+        if window_end - cursor >= duration:
+            yield cursor, window_end
+
+
+def find_free_slots(user, studios, start_date, end_date, work_start, work_end, duration):
+    """
+    Возвращает список словарей {'studio', 'start', 'end'}: промежутки в рабочие часы,
+    когда свободны и студия, и фотограф, не короче duration
+    """
+    windows = list(iter_working_windows(start_date, end_date, work_start, work_end))
+    if not windows:
+        return []
+    start, end = windows[0][0], windows[-1][1]
+    # Начавшиеся промежутки в прошлом не предлагаются
+    now = timezone.now()
+    windows = [(max(window_start, now), window_end) for window_start, window_end in windows if window_end > now]
+
+    studio_ids = [studio.pk for studio in studios]
+    studio_busy = get_busy_intervals(
+        Event.objects.filter(studio_id__in=studio_ids), start, end, key=lambda row: row['studio_id'],
+        interval=booking_interval(),
+    )
+    photographer_busy = get_busy_intervals(
+        Event.objects.filter(photographer=user, event_type='photoshoot'), start, end, key=lambda row: None
+    )[None]
+
+    slots = []
+    for studio in studios:
+        busy = merge_intervals(studio_busy[studio.pk] + photographer_busy)
+        for slot_start, slot_end in iter_gaps(windows, busy, duration):
+            slots.append({
+                'studio': studio.pk,
+                'start': timezone.localtime(slot_start),
+                'end': timezone.localtime(slot_end),
+            })
+    slots.sort(key=lambda slot: (slot['start'], slot['studio']))
+    return slots
@@ -0,0 +1,75 @@
+/*
+ * Автодополнение для выпадающих списков клиентов и студий.
+ *
+ * Сервер выводит в <select data-autocomplete-url="..."> только выбранный
+ * вариант. Над списком добавляется поле поиска: по мере ввода варианты
+ * запрашиваются у сервера (?q=...) и подставляются в список, выбранный
+ * вариант при этом сохраняется.
+ *
+ * Подключается через {{ form.media }}; списки инициализируются сами после загрузки страницы.
+ */
+(function (global) {
+    'use strict';
+
+    var DELAY = 250;
+
+    function replaceOptions(select, results) {
+        var selected = select.value;
+        Array.prototype.slice.call(select.options).forEach(function (option) {
+            // Пустой и выбранный варианты остаются на месте
+            if (option.value && option.value !== selected) {
+                option.remove();
+            }
+        });
+        results.forEach(function (result) {
+            if (String(result.id) !== selected) {
+                select.add(new Option(result.text, result.id));
+            }
+        });
+    }
+
+    function photohubAutocomplete(select) {
+        var url = select.getAttribute('data-autocomplete-url');
+        var input = document.createElement('input');
+        var timer = null;
+        var controller = null;
+
+        input.type = 'search';
+        input.className = 'form-control mb-1';
+        input.placeholder = 'Поиск...';
+        input.autocomplete = 'off';
+        select.parentNode.insertBefore(input, select);
+
+        function search() {
+            if (controller && global.AbortController) {
+                controller.abort();
+            }
+            controller = global.AbortController ? new AbortController() : null;
+            fetch(url + '?q=' + encodeURIComponent(input.value.trim()), {
+                credentials: 'same-origin',
+                signal: controller ? controller.signal : undefined
+            }).then(function (response) {
+                return response.ok ? response.json() : {results: []};
+            }).then(function (data) {
+                replaceOptions(select, data.results);
+            }).catch(function () {});
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(search, DELAY);
+        });
+        // Первые варианты подгружаются при первом обращении к списку, а не при загрузке страницы
+        select.addEventListener('focus', function () {
+            if (select.options.length <= 2 && !input.value) {
+                search();
+            }
+        }, {once: true});
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(photohubAutocomplete);
+    });
+
+    global.photohubAutocomplete = photohubAutocomplete;
+})(window);
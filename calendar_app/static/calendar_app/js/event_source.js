@@ -0,0 +1,96 @@
+/*
+ * Источник событий FullCalendar с подгрузкой по окнам.
+ *
+ * Страница календаря встраивает только начальное окно (events / events_window
+ * в контексте CalendarView), остальные диапазоны запрашиваются из JSON-ленты
+ * помесячно. Уже загруженные месяцы кэшируются на клиенте, поэтому повторная
+ * навигация и переключение вида не делают лишних запросов.
+ *
+ * Использование:
+ *   new FullCalendar.Calendar(el, {
+ *       events: photohubEventSource('{{ events_url }}', {{ events }}, {{ events_window }})
+ *   });
+ */
+(function (global) {
+    'use strict';
+
+    function monthKey(date) {
+        return date.getUTCFullYear() + '-' + (date.getUTCMonth() + 1);
+    }
+
+    function monthStart(date) {
+        return new Date(Date.UTC(date.getUTCFullYear(), date.getUTCMonth(), 1));
+    }
+
+    function nextMonth(date) {
+        return new Date(Date.UTC(date.getUTCFullYear(), date.getUTCMonth() + 1, 1));
+    }
+
+    function photohubEventSource(url, initialEvents, initialWindow) {
+        var months = {};   // ключ месяца -> Promise со списком событий
+        var separator = url.indexOf('?') === -1 ? '?' : '&';
+
+        // Месяцы, целиком покрытые встроенным окном, считаются уже загруженными
+        if (initialEvents && initialWindow) {
+            var windowStart = new Date(initialWindow.start);
+            var windowEnd = new Date(initialWindow.end);
+            for (var m = monthStart(windowStart); m < windowEnd; m = nextMonth(m)) {
+                if (m >= windowStart && nextMonth(m) <= windowEnd) {
+                    months[monthKey(m)] = Promise.resolve(initialEvents.filter(function (event) {
+                        var start = new Date(event.start);
+                        return start >= this.from && start < this.to;
+                    }, {from: m, to: nextMonth(m)}));
+                }
+            }
+        }
+
+        function loadMonth(month) {
+            var key = monthKey(month);
+            if (!months[key]) {
+                var query = 'start=' + encodeURIComponent(month.toISOString()) +
+                    '&end=' + encodeURIComponent(nextMonth(month).toISOString());
+                months[key] = fetch(url + separator + query, {credentials: 'same-origin'})
+                    .then(function (response) {
+                        if (!response.ok) {
+                            throw new Error(response.statusText);
+                        }
+                        return response.json();
+                    })
+                    .catch(function (error) {
+                        delete months[key];
+                        throw error;
+                    });
+            }
+            return months[key];
+        }
+
+        function source(info, successCallback, failureCallback) {
+            var requests = [];
+            for (var m = monthStart(info.start); m < info.end; m = nextMonth(m)) {
+                requests.push(loadMonth(m));
+            }
+            Promise.all(requests).then(function (chunks) {
+                var seen = {};
+                var events = [];
+                chunks.forEach(function (chunk) {
+                    chunk.forEach(function (event) {
+                        if (!seen[event.id]) {
+                            seen[event.id] = true;
+                            events.push(event);
+                        }
+                    });
+                });
+                successCallback(events);
+            }, failureCallback);
+        }
+
+        // Сброс кэша, например после создания или изменения события
+        source.invalidate = function () {
+            months = {};
+        };
+
+        return source;
+    }
+
+    global.photohubEventSource = photohubEventSource;
+})(window);
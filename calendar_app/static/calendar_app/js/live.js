@@ -0,0 +1,59 @@
+/*
+ * Живое обновление календаря через Server-Sent Events.
+ *
+ * Подписывается на поток изменений событий фотографа (calendar:live) и
+ * применяет их к открытому календарю вместо периодического опроса ленты.
+ * Кэш месяцев источника событий (photohubEventSource) сбрасывается при
+ * каждом изменении, чтобы навигация не показывала устаревшие данные.
+ *
+ * Использование:
+ *   var source = photohubEventSource('{{ events_url }}', {{ events }}, {{ events_window }});
+ *   var calendar = new FullCalendar.Calendar(el, {events: source});
+ *   photohubLiveUpdates(calendar, source, '{{ live_url }}', {eventTypes: ['{{ event_type }}']});
+ */
+(function (global) {
+    'use strict';
+
+    function removeEvent(calendar, id) {
+        calendar.getEvents().forEach(function (event) {
+            // Вхождения серии связаны с ней через groupId
+            if (String(event.id) === String(id) || String(event.groupId) === String(id)) {
+                event.remove();
+            }
+        });
+    }
+
+    function photohubLiveUpdates(calendar, source, url, options) {
+        if (!global.EventSource) {
+            return null;
+        }
+        var eventTypes = (options && options.eventTypes) || null;
+        var stream = new EventSource(url, {withCredentials: true});
+
+        function refetch() {
+            source.invalidate();
+            calendar.refetchEvents();
+        }
+
+        function upsert(message) {
+            var data = JSON.parse(message.data);
+            source.invalidate();
+            removeEvent(calendar, data.event.id);
+            if (!eventTypes || eventTypes.indexOf(data.event.extendedProps.event_type) !== -1) {
+                // Событие привязывается к источнику, чтобы refetchEvents его не задвоил
+                calendar.addEvent(data.event, calendar.getEventSources()[0] || true);
+            }
+        }
+
+        stream.addEventListener('created', upsert);
+        stream.addEventListener('updated', upsert);
+        stream.addEventListener('deleted', function (message) {
+            source.invalidate();
+            removeEvent(calendar, JSON.parse(message.data).id);
+        });
+        stream.addEventListener('refetch', refetch);
+        return stream;
+    }
+
+    global.photohubLiveUpdates = photohubLiveUpdates;
+})(window);
@@ -1,3 +1,1903 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.db import IntegrityError, connection, transaction
+from django.core import mail
+from django.conf import settings
+from django.test import TestCase, RequestFactory, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from .models import Event, CalendarSubscription, EventOccurrence, RecurrenceException, StudioOccupancy
+from .cache import get_feed_cache, get_or_build
+from .checks import check_birthday_reminder_days, check_feed_cache
+from .ics import fold_line, get_ics_queryset, iter_ics
+from .booking import find_bulk_conflicts, find_photographer_conflict, find_studio_conflict
+from .bulk import BulkOperationError, apply_bulk_operation
+from .client_stats import rebuild_client_stats
+from .forms import BulkEventForm, EventForm, EventFormPost
+from .exporters import get_export_queryset, iter_events_csv
+from .importers import ENCODING_ERROR, EventImporter
+from .live import LocalBroker, iter_live_events
+from .occupancy import rebuild_occupancy, split_by_hour
+from .recurrence import MAX_OCCURRENCES, get_exceptions_filter, iter_occurrences, materialize, validate_rrule
+from .reminders import send_birthday_reminders, send_due_reminders
+from .slots import iter_gaps, merge_intervals
+from .feed import MAX_WINDOW, get_feed_queryset, get_feed_window, get_initial_window, parse_event_types, serialize_feed
+from .views import CalendarView
+from clients.models import Client
+from studios.models import Studio
+from sync.models import Tombstone
+
+User = get_user_model()
+
+
+class EventFeedTest(TestCase):
+    """
+    Тесты для ленты событий календаря
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            first_name='Test',
+            last_name='User',
+            is_photographer=True
+        )
+        self.client_model = Client.objects.create(
+            photographer=self.user,
+            first_name='John',
+            last_name='Doe',
+        )
+        self.studio = Studio.objects.create(
+            name='Loft',
+            city='Москва',
+            street='Тверская',
+            building='1',
+            created_by=self.user
+        )
+        self.start = timezone.now() + timedelta(days=1)
+        self.events_url = reverse('calendar:events_json')
+        get_feed_cache().clear()
+
+    def create_events(self, count, event_type='photoshoot'):
+        for i in range(count):
+            Event.objects.create(
+                photographer=self.user,
+                title=f'Событие {i}',
+                event_type=event_type,
+                start_datetime=self.start + timedelta(hours=i),
+                end_datetime=self.start + timedelta(hours=i, minutes=30),
+                client=self.client_model,
+                studio=self.studio,
+            )
+
+    def test_parse_event_types(self):
+        """
+        Тест разбора списка типов событий
+        """
+        self.assertEqual(parse_event_types('photoshoot,post'), ['photoshoot', 'post'])
+        self.assertEqual(parse_event_types('post, unknown,post'), ['post'])
+        self.assertEqual(parse_event_types(''), [])
+
+    def test_serialize_feed(self):
+        """
+        Тест формата события в ленте
+        """
+        self.create_events(1)
+        event = Event.objects.get()
+        data = serialize_feed(get_feed_queryset(self.user))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['url'], reverse('calendar:event_detail', args=[event.id]))
+        self.assertEqual(data[0]['extendedProps']['client'], 'John Doe')
+        self.assertEqual(data[0]['extendedProps']['studio'], 'Loft')
+        self.assertEqual(data[0]['end'], event.end_datetime.isoformat())
+
+    def test_feed_query_count_is_constant(self):
+        """
+        Тест того, что число запросов не зависит от числа событий
+        """
+        self.create_events(20)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(4):
+            # сессия, пользователь, валидатор ленты и выборка событий
+            response = self.client.get(self.events_url)
+        self.assertEqual(len(response.json()), 20)
+
+    def test_feed_filter_by_types(self):
+        """
+        Тест фильтрации ленты по нескольким типам
+        """
+        self.create_events(2, event_type='photoshoot')
+        self.create_events(3, event_type='post')
+        self.client.force_login(self.user)
+
+        response = self.client.get(self.events_url, {'types': 'post'})
+        self.assertEqual(len(response.json()), 3)
+
+        response = self.client.get(self.events_url, {'types': 'photoshoot,post'})
+        self.assertEqual(len(response.json()), 5)
+
+        response = self.client.get(reverse('calendar:filtered_events_json', args=['photoshoot']))
+        self.assertEqual(len(response.json()), 2)
+
+    def test_calendar_view_embeds_only_initial_window(self):
+        """
+        Тест того, что страница календаря встраивает только начальное окно
+        """
+        self.create_events(1)
+        Event.objects.create(
+            photographer=self.user,
+            title='Давняя съемка',
+            start_datetime=self.start - timedelta(days=400),
+            end_datetime=self.start - timedelta(days=400) + timedelta(hours=1),
+        )
+        request = RequestFactory().get(reverse('calendar:calendar'))
+        request.user = self.user
+        view = CalendarView()
+        view.setup(request)
+        context = view.get_context_data()
+
+        window_start, window_end = get_initial_window()
+        titles = [event['title'] for event in json.loads(context['events'])]
+        self.assertNotIn('Давняя съемка', titles)
+        self.assertEqual(json.loads(context['events_window'])['start'], window_start.isoformat())
+        self.assertEqual(context['events_url'], reverse('calendar:events_json') + '?types=photoshoot')
+
+        # Неизвестный тип отбрасывается и во встроенных событиях, и в ссылке на ленту
+        Event.objects.create(
+            photographer=self.user, title='Пост', event_type='post', start_datetime=self.start,
+        )
+        request = RequestFactory().get(reverse('calendar:calendar'), {'filter': 'post&unknown'})
+        request.user = self.user
+        view.setup(request)
+        context = view.get_context_data()
+        self.assertEqual(context['events_url'], reverse('calendar:events_json') + '?types=')
+        self.assertEqual({event['title'] for event in json.loads(context['events'])}, {'Событие 0', 'Пост'})
+
+        request = RequestFactory().get(reverse('calendar:calendar'), {'filter': 'photoshoot,post'})
+        request.user = self.user
+        view.setup(request)
+        self.assertEqual(view.get_context_data()['events_url'], reverse('calendar:events_json') + '?types=photoshoot%2Cpost')
+
+    def test_feed_window_overlap(self):
+        """
+        Тест того, что в окно попадают события, пересекающие его границы, и события без окончания
+        """
+        window_start = self.start
+        window_end = self.start + timedelta(days=1)
+
+        def create(title, start, end):
+            Event.objects.create(photographer=self.user, title=title, start_datetime=start, end_datetime=end)
+
+        create('Внутри', window_start + timedelta(hours=1), window_start + timedelta(hours=2))
+        create('Через начало', window_start - timedelta(hours=1), window_start + timedelta(hours=1))
+        create('Через конец', window_end - timedelta(hours=1), window_end + timedelta(hours=1))
+        create('Накрывает окно', window_start - timedelta(days=1), window_end + timedelta(days=1))
+        create('Без окончания', window_start + timedelta(hours=3), None)
+        create('До окна', window_start - timedelta(hours=2), window_start - timedelta(hours=1))
+        create('После окна', window_end, window_end + timedelta(hours=1))
+
+        titles = set(get_feed_queryset(self.user, window_start, window_end).values_list('title', flat=True))
+        self.assertEqual(titles, {'Внутри', 'Через начало', 'Через конец', 'Накрывает окно', 'Без окончания'})
+
+    def test_feed_conditional_get(self):
+        """
+        Тест ответа 304 на неизменившуюся ленту и 200 после изменений
+        """
+        self.create_events(3)
+        self.client.force_login(self.user)
+        response = self.client.get(self.events_url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+
+        with self.assertNumQueries(3):
+            # сессия, пользователь и валидатор ленты, без выборки событий
+            response = self.client.get(self.events_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Имя клиента денормализовано в ленту
+        self.client_model.last_name = 'Smith'
+        self.client_model.save()
+        response = self.client.get(self.events_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        Event.objects.first().delete()
+        response = self.client.get(self.events_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_feed_cache(self):
+        """
+        Тест кэширования ленты и его сброса при изменениях
+        """
+        self.create_events(3)
+        self.client.force_login(self.user)
+        window = {
+            'start': (self.start - timedelta(days=1)).isoformat(),
+            'end': (self.start + timedelta(days=1)).isoformat(),
+        }
+        first = self.client.get(self.events_url, window)
+
+        with self.assertNumQueries(2):
+            # только сессия и пользователь
+            cached = self.client.get(self.events_url, window)
+        self.assertEqual(cached.content, first.content)
+        self.assertEqual(cached['ETag'], first['ETag'])
+
+        self.studio.name = 'Белый зал'
+        self.studio.save()
+        response = self.client.get(self.events_url, window)
+        self.assertEqual(response.json()[0]['extendedProps']['studio'], 'Белый зал')
+
+        Event.objects.first().delete()
+        response = self.client.get(self.events_url, window)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_feed_cache_check(self):
+        """
+        Тест предупреждения о ленте в локальной памяти процесса вне режима отладки
+        """
+        with override_settings(DEBUG=False):
+            self.assertEqual([message.id for message in check_feed_cache(None)], ['calendar_app.W001'])
+        redis = {**settings.CACHES, 'calendar_feed': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        with override_settings(DEBUG=False, CACHES=redis):
+            self.assertEqual(check_feed_cache(None), [])
+        with override_settings(DEBUG=True):
+            self.assertEqual(check_feed_cache(None), [])
+
+    def test_get_or_build_waits_for_rebuild(self):
+        """
+        Тест защиты от лавины промахов: пока запись пересобирается, повторная сборка не запускается
+        """
+        cache = get_feed_cache()
+        cache.add('feed-test:lock', 1)
+
+        def fill():
+            cache.set('feed-test', 'built')
+
+        def build():
+            raise AssertionError('Запись не должна пересобираться повторно')
+
+        timer = threading.Timer(0.1, fill)
+        timer.start()
+        try:
+            self.assertEqual(get_or_build('feed-test', build), 'built')
+        finally:
+            timer.cancel()
+
+
+class IcsFeedTest(TestCase):
+    """
+    Тесты для подписки на календарь в формате iCalendar
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            first_name='Test',
+            last_name='User',
+            is_photographer=True
+        )
+        self.studio = Studio.objects.create(
+            name='Loft',
+            city='Москва',
+            district='ЦАО',
+            street='Тверская',
+            building='1',
+            created_by=self.user
+        )
+        self.event = Event.objects.create(
+            photographer=self.user,
+            title='Съемка; семейная',
+            start_datetime=timezone.now() + timedelta(days=1),
+            end_datetime=timezone.now() + timedelta(days=1, hours=2),
+            studio=self.studio,
+        )
+        self.subscription = CalendarSubscription.for_user(self.user)
+        self.ics_url = reverse('calendar:ics_feed', args=[self.subscription.token])
+        get_feed_cache().clear()
+
+    def test_fold_line(self):
+        """
+        Тест переноса длинных строк без разрезания символов UTF-8
+        """
+        folded = fold_line('DESCRIPTION:' + 'ф' * 100)
+        lines = folded.rstrip('\r\n').split('\r\n')
+        self.assertTrue(all(len(line.encode('utf-8')) <= 75 for line in lines))
+        self.assertEqual(''.join(line[1:] if i else line for i, line in enumerate(lines)), 'DESCRIPTION:' + 'ф' * 100)
+
+    def test_ics_feed(self):
+        """
+        Тест содержимого календаря и повторной проверки по ETag
+        """
+        response = self.client.get(self.ics_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        body = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('BEGIN:VCALENDAR', body)
+        self.assertIn(f'UID:event-{self.event.pk}@photohub', body)
+        self.assertIn('SUMMARY:Съемка\\; семейная', body)
+        self.assertIn('LOCATION:Loft\\, Москва\\, ЦАО\\, Тверская\\, 1', body)
+
+        with self.assertNumQueries(1):
+            # только поиск подписки по токену
+            response = self.client.get(self.ics_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        with self.assertNumQueries(1):
+            # тело берется из кэша
+            response = self.client.get(self.ics_url)
+        self.assertEqual(response.content.decode('utf-8'), body)
+
+        self.event.title = 'Новая съемка'
+        self.event.save()
+        response = self.client.get(self.ics_url)
+        self.assertIn('SUMMARY:Новая съемка', b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_ics_studio_address_change(self):
+        """
+        Тест сброса ETag подписки после изменения адреса студии
+        """
+        etag = self.client.get(self.ics_url)['ETag']
+        self.studio.street = 'Арбат'
+        self.studio.save()
+        response = self.client.get(self.ics_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('LOCATION:Loft\\, Москва\\, ЦАО\\, Арбат\\, 1', b''.join(response.streaming_content).decode('utf-8'))
+
+    def test_regenerate_token(self):
+        """
+        Тест выпуска нового токена подписки
+        """
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('calendar:ics_subscription'))
+        self.subscription.refresh_from_db()
+        self.assertTrue(response.json()['url'].endswith(reverse('calendar:ics_feed', args=[self.subscription.token])))
+        self.assertEqual(self.client.get(self.ics_url).status_code, 404)
+
+
+class EventImportTest(TestCase):
+    """
+    Тесты для пакетного импорта событий
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            first_name='Test',
+            last_name='User',
+            is_photographer=True
+        )
+        self.client_model = Client.objects.create(photographer=self.user, first_name='John', last_name='Doe')
+        self.studio = Studio.objects.create(
+            name='Loft', city='Москва', street='Тверская', building='1', created_by=self.user
+        )
+
+    def test_import_csv(self):
+        """
+        Тест импорта CSV с проверкой строк и поиском клиентов и студий по имени
+        """
+        rows = ['title,event_type,start,end,client,studio,description,all_day,color']
+        for i in range(30):
+            rows.append(f'Съемка {i},photoshoot,2020-01-{i + 1:02d} 10:00,2020-01-{i + 1:02d} 12:00,john doe,Loft,,,')
+        rows.append('Пост,Пост в соцсети,2020-02-01 10:00,,,,,да,#ff0000')
+        rows.append(',photoshoot,2020-02-01 10:00,,,,,,')
+        rows.append('Наоборот,photoshoot,2020-02-01 10:00,2020-01-01 10:00,,,,,')
+        rows.append('Неизвестная студия,photoshoot,2020-02-01 10:00,2020-02-01 11:00,,Нет такой,,,')
+        data = io.BytesIO('\n'.join(rows).encode('utf-8'))
+
+        progress = []
+        importer = EventImporter(self.user, batch_size=10, progress=lambda *args: progress.append(args))
+        # клиенты, студии, вставки порциями (каждая в своей точке сохранения),
+        # сводка загрузки студии и статистика клиента для трех порций со студией и клиентом
+        with self.assertNumQueries(2 + 4 * 3 + 3 + 2 + 3):
+            importer.import_csv(data)
+
+        self.assertEqual(importer.processed, 34)
+        self.assertEqual(importer.created, 32)
+        self.assertEqual([line for line, message in importer.errors], [33, 34, 35])
+        self.assertEqual(Event.objects.filter(client=self.client_model, studio=self.studio).count(), 30)
+        post = Event.objects.get(title='Пост')
+        self.assertEqual(post.event_type, 'post')
+        self.assertTrue(post.is_all_day)
+        self.assertEqual(post.color, '#ff0000')
+        self.assertEqual(progress[-1], (34, 32, 3))
+
+    def test_import_studio_conflicts(self):
+        """
+        Тест импорта порции с пересекающимися бронированиями студии
+        """
+        rows = ['title,start,end,studio']
+        for i in range(5):
+            rows.append(f'Съемка {i},2020-01-{i + 1:02d} 10:00,2020-01-{i + 1:02d} 12:00,Loft')
+        rows.append('Пересечение,2020-01-02 11:00,2020-01-02 13:00,Loft')
+        importer = EventImporter(self.user, batch_size=10)
+        importer.import_csv(io.BytesIO('\n'.join(rows).encode('utf-8')))
+
+        self.assertEqual(importer.created, 5)
+        self.assertEqual([line for line, message in importer.errors], [7])
+        self.assertFalse(Event.objects.filter(title='Пересечение').exists())
+
+    def test_import_encoding(self):
+        """
+        Тест CSV в cp1251 (русский Excel) и файла, который не читается ни в одной
+        кодировке: ошибка у поля файла, ничего не импортировано
+        """
+        rows = ['title;start;end;client', 'Съемка;2020-01-01 10:00;2020-01-01 12:00;John Doe']
+        importer = EventImporter(self.user)
+        importer.import_csv(io.BytesIO('\n'.join(rows).encode('cp1251')))
+        self.assertEqual(importer.errors, [])
+        self.assertEqual(Event.objects.get().client, self.client_model)
+
+        # Начало файла в UTF-8, дальше байт, которого нет ни в UTF-8, ни в cp1251
+        upload = io.BytesIO(('title,start\n' + 'Съемка,2020-01-01 10:00\n' * 3000).encode('utf-8') + b'\x98,2020-01-02\n')
+        upload.name = 'events.csv'
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('calendar:event_import'), {'file': upload, 'event_type': 'photoshoot'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['form'].errors['file'], [ENCODING_ERROR])
+        self.assertEqual(Event.objects.count(), 1)
+
+    def test_import_ics_round_trip(self):
+        """
+        Тест импорта календаря, выгруженного подпиской iCalendar
+        """
+        Event.objects.create(
+            photographer=self.user,
+            title='Съемка, семейная',
+            start_datetime=timezone.now() - timedelta(days=10),
+            end_datetime=timezone.now() - timedelta(days=10) + timedelta(hours=2),
+            client=self.client_model,
+            studio=self.studio,
+            description='Взять фон',
+        )
+        body = ''.join(iter_ics(get_ics_queryset(self.user))).encode('utf-8')
+        Event.objects.all().delete()
+
+        importer = EventImporter(self.user)
+        importer.import_ics(io.BytesIO(body))
+
+        self.assertEqual(importer.errors, [])
+        event = Event.objects.get()
+        self.assertEqual(event.title, 'Съемка, семейная')
+        self.assertEqual(event.client, self.client_model)
+        self.assertEqual(event.studio, self.studio)
+        self.assertEqual(event.description, 'Взять фон')
+
+    def test_export_csv_round_trip(self):
+        """
+        Тест выгрузки событий в CSV одним запросом (имена клиента и студии через JOIN) и импорта обратно
+        """
+        start = timezone.make_aware(datetime(2020, 3, 1, 10, 0))
+        for i in range(3):
+            Event.objects.create(
+                photographer=self.user, title=f'Съемка, {i}', start_datetime=start + timedelta(days=i),
+                end_datetime=start + timedelta(days=i, hours=2), client=self.client_model, studio=self.studio,
+            )
+        Event.objects.create(
+            photographer=self.user, title='Пост', event_type='post', start_datetime=start,
+            end_datetime=start, is_all_day=True, color='#ff0000',
+        )
+        with self.assertNumQueries(1):
+            body = ''.join(iter_events_csv(get_export_queryset(self.user)))
+        self.assertIn('"Съемка, 0",photoshoot,2020-03-01 10:00,2020-03-01 12:00,John Doe,Loft', body)
+        Event.objects.all().delete()
+
+        importer = EventImporter(self.user)
+        importer.import_csv(io.BytesIO(body.encode('utf-8')))
+
+        self.assertEqual((importer.created, importer.errors), (4, []))
+        self.assertEqual(Event.objects.filter(client=self.client_model, studio=self.studio).count(), 3)
+        post = Event.objects.get(title='Пост')
+        self.assertTrue(post.is_all_day)
+        self.assertEqual(post.color, '#ff0000')
+
+    def test_export_view(self):
+        """
+        Тест представления выгрузки событий за период со сжатием gzip
+        """
+        for day in (1, 15, 31):
+            start = timezone.make_aware(datetime(2020, 1, day, 10, 0))
+            Event.objects.create(photographer=self.user, title=f'Съемка {day}', start_datetime=start,
+                                 end_datetime=start + timedelta(hours=1))
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('calendar:event_export'),
+                                   {'start': '2020-01-10', 'end': '2020-01-31', 'gzip': '1'})
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+
+        self.assertIn('events.csv.gz', response['Content-Disposition'])
+        self.assertNotIn('Съемка 1,', body)
+        self.assertIn('Съемка 15,', body)
+        self.assertIn('Съемка 31,', body)
+        response = self.client.get(reverse('calendar:event_export'), {'start': '2020-02-01', 'end': '2020-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+class RecurringEventTest(TestCase):
+    """
+    Тесты повторяющихся событий
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.start = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+        # Еженедельная серия по понедельникам без окончания
+        self.series = Event.objects.create(
+            photographer=self.user,
+            title='Занятие',
+            event_type='photoshoot',
+            start_datetime=self.start,
+            end_datetime=self.start + timedelta(hours=2),
+            recurrence_rule='FREQ=WEEKLY',
+        )
+        self.window_start = timezone.make_aware(datetime(2030, 3, 1))
+        self.window_end = timezone.make_aware(datetime(2030, 4, 1))
+        get_feed_cache().clear()
+
+    def get_feed(self):
+        queryset = get_feed_queryset(self.user, self.window_start, self.window_end, [])
+        return serialize_feed(queryset, self.window_start, self.window_end)
+
+    def test_recurrence_end(self):
+        """
+        Тест вычисления окончания серии
+        """
+        self.assertIsNone(self.series.recurrence_end)
+        self.series.recurrence_rule = 'FREQ=DAILY;COUNT=3'
+        self.series.save()
+        self.assertEqual(self.series.recurrence_end, self.start + timedelta(days=2, hours=2))
+
+        # UNTIL в UTC: последнее вхождение - 9 января
+        self.series.recurrence_rule = 'FREQ=DAILY;UNTIL=20300109T235959Z'
+        self.series.save()
+        self.assertEqual(self.series.recurrence_end, self.start + timedelta(days=2, hours=2))
+
+    def test_sub_daily_rules(self):
+        """
+        Тест запрета правил чаще раза в день и предела вхождений для сохраненных ранее
+        """
+        for rule in ('FREQ=HOURLY', 'FREQ=MINUTELY;COUNT=10', 'RRULE:freq=secondly'):
+            self.assertEqual(validate_rrule(rule, self.start), 'Серия не может повторяться чаще раза в день')
+        self.assertIsNotNone(validate_rrule('FREQ=DAILY;COUNT=5001', self.start))
+        self.assertIsNone(validate_rrule('FREQ=DAILY;COUNT=5000', self.start))
+
+        self.series.end_datetime = None
+        self.series.recurrence_rule = 'FREQ=MINUTELY'
+        occurrences = list(iter_occurrences(self.series, self.window_start, self.window_end))
+        self.assertEqual(len(occurrences), MAX_OCCURRENCES)
+
+    def test_feed_window_cap(self):
+        """
+        Тест ограничения длины окна ленты
+        """
+        start, end = get_feed_window({'start': '2030-01-01', 'end': '2040-01-01'})
+        self.assertEqual(start, timezone.make_aware(datetime(2030, 1, 1)))
+        self.assertEqual(end, start + MAX_WINDOW)
+
+        start, end = get_feed_window({'start': '2030-01-01', 'end': '2030-02-01'})
+        self.assertEqual(end, timezone.make_aware(datetime(2030, 2, 1)))
+
+    def test_expand_in_window(self):
+        """
+        Тест разворачивания бесконечной серии только внутри окна
+        """
+        events = self.get_feed()
+        # Понедельники марта 2030: 4, 11, 18, 25
+        self.assertEqual([event['start'][:10] for event in events], ['2030-03-04', '2030-03-11', '2030-03-18', '2030-03-25'])
+        self.assertTrue(all(event['extendedProps']['recurring'] for event in events))
+        self.assertEqual(events[0]['id'], f"{self.series.pk}-{int(timezone.make_aware(datetime(2030, 3, 4, 10)).timestamp())}")
+
+        # Закончившаяся серия в ленту не попадает
+        self.series.recurrence_rule = 'FREQ=WEEKLY;COUNT=2'
+        self.series.save()
+        self.assertEqual(self.get_feed(), [])
+
+    def test_exceptions(self):
+        """
+        Тест отмены и переноса вхождений
+        """
+        RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 3, 11, 10)),
+            is_cancelled=True,
+        )
+        RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 3, 18, 10)),
+            start_datetime=timezone.make_aware(datetime(2030, 3, 19, 12)),
+            title='Перенесено',
+        )
+        # Вхождение из февраля перенесено в окно
+        RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 2, 25, 10)),
+            start_datetime=timezone.make_aware(datetime(2030, 3, 2, 10)),
+        )
+        with self.assertNumQueries(2):
+            events = self.get_feed()
+        local = lambda value: timezone.localtime(datetime.fromisoformat(value)).strftime('%d.%m %H:%M')
+        self.assertEqual(
+            [(local(event['start']), event['title']) for event in events],
+            [
+                ('02.03 10:00', 'Занятие'),
+                ('04.03 10:00', 'Занятие'),
+                ('19.03 12:00', 'Перенесено'),
+                ('25.03 10:00', 'Занятие'),
+            ]
+        )
+        self.assertEqual(local(events[2]['end']), '19.03 14:00')
+
+    def test_exceptions_in_window_only(self):
+        """
+        Тест чтения только исключений окна: старые исключения серии не читаются,
+        исключение с началом не из серии не переносит вхождение в окно
+        """
+        for day in range(7, 29, 7):
+            RecurrenceException.objects.create(
+                event=self.series, original_start=timezone.make_aware(datetime(2030, 1, day, 10)), is_cancelled=True,
+            )
+        moved = RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 2, 4, 10)),
+            start_datetime=timezone.make_aware(datetime(2030, 3, 5, 10)),
+        )
+        stale = RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 2, 5, 10)),
+            start_datetime=timezone.make_aware(datetime(2030, 3, 6, 10)),
+        )
+        exceptions = RecurrenceException.objects.filter(
+            get_exceptions_filter(self.window_start, self.window_end, timedelta(hours=2)), event=self.series,
+        )
+        self.assertEqual(set(exceptions), {moved, stale})
+
+        events = self.get_feed()
+        self.assertEqual([event['start'][:10] for event in events], ['2030-03-04', '2030-03-05', '2030-03-11', '2030-03-18', '2030-03-25'])
+
+    def test_materialized_occurrences(self):
+        """
+        Тест чтения материализованных вхождений и их сброса при изменении серии
+        """
+        materialize(self.series, self.window_start - timedelta(days=30), self.window_end + timedelta(days=30))
+        self.assertTrue(EventOccurrence.objects.filter(event=self.series).exists())
+        expected = [event['start'] for event in self.get_feed()]
+        self.assertEqual(len(expected), 4)
+
+        # Материализованный путь: серия и вхождения, без разворачивания и исключений
+        EventOccurrence.objects.filter(event=self.series).update(title='Из таблицы')
+        events = self.get_feed()
+        self.assertEqual([event['start'] for event in events], expected)
+        self.assertEqual({event['title'] for event in events}, {'Из таблицы'})
+
+        RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 3, 11, 10)),
+            is_cancelled=True,
+        )
+        self.assertFalse(EventOccurrence.objects.filter(event=self.series).exists())
+        self.assertEqual(len(self.get_feed()), 3)
+
+    def test_ics_series(self):
+        """
+        Тест выгрузки серии с RRULE, EXDATE и RECURRENCE-ID
+        """
+        RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 3, 11, 10)),
+            is_cancelled=True,
+        )
+        RecurrenceException.objects.create(
+            event=self.series,
+            original_start=timezone.make_aware(datetime(2030, 3, 18, 10)),
+            title='Перенесено',
+        )
+        body = ''.join(iter_ics(get_ics_queryset(self.user)))
+        self.assertIn('RRULE:FREQ=WEEKLY\r\n', body)
+        self.assertIn(f"EXDATE:{timezone.make_aware(datetime(2030, 3, 11, 10)).astimezone(dt_timezone.utc):%Y%m%dT%H%M%SZ}", body)
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn('SUMMARY:Перенесено', body)
+
+    def test_form_validates_rule(self):
+        """
+        Тест проверки правила повторения в форме
+        """
+        data = {
+            'title': 'Серия',
+            'start_datetime': (timezone.now() + timedelta(days=1)).strftime('%Y-%m-%d %H:%M'),
+            'end_datetime': (timezone.now() + timedelta(days=1, hours=1)).strftime('%Y-%m-%d %H:%M'),
+            'color': '#3788d8',
+        }
+        form = EventFormPost(data=dict(data, recurrence_rule='FREQ=SOMETIMES'))
+        self.assertFalse(form.is_valid())
+        self.assertIn('recurrence_rule', form.errors)
+
+        form = EventFormPost(data=dict(data, recurrence_rule='rrule:freq=daily;count=5'))
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['recurrence_rule'], 'FREQ=DAILY;COUNT=5')
+
+
+class DoubleBookingTest(TestCase):
+    """
+    Тесты проверки двойного бронирования
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.studio = Studio.objects.create(
+            name='Loft',
+            city='Москва',
+            street='Тверская',
+            building='1',
+            is_public=True,
+            created_by=self.user
+        )
+        self.start = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+        self.booked = Event.objects.create(
+            photographer=self.other,
+            title='Чужая съемка',
+            start_datetime=self.start,
+            end_datetime=self.start + timedelta(hours=2),
+            studio=self.studio,
+        )
+
+    def get_form(self, start, end, studio=None, instance=None, **extra):
+        data = {
+            'title': 'Съемка',
+            'start_datetime': start.strftime('%Y-%m-%d %H:%M'),
+            'end_datetime': end.strftime('%Y-%m-%d %H:%M') if end else '',
+            'studio': studio.pk if studio else '',
+            'color': '#3788d8',
+            **extra,
+        }
+        return EventForm(data=data, user=self.user, instance=instance)
+
+    def test_find_studio_conflict(self):
+        """
+        Тест поиска пересечения бронирований студии
+        """
+        self.assertEqual(find_studio_conflict(self.studio.pk, self.start + timedelta(hours=1), self.start + timedelta(hours=3)), self.booked)
+        # Съемки встык не пересекаются
+        self.assertIsNone(find_studio_conflict(self.studio.pk, self.start + timedelta(hours=2), self.start + timedelta(hours=3)))
+        self.assertIsNone(find_studio_conflict(self.studio.pk, self.start, self.start + timedelta(hours=1), exclude_pk=self.booked.pk))
+
+    def test_find_photographer_conflict(self):
+        """
+        Тест поиска пересечения съемок фотографа
+        """
+        self.assertEqual(find_photographer_conflict(self.other.pk, self.start, self.start + timedelta(hours=1)), self.booked)
+        self.assertIsNone(find_photographer_conflict(self.other.pk, self.start - timedelta(hours=1), self.start))
+        self.assertIsNone(find_photographer_conflict(self.user.pk, self.start, self.start + timedelta(hours=1)))
+
+    def test_form_reports_conflict(self):
+        """
+        Тест ошибки формы: у чужого события только занятое время, у своего - и название
+        """
+        form = self.get_form(self.start + timedelta(hours=1), self.start + timedelta(hours=3), self.studio)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['studio'][0], 'Студия занята. Студия занята в это время (07.01.2030 10:00–12:00)')
+
+        form = self.get_form(self.start + timedelta(hours=2), self.start + timedelta(hours=3), self.studio)
+        self.assertTrue(form.is_valid(), form.errors)
+
+        # Собственная съемка фотографа в другой студии
+        Event.objects.create(
+            photographer=self.user,
+            title='Моя съемка',
+            start_datetime=self.start + timedelta(days=1),
+            end_datetime=self.start + timedelta(days=1, hours=1),
+        )
+        form = self.get_form(self.start + timedelta(days=1), self.start + timedelta(days=1, hours=2))
+        self.assertFalse(form.is_valid())
+        self.assertIn('Моя съемка', form.non_field_errors()[0])
+
+    def test_update_does_not_conflict_with_itself(self):
+        """
+        Тест редактирования события без пересечения с самим собой
+        """
+        form = self.get_form(self.start, self.start + timedelta(hours=3), self.studio, instance=self.booked)
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_exclusion_constraint(self):
+        """
+        Тест ограничения базы данных на пересечение бронирований студии
+        """
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Event.objects.create(
+                photographer=self.user,
+                title='Пересечение',
+                start_datetime=self.start + timedelta(minutes=30),
+                end_datetime=self.start + timedelta(hours=1),
+                studio=self.studio,
+            )
+        Event.objects.create(
+            photographer=self.user,
+            title='Встык',
+            start_datetime=self.start + timedelta(hours=2),
+            end_datetime=self.start + timedelta(hours=3),
+            studio=self.studio,
+        )
+
+    def test_studio_booking_requires_end(self):
+        """
+        Тест бронирования студии без окончания: пустой интервал не прошел бы проверку пересечений
+        """
+        form = self.get_form(self.start + timedelta(hours=1), None, self.studio)
+        self.assertFalse(form.is_valid())
+        self.assertIn('end_datetime', form.errors)
+        self.assertTrue(self.get_form(self.start + timedelta(hours=1), None).is_valid())
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Event.objects.create(
+                photographer=self.user, title='Без окончания', start_datetime=self.start + timedelta(days=1),
+                studio=self.studio,
+            )
+
+    def test_series_conflicts(self):
+        """
+        Тест пересечений с вхождениями серий в обе стороны
+        """
+        series = Event.objects.create(
+            photographer=self.other,
+            title='Еженедельная съемка',
+            start_datetime=self.start + timedelta(days=7),
+            end_datetime=self.start + timedelta(days=7, hours=2),
+            studio=self.studio,
+            recurrence_rule='FREQ=WEEKLY',
+        )
+        # Одиночное бронирование поверх вхождения серии через месяц
+        day = self.start + timedelta(days=28)
+        conflict = find_studio_conflict(self.studio.pk, day + timedelta(hours=1), day + timedelta(hours=3))
+        self.assertEqual(conflict, series)
+        self.assertEqual(conflict.start_datetime, day)
+        self.assertIsNone(find_studio_conflict(self.studio.pk, day + timedelta(hours=2), day + timedelta(hours=3)))
+        self.assertEqual(find_photographer_conflict(self.other.pk, day, day + timedelta(hours=1)), series)
+
+        form = self.get_form(day + timedelta(hours=1), day + timedelta(hours=3), self.studio)
+        self.assertFalse(form.is_valid())
+        self.assertIn('04.02.2030 10:00–12:00', form.errors['studio'][0])
+
+        # Новая серия сравнивается своими вхождениями с одиночными событиями и другими сериями
+        start = self.start - timedelta(days=1)
+        form = self.get_form(start, start + timedelta(hours=1), self.studio, recurrence_rule='FREQ=DAILY')
+        self.assertFalse(form.is_valid())
+        self.assertIn('07.01.2030 10:00–12:00', form.errors['studio'][0])
+
+        start = self.start + timedelta(days=30, hours=1)
+        form = self.get_form(start, start + timedelta(hours=1), self.studio, recurrence_rule='FREQ=WEEKLY;BYDAY=MO')
+        self.assertFalse(form.is_valid())
+        self.assertIn('11.02.2030 10:00–12:00', form.errors['studio'][0])
+
+        form = self.get_form(start, start + timedelta(hours=1), self.studio, recurrence_rule='FREQ=WEEKLY;BYDAY=TU')
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_update_view_reports_conflict(self):
+        """
+        Тест ошибки пересечения в представлении редактирования
+        """
+        event = Event.objects.create(
+            photographer=self.user,
+            title='Моя съемка',
+            start_datetime=self.start + timedelta(days=1),
+            end_datetime=self.start + timedelta(days=1, hours=1),
+        )
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('calendar:event_edit', kwargs={'pk': event.pk}), {
+            'title': 'Моя съемка',
+            'start_datetime': self.start.strftime('%Y-%m-%d %H:%M'),
+            'end_datetime': (self.start + timedelta(hours=1)).strftime('%Y-%m-%d %H:%M'),
+            'studio': self.studio.pk,
+            'color': '#3788d8',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('studio', response.context['form'].errors)
+        event.refresh_from_db()
+        self.assertIsNone(event.studio)
+
+
+class FreeSlotTest(TestCase):
+    """
+    Тесты поиска свободного времени в студиях
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.studio = Studio.objects.create(
+            name='Loft',
+            city='Москва',
+            street='Тверская',
+            building='1',
+            created_by=self.user
+        )
+        self.private = Studio.objects.create(
+            name='Чужая',
+            city='Москва',
+            street='Арбат',
+            building='2',
+            created_by=User.objects.create_user(username='other', password='testpassword')
+        )
+        self.day = timezone.localdate() + timedelta(days=7)
+        self.url = reverse('calendar:free_slots')
+        self.client.force_login(self.user)
+
+    def at(self, hour, days=0):
+        return timezone.make_aware(datetime.combine(self.day + timedelta(days=days), datetime.min.time()) + timedelta(hours=hour))
+
+    def get_slots(self, **params):
+        params = dict({
+            'studio': self.studio.pk,
+            'duration': 120,
+            'start': self.day.isoformat(),
+            'end': self.day.isoformat(),
+            'work_start': '09:00',
+            'work_end': '18:00',
+        }, **params)
+        return self.client.get(self.url, params)
+
+    def test_merge_and_gaps(self):
+        """
+        Тест объединения занятых интервалов и поиска промежутков
+        """
+        busy = merge_intervals([(self.at(12), self.at(13)), (self.at(10), self.at(11)), (self.at(11), self.at(12)), (self.at(15), self.at(16))])
+        self.assertEqual(busy, [(self.at(10), self.at(13)), (self.at(15), self.at(16))])
+        windows = [(self.at(9), self.at(18)), (self.at(9, days=1), self.at(18, days=1))]
+        gaps = list(iter_gaps(windows, busy, timedelta(hours=2)))
+        self.assertEqual(gaps, [
+            (self.at(13), self.at(15)),
+            (self.at(16), self.at(18)),
+            (self.at(9, days=1), self.at(18, days=1)),
+        ])
+
+    def test_free_slots(self):
+        """
+        Тест API: занятость студии и съемки фотографа в другом месте
+        """
+        Event.objects.create(
+            photographer=self.private.created_by,
+            title='Чужая съемка',
+            start_datetime=self.at(10),
+            end_datetime=self.at(13),
+            studio=self.studio,
+        )
+        Event.objects.create(
+            photographer=self.user,
+            title='Выездная съемка',
+            start_datetime=self.at(15),
+            end_datetime=self.at(16),
+        )
+        # Посты время не занимают
+        Event.objects.create(
+            photographer=self.user,
+            title='Пост',
+            event_type='post',
+            start_datetime=self.at(13),
+            end_datetime=self.at(15),
+        )
+        with self.assertNumQueries(5):
+            response = self.get_slots()
+        self.assertEqual(response.status_code, 200)
+        slots = [
+            (slot['studio'], datetime.fromisoformat(slot['start']), datetime.fromisoformat(slot['end']))
+            for slot in response.json()['slots']
+        ]
+        self.assertEqual(slots, [
+            (self.studio.pk, self.at(13), self.at(15)),
+            (self.studio.pk, self.at(16), self.at(18)),
+        ])
+
+    def test_free_slots_series(self):
+        """
+        Тест учета повторяющихся бронирований студии
+        """
+        Event.objects.create(
+            photographer=self.user,
+            title='Занятие',
+            start_datetime=self.at(9, days=-7),
+            end_datetime=self.at(17, days=-7),
+            studio=self.studio,
+            recurrence_rule='FREQ=WEEKLY',
+        )
+        slots = self.get_slots().json()['slots']
+        self.assertEqual(slots, [])
+
+    def test_validation(self):
+        """
+        Тест проверки параметров: чужие приватные студии и слишком длинный диапазон
+        """
+        response = self.get_slots(studio=self.private.pk)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('studio', response.json()['errors'])
+
+        response = self.get_slots(end=(self.day + timedelta(days=100)).isoformat())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('end', response.json()['errors'])
+
+
+class StudioOccupancyTest(TestCase):
+    """
+    Тесты сводки загрузки студий
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.studio = Studio.objects.create(
+            name='Loft',
+            city='Москва',
+            street='Тверская',
+            building='1',
+            is_public=True,
+            created_by=self.user
+        )
+        self.day = datetime(2030, 1, 7).date()
+
+    def at(self, hour, minute=0, days=0):
+        return timezone.make_aware(datetime(2030, 1, 7 + days, hour, minute))
+
+    def occupancy(self):
+        return {
+            (row.day.day, row.hour): row.minutes
+            for row in StudioOccupancy.objects.filter(studio=self.studio, minutes__gt=0)
+        }
+
+    def test_split_by_hour(self):
+        """
+        Тест разбиения интервала по часам местного времени
+        """
+        buckets = split_by_hour(self.at(10, 30), self.at(12, 15))
+        self.assertEqual(buckets, {
+            (self.day, 10): 30 * 60,
+            (self.day, 11): 60 * 60,
+            (self.day, 12): 15 * 60,
+        })
+
+    def test_signals_maintain_rollup(self):
+        """
+        Тест поддержки сводки при создании, изменении и удалении события
+        """
+        event = Event.objects.create(
+            photographer=self.user,
+            title='Съемка',
+            start_datetime=self.at(10, 30),
+            end_datetime=self.at(12),
+            studio=self.studio,
+        )
+        self.assertEqual(self.occupancy(), {(7, 10): 30, (7, 11): 60})
+
+        event.start_datetime = self.at(23, days=1)
+        event.end_datetime = self.at(1, days=2)
+        event.save()
+        self.assertEqual(self.occupancy(), {(8, 23): 60, (9, 0): 60})
+
+        event.studio = None
+        event.save()
+        self.assertEqual(self.occupancy(), {})
+
+        event.studio = self.studio
+        event.save()
+        event.delete()
+        self.assertEqual(self.occupancy(), {})
+
+    def test_rebuild(self):
+        """
+        Тест пересборки сводки по событиям
+        """
+        for i in range(3):
+            Event.objects.create(
+                photographer=self.user,
+                title=f'Съемка {i}',
+                start_datetime=self.at(10 + i * 2),
+                end_datetime=self.at(11 + i * 2, 30),
+                studio=self.studio,
+            )
+        expected = self.occupancy()
+        StudioOccupancy.objects.update(minutes=999)
+        rebuild_occupancy([self.studio.pk])
+        self.assertEqual(self.occupancy(), expected)
+
+    def test_occupancy_json(self):
+        """
+        Тест отчета о загрузке по сводке, без обращения к событиям
+        """
+        Event.objects.create(
+            photographer=self.user,
+            title='Съемка',
+            start_datetime=self.at(10),
+            end_datetime=self.at(16),
+            studio=self.studio,
+        )
+        self.client.force_login(self.user)
+        url = reverse('studios:studio_occupancy_json', kwargs={'pk': self.studio.pk})
+        with self.assertNumQueries(6):
+            # сессия, пользователь, студия, дни, недели, часы недели
+            response = self.client.get(url, {'start': '2030-01-07', 'end': '2030-01-13'})
+        data = response.json()
+        self.assertEqual(data['minutes'], 360)
+        self.assertEqual(data['days'], [{'day': '2030-01-07', 'minutes': 360, 'utilization': 0.25}])
+        self.assertEqual(data['weeks'][0]['utilization'], 360 / (7 * 24 * 60))
+        self.assertEqual([(row['weekday'], row['hour']) for row in data['hours_of_week']], [(1, hour) for hour in range(10, 16)])
+
+        self.assertEqual(self.client.get(url, {'start': '2030-13-01'}).status_code, 400)
+        self.client.force_login(User.objects.create_user(username='other', email='other@example.com', password='testpassword'))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class LiveUpdatesTest(TestCase):
+    """
+    Тесты живого обновления календаря
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+
+    def test_publish_on_commit(self):
+        """
+        Тест публикации изменений события после фиксации транзакции
+        """
+        broker = mock.Mock()
+        with mock.patch('calendar_app.live.get_broker', return_value=broker):
+            with self.captureOnCommitCallbacks(execute=True):
+                event = Event.objects.create(
+                    photographer=self.user,
+                    title='Съемка',
+                    start_datetime=timezone.now() + timedelta(days=1),
+                )
+            channel, message = broker.publish.call_args.args
+            self.assertEqual(channel, f'calendar:live:{self.user.pk}')
+            self.assertEqual(message['type'], 'created')
+            self.assertEqual(message['event']['title'], 'Съемка')
+
+            event_id = event.pk
+            with self.captureOnCommitCallbacks(execute=True):
+                event.delete()
+            self.assertEqual(broker.publish.call_args.args[1], {'type': 'deleted', 'id': event_id})
+
+    def test_stream(self):
+        """
+        Тест потока SSE: переподключение, пинг и доставка сообщений только своему фотографу
+        """
+        async def scenario():
+            broker = LocalBroker()
+            stream = iter_live_events(self.user.pk, broker=broker, heartbeat=0.01)
+            self.assertTrue((await anext(stream)).startswith('retry:'))
+            self.assertEqual(await anext(stream), ': ping\n\n')
+            broker.publish(f'calendar:live:{self.user.pk + 1}', {'type': 'refetch'})
+            broker.publish(f'calendar:live:{self.user.pk}', {'type': 'deleted', 'id': 5})
+            chunk = await anext(stream)
+            while chunk == ': ping\n\n':
+                chunk = await anext(stream)
+            self.assertEqual(chunk, 'event: deleted\ndata: {"type": "deleted", "id": 5}\n\n')
+            await stream.aclose()
+            self.assertEqual(broker._subscriptions, {})
+
+        asyncio.run(scenario())
+
+    def test_stream_requires_asgi(self):
+        """
+        Тест ответа 204 под WSGI, чтобы браузер не переподключался
+        """
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('calendar:live')).status_code, 204)
+
+
+class AgendaTest(TestCase):
+    """
+    Тесты списка событий с постраничной навигацией по ключу
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.client_model = Client.objects.create(photographer=self.user, first_name='John', last_name='Doe')
+        now = timezone.now().replace(microsecond=0)
+        # Две пары событий с одинаковым началом проверяют упорядочивание по id
+        for i, hours in enumerate([1, 1, 2, 3, 3, 4, 5]):
+            for sign in (1, -1):
+                Event.objects.create(
+                    photographer=self.user,
+                    title=f'Событие {sign * i}',
+                    start_datetime=now + sign * timedelta(hours=hours),
+                    end_datetime=now + sign * timedelta(hours=hours) + timedelta(minutes=30),
+                    client=self.client_model if i % 2 else None,
+                )
+        self.url = reverse('calendar:agenda_json')
+        self.client.force_login(self.user)
+
+    def collect(self, **params):
+        ids, cursor = [], None
+        while True:
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(3 if params.get('scope') == 'past' else 4):
+                # сессия, пользователь и одна страница событий вместе с клиентом и студией;
+                # для предстоящих еще идущие серии
+                data = self.client.get(self.url, dict(params, limit=3)).json()
+            ids.extend(event['id'] for event in data['events'])
+            cursor = data['next_cursor']
+            if cursor is None:
+                return ids
+
+    def test_upcoming(self):
+        """
+        Тест предстоящих событий: все страницы без пропусков и повторов
+        """
+        expected = list(
+            Event.objects.filter(start_datetime__gte=timezone.now()).order_by('start_datetime', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(len(expected), 7)
+        self.assertEqual(self.collect(), expected)
+
+    def test_past(self):
+        """
+        Тест прошедших событий в обратном порядке
+        """
+        expected = list(
+            Event.objects.filter(start_datetime__lt=timezone.now()).order_by('-start_datetime', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self.collect(scope='past'), expected)
+
+    def test_filters_and_stable_cursor(self):
+        """
+        Тест фильтра по клиенту и повторяемости курсора
+        """
+        ids = self.collect(client=self.client_model.pk)
+        self.assertEqual(len(ids), 3)
+        first = self.client.get(self.url, {'limit': 2}).json()
+        second = self.client.get(self.url, {'limit': 2}).json()
+        self.assertEqual(first['next_cursor'], second['next_cursor'])
+        self.assertEqual(first['events'][0]['client'], None)
+
+    def test_ongoing_series(self):
+        """
+        Тест серии, начавшейся раньше: в предстоящих она стоит по дате
+        следующего вхождения, закончившаяся серия не показывается
+        """
+        start = timezone.now().replace(microsecond=0) + timedelta(minutes=90) - timedelta(days=10)
+        series = Event.objects.create(
+            photographer=self.user,
+            title='Серия',
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+            recurrence_rule='FREQ=DAILY',
+        )
+        Event.objects.create(
+            photographer=self.user,
+            title='Закончилась',
+            start_datetime=start,
+            end_datetime=start + timedelta(hours=1),
+            recurrence_rule='FREQ=DAILY;COUNT=3',
+        )
+        ids = self.collect()
+        self.assertEqual(len(ids), 8)
+        # после двух событий через час, до событий через два часа
+        self.assertEqual(ids.index(series.pk), 2)
+        self.assertTrue(self.client.get(self.url, {'limit': 3}).json()['events'][2]['recurring'])
+
+
+class ReminderTest(TestCase):
+    """
+    Тесты напоминаний о предстоящих событиях
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            first_name='Test',
+            last_name='User',
+            is_photographer=True
+        )
+        self.client_model = Client.objects.create(
+            photographer=self.user, first_name='John', last_name='Doe', email='john@example.com'
+        )
+        self.now = timezone.now()
+
+    def create_event(self, hours, **kwargs):
+        return Event.objects.create(
+            photographer=self.user,
+            title=kwargs.pop('title', f'Съемка через {hours} ч'),
+            start_datetime=self.now + timedelta(hours=hours),
+            end_datetime=self.now + timedelta(hours=hours + 1),
+            **kwargs
+        )
+
+    def test_send_due_reminders(self):
+        """
+        Тест отправки напоминаний фотографу и клиенту одной порцией без повторов
+        """
+        shoot = self.create_event(2, client=self.client_model)
+        self.create_event(3, event_type='post', title='Пост')
+        self.create_event(48)
+
+        sent = send_due_reminders(now=self.now, lead=timedelta(hours=24), batch_size=1)
+        self.assertEqual(sent, 3)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['john@example.com', 'test@example.com', 'test@example.com'])
+        client_message = next(message for message in mail.outbox if message.to == ['john@example.com'])
+        self.assertIn('Test User', client_message.body)
+
+        # Повторный проход ничего не отправляет
+        self.assertEqual(send_due_reminders(now=self.now, lead=timedelta(hours=24)), 0)
+
+        # После переноса события напоминание отправляется заново
+        shoot.refresh_from_db()
+        shoot.start_datetime += timedelta(hours=1)
+        shoot.end_datetime += timedelta(hours=1)
+        shoot.save()
+        self.assertEqual(send_due_reminders(now=self.now, lead=timedelta(hours=24)), 2)
+
+    def test_due_query_count(self):
+        """
+        Тест числа запросов: на порцию выборка и отметка, без запросов на каждое событие
+        """
+        for hours in range(1, 11):
+            self.create_event(hours, client=self.client_model)
+        with self.assertNumQueries(2 * 2 + 1 + 3 * 2):
+            # порции по 5: выборка и отметка, пустая выборка в конце; точки сохранения транзакций
+            send_due_reminders(now=self.now, lead=timedelta(hours=24), batch_size=5)
+        self.assertEqual(len(mail.outbox), 20)
+
+    def test_failed_send_releases_undelivered(self):
+        """
+        Тест сбоя почты: отметка остается у доставленных и снимается с недоставленных
+        """
+        delivered = self.create_event(2)
+        failed = self.create_event(3)
+        connection = mail.get_connection()
+        send_messages = connection.send_messages
+        calls = []
+
+        def flaky_send(messages):
+            calls.append(messages)
+            if len(calls) == 2:
+                raise ConnectionError('SMTP недоступен')
+            return send_messages(messages)
+
+        with mock.patch.object(connection, 'send_messages', flaky_send):
+            with self.assertRaises(ConnectionError):
+                send_due_reminders(now=self.now, lead=timedelta(hours=24), connection=connection)
+        delivered.refresh_from_db()
+        failed.refresh_from_db()
+        self.assertIsNotNone(delivered.reminder_sent_at)
+        self.assertIsNone(failed.reminder_sent_at)
+
+        self.assertEqual(send_due_reminders(now=self.now, lead=timedelta(hours=24)), 1)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_send_birthday_reminders(self):
+        """
+        Тест письма о днях рождения: одно письмо фотографу, без повтора до следующего года
+        """
+        Client.objects.create(photographer=self.user, first_name='Анна', last_name='Сидорова',
+                              birth_date=date(1990, 1, 2), phone_number='+79161234567')
+        Client.objects.create(photographer=self.user, first_name='Иван', last_name='Петров', birth_date=date(1985, 12, 31))
+        Client.objects.create(photographer=self.user, first_name='Позже', last_name='Клиент', birth_date=date(1985, 1, 20))
+
+        self.assertEqual(send_birthday_reminders(today=date(2026, 12, 30), days=3), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['test@example.com'])
+        body = mail.outbox[0].body
+        self.assertIn('Иван Петров: 31.12, исполнится 41', body)
+        self.assertIn('Анна Сидорова: 02.01, исполнится 37, +79161234567', body)
+        self.assertNotIn('Позже', body)
+
+        self.assertEqual(send_birthday_reminders(today=date(2026, 12, 31), days=3), 0)
+        self.assertEqual(send_birthday_reminders(today=date(2027, 12, 30), days=3), 1)
+
+    def test_birthday_reminder_days_limit(self):
+        """
+        Тест периода напоминаний о днях рождения: год и больше отклоняется,
+        самый длинный период напоминает о каждом клиенте один раз
+        """
+        Client.objects.create(photographer=self.user, first_name='Иван', last_name='Петров', birth_date=date(1985, 12, 30))
+        with self.assertRaises(ValueError):
+            send_birthday_reminders(today=date(2026, 12, 30), days=365)
+        with override_settings(CLIENT_BIRTHDAY_REMINDER_DAYS=365):
+            self.assertEqual([message.id for message in check_birthday_reminder_days(None)], ['calendar_app.E001'])
+        self.assertEqual(check_birthday_reminder_days(None), [])
+
+        self.assertEqual(send_birthday_reminders(today=date(2026, 12, 30), days=364), 1)
+        self.assertEqual(send_birthday_reminders(today=date(2026, 12, 30), days=364), 0)
+
+
+class BulkEventTest(TestCase):
+    """
+    Тесты массовых операций над событиями
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.studio = Studio.objects.create(
+            name='Loft', city='Москва', street='Тверская', building='1', is_public=True, created_by=self.user
+        )
+        self.second_studio = Studio.objects.create(
+            name='White', city='Москва', street='Арбат', building='2', is_public=True, created_by=self.user
+        )
+        self.start = timezone.make_aware(datetime(2030, 1, 7, 10, 0))
+        # Три съемки в студии встык: 10-11, 11-12, 12-13
+        self.events = [
+            Event.objects.create(
+                photographer=self.user,
+                title=f'Съемка {index}',
+                studio=self.studio,
+                start_datetime=self.start + timedelta(hours=index),
+                end_datetime=self.start + timedelta(hours=index + 1),
+            )
+            for index in range(3)
+        ]
+        self.ids = [event.pk for event in self.events]
+
+    def occupancy(self, studio):
+        return sum(StudioOccupancy.objects.filter(studio=studio).values_list('minutes', flat=True))
+
+    def test_shift_adjacent_events(self):
+        """
+        Тест переноса событий, идущих встык, одним UPDATE без ложных конфликтов
+        """
+        sync_versions = dict(Event.objects.values_list('pk', 'sync_version'))
+        with self.assertNumQueries(6):
+            count = apply_bulk_operation(
+                self.user, Event.objects.filter(pk__in=self.ids), 'shift', delta=timedelta(hours=1)
+            )
+        self.assertEqual(count, 3)
+        starts = list(Event.objects.order_by('start_datetime').values_list('start_datetime', flat=True))
+        self.assertEqual(starts, [self.start + timedelta(hours=hours) for hours in (1, 2, 3)])
+        for pk, version in Event.objects.values_list('pk', 'sync_version'):
+            self.assertGreater(version, sync_versions[pk])
+        self.assertEqual(self.occupancy(self.studio), 180)
+        first_hour = StudioOccupancy.objects.get(studio=self.studio, hour=timezone.localtime(self.start).hour)
+        self.assertEqual(first_hour.minutes, 0)
+
+    def test_shift_conflict(self):
+        """
+        Тест отказа от переноса на занятое время: ничего не меняется
+        """
+        Event.objects.create(
+            photographer=self.other,
+            title='Чужая съемка',
+            studio=self.studio,
+            start_datetime=self.start + timedelta(hours=3),
+            end_datetime=self.start + timedelta(hours=4),
+        )
+        self.assertEqual(len(find_bulk_conflicts(self.ids, timedelta(hours=1))), 1)
+        with self.assertRaises(BulkOperationError) as context:
+            apply_bulk_operation(self.user, Event.objects.filter(pk__in=self.ids), 'shift', delta=timedelta(hours=1))
+        self.assertEqual(context.exception.messages[0], '«Съемка 2»: Студия занята в это время (07.01.2030 13:00–14:00)')
+        self.assertEqual(Event.objects.get(pk=self.ids[0]).start_datetime, self.start)
+
+    def test_shift_photographer_conflict(self):
+        """
+        Тест переноса съемок на время другой съемки того же фотографа в другой студии
+        """
+        Event.objects.create(
+            photographer=self.user,
+            title='Выездная съемка',
+            start_datetime=self.start + timedelta(hours=3, minutes=30),
+            end_datetime=self.start + timedelta(hours=5),
+        )
+        conflicts = find_bulk_conflicts(self.ids, timedelta(hours=1))
+        self.assertEqual([event.pk for event, conflict in conflicts], [self.ids[2]])
+        with self.assertRaises(BulkOperationError) as context:
+            apply_bulk_operation(self.user, Event.objects.filter(pk__in=self.ids), 'shift', delta=timedelta(hours=1))
+        self.assertIn('Выездная съемка', context.exception.messages[0])
+
+        # Встык со съемкой - не пересечение
+        self.assertEqual(find_bulk_conflicts(self.ids, timedelta(minutes=30)), [])
+
+    def test_reassign_studio(self):
+        """
+        Тест смены студии: пересечения событий выборки между собой и перенос сводки загрузки
+        """
+        parallel = Event.objects.create(
+            photographer=self.user,
+            title='Параллельная съемка',
+            studio=self.second_studio,
+            start_datetime=self.start,
+            end_datetime=self.start + timedelta(hours=1),
+        )
+        with self.assertRaises(BulkOperationError):
+            apply_bulk_operation(
+                self.user, Event.objects.filter(photographer=self.user), 'studio', studio=self.second_studio
+            )
+
+        with self.assertRaises(BulkOperationError):
+            apply_bulk_operation(self.user, Event.objects.filter(pk__in=self.ids), 'studio', studio=self.second_studio)
+
+        parallel.delete()
+        apply_bulk_operation(self.user, Event.objects.filter(pk__in=self.ids), 'studio', studio=self.second_studio)
+        self.assertEqual(Event.objects.filter(studio=self.second_studio).count(), 3)
+        self.assertEqual(self.occupancy(self.studio), 0)
+        self.assertEqual(self.occupancy(self.second_studio), 180)
+
+    def test_series_conflicts(self):
+        """
+        Тест проверки вхождений выбранных серий при переносе и смене студии
+        """
+        series = Event.objects.create(
+            photographer=self.user,
+            title='Серия',
+            studio=self.studio,
+            start_datetime=self.start + timedelta(hours=4),
+            end_datetime=self.start + timedelta(hours=5),
+            recurrence_rule='FREQ=WEEKLY',
+        )
+        Event.objects.create(
+            photographer=self.other,
+            title='Чужая съемка',
+            studio=self.studio,
+            start_datetime=self.start + timedelta(days=7, hours=5),
+            end_datetime=self.start + timedelta(days=7, hours=6),
+        )
+        with self.assertRaises(BulkOperationError) as context:
+            apply_bulk_operation(self.user, Event.objects.filter(pk=series.pk), 'shift', delta=timedelta(hours=1))
+        self.assertEqual(context.exception.messages, ['«Серия»: Студия занята в это время (14.01.2030 15:00–16:00)'])
+        self.assertEqual(Event.objects.get(pk=series.pk).start_datetime, series.start_datetime)
+
+        apply_bulk_operation(self.user, Event.objects.filter(pk=series.pk), 'studio', studio=None)
+        apply_bulk_operation(self.user, Event.objects.filter(pk=series.pk), 'shift', delta=timedelta(hours=1))
+        with self.assertRaises(BulkOperationError):
+            apply_bulk_operation(self.user, Event.objects.filter(pk=series.pk), 'studio', studio=self.studio)
+        self.assertIsNone(Event.objects.get(pk=series.pk).studio_id)
+
+    def test_studio_only_for_shoots(self):
+        """
+        Тест отказа назначать студию публикациям
+        """
+        post = Event.objects.create(
+            photographer=self.user,
+            title='Публикация',
+            event_type='post',
+            start_datetime=self.start + timedelta(days=1),
+            end_datetime=self.start + timedelta(days=1, hours=1),
+        )
+        with self.assertRaises(BulkOperationError) as context:
+            apply_bulk_operation(
+                self.user, Event.objects.filter(pk__in=self.ids + [post.pk]), 'studio', studio=self.second_studio
+            )
+        self.assertEqual(context.exception.messages, ['Студию можно указать только у съемок, выбрано других событий: 1'])
+        self.assertIsNone(Event.objects.get(pk=post.pk).studio_id)
+
+    def test_bulk_delete(self):
+        """
+        Тест массового удаления: сигналы по строкам пропускаются, записи об
+        удалении, сводка и вкладки обновляются один раз на всю операцию
+        """
+        broker = mock.Mock()
+        with mock.patch('calendar_app.live.get_broker', return_value=broker):
+            with CaptureQueriesContext(connection) as single:
+                apply_bulk_operation(self.user, Event.objects.filter(pk=self.ids[0]), 'delete')
+            with self.captureOnCommitCallbacks(execute=True):
+                with CaptureQueriesContext(connection) as several:
+                    count = apply_bulk_operation(self.user, Event.objects.filter(pk__in=self.ids[1:]), 'delete')
+        self.assertEqual(count, 2)
+        self.assertEqual(len(several), len(single))
+        self.assertEqual(broker.publish.call_count, 1)
+        self.assertEqual(broker.publish.call_args.args[1], {'type': 'refetch'})
+        self.assertEqual(
+            sorted(Tombstone.objects.filter(model='events', owner=self.user).values_list('object_id', flat=True)),
+            sorted(self.ids),
+        )
+        self.assertEqual(self.occupancy(self.studio), 0)
+
+    def test_bulk_view(self):
+        """
+        Тест API массовых операций: фильтр, чужие события и удаление
+        """
+        foreign = Event.objects.create(
+            photographer=self.other, title='Чужая', start_datetime=self.start, end_datetime=self.start
+        )
+        self.client.force_login(self.user)
+        url = reverse('calendar:bulk_events_json')
+
+        response = self.client.post(url, {'operation': 'color'})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(url, {
+            'operation': 'color', 'color': '#ff0000', 'date_from': '2030-01-07', 'date_to': '2030-01-07',
+        })
+        self.assertEqual(response.json(), {'count': 3})
+        self.assertEqual(set(Event.objects.filter(photographer=self.user).values_list('color', flat=True)), {'#ff0000'})
+
+        ids = ','.join(str(pk) for pk in self.ids[:2] + [foreign.pk])
+        response = self.client.post(url, {'operation': 'delete', 'ids': ids})
+        self.assertEqual(response.json(), {'count': 2})
+        self.assertTrue(Event.objects.filter(pk=foreign.pk).exists())
+        self.assertEqual(self.occupancy(self.studio), 60)
+
+
+class AutocompleteTest(TestCase):
+    """
+    Тесты автодополнения клиентов и студий в форме события
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.studio = Studio.objects.create(
+            name='Loft', city='Москва', street='Тверская', building='1', is_public=True, created_by=self.other
+        )
+        Studio.objects.create(
+            name='Белый лофт', city='Москва', street='Арбат', building='2', is_public=False, created_by=self.user
+        )
+        Studio.objects.create(
+            name='Чужой лофт', city='Москва', street='Арбат', building='3', is_public=False, created_by=self.other
+        )
+        self.clients = [
+            Client.objects.create(photographer=self.user, first_name=f'Клиент{index}', last_name='Тестов')
+            for index in range(5)
+        ]
+
+    def test_studio_autocomplete(self):
+        """
+        Тест поиска доступных студий: совпадения с началом названия идут первыми
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('studios:studio_autocomplete'), {'q': 'лоФТ'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Белый лофт, Москва'])
+        response = self.client.get(reverse('studios:studio_autocomplete'), {'q': 'lo'})
+        self.assertEqual(response.json()['results'], [{'id': self.studio.pk, 'text': 'Loft, Москва'}])
+
+    def test_form_renders_selected_option_only(self):
+        """
+        Тест формы события: в HTML только выбранные клиент и студия, значение проверяется по всему списку
+        """
+        event = Event.objects.create(
+            photographer=self.user,
+            title='Съемка',
+            client=self.clients[2],
+            studio=self.studio,
+            start_datetime=timezone.now() + timedelta(days=1),
+            end_datetime=timezone.now() + timedelta(days=1, hours=1),
+        )
+        html = str(EventForm(instance=event, user=self.user)['client'])
+        self.assertIn('data-autocomplete-url="%s"' % reverse('clients:client_autocomplete'), html)
+        self.assertIn(f'value="{self.clients[2].pk}" selected', html)
+        self.assertNotIn(f'value="{self.clients[0].pk}"', html)
+        self.assertEqual(str(EventForm(user=self.user)['studio']).count('<option'), 1)
+
+        form = EventForm(instance=event, user=self.user)
+        self.assertEqual(form.fields['client'].clean(self.clients[0].pk), self.clients[0])
+
+        # Форма массовых операций выводит только выбранную студию
+        html = str(BulkEventForm(user=self.user)['studio'])
+        self.assertIn('data-autocomplete-url="%s"' % reverse('studios:studio_autocomplete'), html)
+        self.assertEqual(html.count('<option'), 1)
+        form = BulkEventForm({'operation': 'studio', 'studio': self.studio.pk}, user=self.user)
+        self.assertIn(f'value="{self.studio.pk}" selected', str(form['studio']))
+        self.assertEqual(str(form['studio']).count('<option'), 2)
+
+
+class ClientStatsTest(TestCase):
+    """
+    Тесты статистики съемок клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.anna = Client.objects.create(photographer=self.user, first_name='Анна', last_name='Сидорова')
+        self.ivan = Client.objects.create(photographer=self.user, first_name='Иван', last_name='Петров')
+        self.loft = Studio.objects.create(
+            name='Loft', city='Москва', street='Тверская', building='1', created_by=self.user
+        )
+        self.white = Studio.objects.create(
+            name='White', city='Москва', street='Арбат', building='2', created_by=self.user
+        )
+        self.now = timezone.now().replace(microsecond=0)
+
+    def create_shoot(self, days, client=None, studio=None, **kwargs):
+        start = self.now + timedelta(days=days)
+        return Event.objects.create(
+            photographer=self.user, title='Съемка', start_datetime=start, end_datetime=start + timedelta(hours=1),
+            client=client or self.anna, studio=studio, **kwargs
+        )
+
+    def stats(self, client):
+        client.refresh_from_db()
+        return client.shoot_count, client.last_shoot_at, client.next_shoot_at, client.favorite_studio_id
+
+    def test_stats_follow_event_changes(self):
+        """
+        Тест пересчета при создании, переносе, смене клиента и удалении события
+        """
+        past = self.create_shoot(-10, studio=self.loft)
+        self.create_shoot(-3, studio=self.white)
+        future = self.create_shoot(5, studio=self.loft)
+        self.create_shoot(-1, event_type='post')
+        self.assertEqual(self.stats(self.anna), (3, self.now - timedelta(days=3), future.start_datetime, self.loft.pk))
+
+        future.start_datetime = self.now - timedelta(days=1)
+        future.end_datetime = future.start_datetime + timedelta(hours=1)
+        future.save()
+        self.assertEqual(self.stats(self.anna), (3, future.start_datetime, None, self.loft.pk))
+
+        past.client = self.ivan
+        past.save()
+        self.assertEqual(self.stats(self.ivan), (1, past.start_datetime, None, self.loft.pk))
+        # Поровну съемок в двух студиях: любимая та, где съемка была позже
+        self.assertEqual(self.stats(self.anna), (2, future.start_datetime, None, self.loft.pk))
+
+        future.delete()
+        self.assertEqual(self.stats(self.anna), (1, self.now - timedelta(days=3), None, self.white.pk))
+
+    def test_studio_deleted(self):
+        """
+        Тест выбора новой любимой студии после удаления прежней (SET_NULL без сигналов)
+        """
+        self.create_shoot(-10, studio=self.loft)
+        self.create_shoot(-9, studio=self.loft)
+        self.create_shoot(-8, studio=self.white)
+        self.assertEqual(self.stats(self.anna)[3], self.loft.pk)
+
+        self.loft.delete()
+
+        self.assertEqual(self.stats(self.anna)[3], self.white.pk)
+
+    def test_bulk_shift_and_import(self):
+        """
+        Тест пересчета после массового переноса и пакетного импорта, обходящих сигналы
+        """
+        event = self.create_shoot(-1)
+        apply_bulk_operation(self.user, Event.objects.filter(pk=event.pk), 'shift', delta=timedelta(days=2))
+        self.assertEqual(self.stats(self.anna)[1:3], (None, event.start_datetime + timedelta(days=2)))
+
+        start = timezone.localtime(self.now - timedelta(days=20))
+        rows = ['title,start,client', f'Съемка,{start:%Y-%m-%d %H:%M},Иван Петров']
+        EventImporter(self.user).import_csv(io.BytesIO('\n'.join(rows).encode('utf-8')))
+        self.assertEqual(self.stats(self.ivan)[:2], (1, start.replace(second=0)))
+
+    def test_client_save_keeps_stats(self):
+        """
+        Тест того, что сохранение клиента, прочитанного до изменения событий, не возвращает старую статистику
+        """
+        stale = Client.objects.get(pk=self.anna.pk)
+        self.create_shoot(-1)
+        stale.notes = 'Постоянный клиент'
+        stale.save()
+        self.assertEqual(self.stats(self.anna)[0], 1)
+
+    def test_rebuild_due(self):
+        """
+        Тест пересчета клиентов, чья следующая съемка прошла
+        """
+        shoot = self.create_shoot(1)
+        self.create_shoot(3, client=self.ivan)
+        later = self.now + timedelta(days=2)
+
+        self.assertEqual(rebuild_client_stats(due=True, now=later), 1)
+        self.assertEqual(self.stats(self.anna)[1:3], (shoot.start_datetime, None))
+        self.assertIsNotNone(self.stats(self.ivan)[2])
+
+    def test_client_list_sorted_by_last_shoot(self):
+        """
+        Тест сортировки и фильтров списка клиентов по статистике съемок
+        """
+        self.create_shoot(-5)
+        self.create_shoot(-1, client=self.ivan)
+        self.create_shoot(3, client=self.ivan)
+        silent = Client.objects.create(photographer=self.user, first_name='Олег', last_name='Без съемок')
+        self.client.force_login(self.user)
+        url = reverse('clients:client_list')
+
+        response = self.client.get(url, {'sort': 'last_shoot'})
+        self.assertEqual(list(response.context['clients']), [self.ivan, self.anna, silent])
+        response = self.client.get(url, {'upcoming': 'on'})
+        self.assertEqual(list(response.context['clients']), [self.ivan])
+        response = self.client.get(url, {'min_shoots': '2', 'sort': 'next_shoot'})
+        self.assertEqual(list(response.context['clients']), [self.ivan])
+
+
+@tag('slow')
+@skipUnless(os.environ.get('PHOTOHUB_SLOW_TESTS'), 'Задайте PHOTOHUB_SLOW_TESTS=1 для медленных тестов')
+class EventFeedExplainTest(TestCase):
+    """
+    Регрессионный тест плана запроса ленты на синтетической таблице.
+    Заполнение таблицы занимает минуты, поэтому тест запускается только с
+    PHOTOHUB_SLOW_TESTS=1 (например, PHOTOHUB_SLOW_TESTS=1 python manage.py test --tag=slow)
+    """
+    PHOTOGRAPHERS = 500
+    EVENTS = 2000000
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([
+            User(username=f'photographer{i}', email=f'photographer{i}@example.com', password='!')
+            for i in range(cls.PHOTOGRAPHERS)
+        ])
+        cls.user = User.objects.order_by('id').first()
+        with connection.cursor() as cursor:
+            # События равномерно распределены по фотографам и по пяти годам
+            cursor.execute("""
+                WITH photographers AS (
+                    SELECT array_agg(id ORDER BY id) AS ids FROM users_customuser
+                )
+                INSERT INTO calendar_app_event (
+                    photographer_id, title, event_type, start_datetime, end_datetime,
+                    description, is_all_day, color, recurrence_rule, created_at, updated_at
+                )
+                SELECT
+                    photographers.ids[1 + g %% %(photographers)s],
+                    'Событие ' || g,
+                    CASE WHEN g %% 3 = 0 THEN 'post' ELSE 'photoshoot' END,
+                    TIMESTAMPTZ '2021-01-01' + (g * INTERVAL '79 seconds'),
+                    CASE WHEN g %% 10 = 0 THEN NULL
+                         ELSE TIMESTAMPTZ '2021-01-01' + (g * INTERVAL '79 seconds') + INTERVAL '2 hours' END,
+                    '', FALSE, '#3788d8', '', NOW(), NOW()
+                FROM generate_series(1, %(events)s) AS g, photographers
+            """, {'photographers': cls.PHOTOGRAPHERS, 'events': cls.EVENTS})
+            cursor.execute('ANALYZE calendar_app_event')
+
+    def test_feed_uses_index(self):
+        """
+        Тест того, что выборка окна идет по индексу, а не последовательным сканированием
+        """
+        start = timezone.make_aware(datetime(2023, 6, 1))
+        end = start + timedelta(days=42)
+        plan = get_feed_queryset(self.user, start, end, ['photoshoot']).explain()
+
+        self.assertNotIn('Seq Scan on calendar_app_event', plan)
+        self.assertTrue(
+            'event_photographer_interval' in plan or 'event_photographer_type_start' in plan,
+            plan
+        )
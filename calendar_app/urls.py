@@ -5,11 +5,21 @@ app_name = 'calendar'
 
 urlpatterns = [
     path('', views.CalendarView.as_view(), name='calendar'),
+    path('agenda/', views.AgendaView.as_view(), name='agenda'),
     path('events/add/', views.EventCreateView.as_view(), name='event_add'),
+    path('events/import/', views.EventImportView.as_view(), name='event_import'),
+    path('events/export/', views.event_export, name='event_export'),
+    path('events/bulk/', views.EventBulkView.as_view(), name='event_bulk'),
     path('events/<int:pk>/', views.EventDetailView.as_view(), name='event_detail'),
     path('events/<int:pk>/edit/', views.EventUpdateView.as_view(), name='event_edit'),
     path('events/<int:pk>/delete/', views.EventDeleteView.as_view(), name='event_delete'),
     path('api/events/', views.get_events_json, name='events_json'),
+    path('api/events/bulk/', views.bulk_events_json, name='bulk_events_json'),
     path('api/events/filter/<str:event_type>/', views.get_filtered_events_json, name='filtered_events_json'),
+    path('api/agenda/', views.agenda_json, name='agenda_json'),
+    path('api/live/', views.event_stream, name='live'),
+    path('api/slots/', views.free_slots, name='free_slots'),
+    path('api/subscription/', views.ics_subscription, name='ics_subscription'),
+    path('ics/<str:token>.ics', views.ics_feed, name='ics_feed'),
 ]
 
@@ -1,22 +1,44 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy, reverse
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
-from django.utils.dateparse import parse_datetime
-from django.utils.timezone import make_aware
-from datetime import datetime, timedelta
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.http import urlencode
 
-from .models import Event
-from .forms import EventForm, EventFormPost
+from .models import Event, CalendarSubscription
+from .booking import describe_conflict, find_studio_conflict, is_studio_conflict_error
+from .bulk import BulkOperationError, apply_bulk_operation
+from .cache import get_feed_cache, get_feed_generation
+from .feed import CalendarFeed, get_feed_queryset, get_feed_window, get_initial_window, parse_event_types
+from .ics import ICS_CACHE_KEY, get_ics_queryset, iter_ics_cached
+from .agenda import (
+    DEFAULT_PAGE_SIZE, get_agenda_page, get_agenda_queryset, get_ongoing_series, serialize_agenda,
+)
+from .forms import (
+    AgendaFilterForm, BulkEventForm, EventExportForm, EventForm, EventFormPost, EventImportForm, FreeSlotForm,
+)
+from .exporters import get_export_queryset, iter_events_csv
+from .importers import ENCODING_ERROR, EventImporter
+from .live import iter_live_events
+from .slots import find_free_slots
+from clients.birthdays import get_upcoming_birthdays
 from clients.models import Client
+from photohub.export import export_response
 from studios.models import Studio
 
 from django.utils.safestring import mark_safe
 import json
 
+# За сколько дней календарь показывает дни рождения клиентов
+BIRTHDAY_WIDGET_DAYS = 14
+
 class CalendarView(LoginRequiredMixin, TemplateView):
     """
     Представление для отображения календаря
@@ -29,19 +51,91 @@ class CalendarView(LoginRequiredMixin, TemplateView):
         """
         context = super().get_context_data(**kwargs)
 
-
-        event_filter = self.request.GET.get('filter')
+        # Встроенные события и JSON-лента фильтруются одним разобранным списком
+        # типов: неизвестный тип отбрасывается в обоих местах
+        event_types = parse_event_types(self.request.GET.get('filter') or 'photoshoot')
+        event_type = ','.join(event_types)
         user = self.request.user
 
-        if event_filter is None:
-            events = Event.objects.filter(event_type='photoshoot', photographer=user)
-        else:
-            events = Event.objects.filter(event_type=event_filter, photographer=user)
-        context['events'] = mark_safe(json.dumps(Event.serialize_for_calendar(events)))
-
+        # В страницу встраивается только начальное окно, остальные диапазоны
+        # FullCalendar подгружает из JSON-ленты по мере навигации
+        window_start, window_end = get_initial_window()
+        events = get_feed_queryset(user, window_start, window_end, event_types)
+        context['events'] = mark_safe(json.dumps(Event.serialize_for_calendar(events, window_start, window_end)))
+        context['events_window'] = mark_safe(json.dumps({
+            'start': window_start.isoformat(),
+            'end': window_end.isoformat(),
+        }))
+        context['events_url'] = f"{reverse('calendar:events_json')}?{urlencode({'types': event_type})}"
+        context['live_url'] = reverse('calendar:live')
+        context['event_type'] = event_type
 
         context['clients'] = Client.objects.filter(photographer=self.request.user)
-        context['studios'] = Studio.objects.filter(is_public=True) | Studio.objects.filter(created_by=self.request.user)
+        # Виджет ближайших дней рождения клиентов
+        context['upcoming_birthdays'] = get_upcoming_birthdays(
+            Client.objects.filter(photographer=user), BIRTHDAY_WIDGET_DAYS
+        )
+        context['studios'] = Studio.objects.visible_to(self.request.user)
+        return context
+
+
+class BookingConflictMixin:
+    """
+    Превращает нарушение ограничения на пересечение бронирований студии в ошибку формы.
+    Форма проверяет пересечения заранее, но одновременное сохранение двух
+    событий отлавливает только база
+    """
+    def form_valid(self, form):
+        try:
+            with transaction.atomic():
+                return super().form_valid(form)
+        except IntegrityError as error:
+            if not is_studio_conflict_error(error):
+                raise
+        instance = form.instance
+        conflict = find_studio_conflict(instance.studio_id, instance.start_datetime, instance.end_datetime, instance.pk)
+        message = 'Студия занята.'
+        if conflict is not None:
+            message = f'{message} {describe_conflict(conflict, instance.photographer_id or self.request.user.pk)}'
+        form.add_error('studio' if 'studio' in form.fields else None, message)
+        return self.form_invalid(form)
+
+
+def _agenda_page(request):
+    """
+    Разбирает фильтры повестки и возвращает (форма, события страницы, курсор следующей страницы)
+    """
+    form = AgendaFilterForm(request.GET)
+    if not form.is_valid():
+        return form, None, None
+    data = form.cleaned_data
+    now = timezone.now()
+    filters = (data['client'], data['studio'], data['event_type'])
+    queryset = get_agenda_queryset(request.user, data['scope'], *filters, now=now)
+    descending = data['scope'] == 'past'
+    series = () if descending else get_ongoing_series(request.user, *filters, now=now)
+    events, next_cursor = get_agenda_page(
+        queryset, data['cursor'], data['limit'] or DEFAULT_PAGE_SIZE, descending=descending, series=series,
+    )
+    return form, events, next_cursor
+
+
+class AgendaView(LoginRequiredMixin, TemplateView):
+    """
+    Представление для отображения списка событий (предстоящие или прошедшие)
+    """
+    template_name = 'calendar_app/agenda.html'
+
+    def get_context_data(self, **kwargs):
+        """
+        Добавляем страницу событий, курсор следующей страницы и фильтры в контекст
+        """
+        context = super().get_context_data(**kwargs)
+        form, events, next_cursor = _agenda_page(self.request)
+        context['filter_form'] = form
+        context['events'] = events or []
+        context['next_cursor'] = next_cursor
+        context['agenda_url'] = reverse('calendar:agenda_json')
         return context
 
 
@@ -59,7 +153,7 @@ class EventDetailView(LoginRequiredMixin, DetailView):
         """
         return Event.objects.filter(photographer=self.request.user)
 
-class EventCreateView(LoginRequiredMixin, CreateView):
+class EventCreateView(LoginRequiredMixin, BookingConflictMixin, CreateView):
     """
     Представление для создания нового события
     """
@@ -105,13 +199,15 @@ class EventCreateView(LoginRequiredMixin, CreateView):
         form_type = self.request.GET.get('filter', "photoshoot")
         form.instance.event_type = form_type
         form.instance.photographer = self.request.user
-        messages.success(self.request, 'Событие успешно создано!')
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        if form.is_valid():
+            messages.success(self.request, 'Событие успешно создано!')
+        return response
 
     def get_success_url(self):
         return reverse('calendar:event_detail', kwargs={'pk': self.object.pk})
 
-class EventUpdateView(LoginRequiredMixin, UpdateView):
+class EventUpdateView(LoginRequiredMixin, BookingConflictMixin, UpdateView):
     """
     Представление для редактирования события
     """
@@ -137,8 +233,10 @@ class EventUpdateView(LoginRequiredMixin, UpdateView):
         """
         Добавляем сообщение об успешном обновлении
         """
-        messages.success(self.request, 'Событие успешно обновлено!')
-        return super().form_valid(form)
+        response = super().form_valid(form)
+        if form.is_valid():
+            messages.success(self.request, 'Событие успешно обновлено!')
+        return response
     
     def get_success_url(self):
         """
@@ -167,96 +265,245 @@ class EventDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(self.request, 'Событие успешно удалено!')
         return super().delete(request, *args, **kwargs)
 
+def _apply_bulk_form(form, user):
+    """
+    Применяет массовую операцию из проверенной формы. Возвращает число
+    затронутых событий или None, если операция отклонена (ошибки добавлены в форму)
+    """
+    data = form.cleaned_data
+    try:
+        return apply_bulk_operation(
+            user, form.get_queryset(), data['operation'],
+            delta=data.get('delta'), studio=data['studio'], color=data['color'],
+        )
+    except BulkOperationError as error:
+        for message in error.messages:
+            form.add_error(None, message)
+    except IntegrityError as error:
+        # Пересечение с событием, сохраненным одновременно с проверкой
+        if not is_studio_conflict_error(error):
+            raise
+        form.add_error(None, 'Студия занята: пересечение с только что сохраненным событием.')
+    return None
+
+
+class EventBulkView(LoginRequiredMixin, FormView):
+    """
+    Представление для массового изменения событий: перенос, смена студии или цвета, удаление
+    """
+    form_class = BulkEventForm
+    template_name = 'calendar_app/event_bulk.html'
+    success_url = reverse_lazy('calendar:calendar')
+
+    def get_form_kwargs(self):
+        """
+        Передаем текущего пользователя в форму
+        """
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
+
+    def form_valid(self, form):
+        """
+        Применяем операцию и сообщаем о результате
+        """
+        count = _apply_bulk_form(form, self.request.user)
+        if count is None:
+            return self.form_invalid(form)
+        messages.success(self.request, f'Изменено событий: {count}.')
+        return super().form_valid(form)
+
+class EventImportView(LoginRequiredMixin, FormView):
+    """
+    Представление для импорта событий из файла .ics или .csv
+    """
+    form_class = EventImportForm
+    template_name = 'calendar_app/event_import.html'
+    success_url = reverse_lazy('calendar:calendar')
+
+    # Сколько ошибок показывать пользователю
+    max_reported_errors = 10
+
+    def form_valid(self, form):
+        """
+        Импортируем события и сообщаем о результате
+        """
+        importer = EventImporter(self.request.user, default_event_type=form.cleaned_data['event_type'])
+        try:
+            importer.import_file(form.cleaned_data['file'])
+        except UnicodeDecodeError:
+            form.add_error('file', ENCODING_ERROR)
+            return self.form_invalid(form)
+
+        messages.success(self.request, f'Импортировано событий: {importer.created} из {importer.processed}.')
+        for line, message in importer.errors[:self.max_reported_errors]:
+            messages.warning(self.request, f'Строка {line}: {message}')
+        if len(importer.errors) > self.max_reported_errors:
+            messages.warning(self.request, f'И еще ошибок: {len(importer.errors) - self.max_reported_errors}')
+        return super().form_valid(form)
+
+def _request_feed(request, event_type=None):
+    """
+    Лента для запроса; создается один раз и переиспользуется
+    валидаторами и самим представлением
+    """
+    if not hasattr(request, 'calendar_feed'):
+        if event_type is None:
+            event_types = parse_event_types(request.GET.get('types'))
+        else:
+            # Неизвестный тип в пути дает пустую ленту, а не все события
+            event_types = parse_event_types(event_type) or None
+        start_date, end_date = get_feed_window(request.GET)
+        request.calendar_feed = CalendarFeed(
+            request.user, start_date, end_date, event_types,
+            # Окна по умолчанию зависят от текущего времени, кэшировать их бессмысленно
+            cacheable='start' in request.GET and 'end' in request.GET,
+        )
+    return request.calendar_feed
+
+def _feed_etag(request, event_type=None):
+    return _request_feed(request, event_type).validator.etag
+
+def _feed_last_modified(request, event_type=None):
+    return _request_feed(request, event_type).validator.last_modified
+
+# Браузер хранит ответ ленты, но всегда перепроверяет его через If-None-Match,
+# а сервер отвечает 304 без сериализации событий, если лента не изменилась
+feed_conditional = condition(etag_func=_feed_etag, last_modified_func=_feed_last_modified)
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@feed_conditional
 def get_events_json(request):
     """
-    Функция для получения событий в формате JSON для календаря
+    Функция для получения событий в формате JSON для календаря.
+    Поддерживает фильтр по нескольким типам: ?types=photoshoot,post
     """
-    start = request.GET.get('start', None)
-    end = request.GET.get('end', None)
-    
-    if start:
-        start_date = make_aware(datetime.fromisoformat(start.replace('Z', '+00:00')))
-    else:
-        start_date = make_aware(datetime.now() - timedelta(days=30))
-    
-    if end:
-        end_date = make_aware(datetime.fromisoformat(end.replace('Z', '+00:00')))
-    else:
-        end_date = make_aware(datetime.now() + timedelta(days=30))
-    
-    events = Event.objects.filter(
-        photographer=request.user,
-        start_datetime__gte=start_date,
-        end_datetime__lte=end_date
-    )
-    
-    event_list = []
-    for event in events:
-        event_dict = {
-            'id': event.id,
-            'title': event.title,
-            'start': event.start_datetime.isoformat(),
-            'end': event.end_datetime.isoformat(),
-            'allDay': event.is_all_day,
-            'color': event.color,
-            'url': reverse('calendar:event_detail', args=[event.id]),
-            'extendedProps': {
-                'event_type': event.event_type,
-                'event_type_display': event.event_type_display,
-                'description': event.description,
-                'client': event.client.get_full_name() if event.client else None,
-                'studio': event.studio.name if event.studio else None,
-            }
-        }
-        event_list.append(event_dict)
-    
-    return JsonResponse(event_list, safe=False)
+    return HttpResponse(_request_feed(request).render(), content_type='application/json')
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@feed_conditional
 def get_filtered_events_json(request, event_type):
     """
     Функция для получения отфильтрованных событий в формате JSON для календаря
     """
-    start = request.GET.get('start', None)
-    end = request.GET.get('end', None)
-    
-    if start:
-        start_date = make_aware(datetime.fromisoformat(start.replace('Z', '+00:00')))
-    else:
-        start_date = make_aware(datetime.now() - timedelta(days=30))
-    
-    if end:
-        end_date = make_aware(datetime.fromisoformat(end.replace('Z', '+00:00')))
+    return HttpResponse(_request_feed(request, event_type).render(), content_type='application/json')
+
+def _request_ics(request, token):
+    """
+    Подписка и поколение ленты для запроса iCalendar
+    """
+    if not hasattr(request, 'ics_subscription'):
+        request.ics_subscription = get_object_or_404(
+            CalendarSubscription.objects.select_related('photographer'), token=token
+        )
+        request.ics_generation = get_feed_generation(request.ics_subscription.photographer_id)
+    return request.ics_subscription, request.ics_generation
+
+def _ics_etag(request, token):
+    subscription, generation = _request_ics(request, token)
+    return f'ics-{generation}'
+
+@condition(etag_func=_ics_etag)
+def ics_feed(request, token):
+    """
+    Календарь фотографа в формате iCalendar для подписки по токену.
+    Приложения календаря опрашивают его каждые несколько минут, поэтому
+    неизменившийся календарь отдается как 304 или из кэша
+    """
+    subscription, generation = _request_ics(request, token)
+    cache = get_feed_cache()
+    cache_key = ICS_CACHE_KEY % (subscription.photographer_id, generation)
+    content_type = 'text/calendar; charset=utf-8'
+
+    body = cache.get(cache_key)
+    if body is not None:
+        response = HttpResponse(body, content_type=content_type)
     else:
-        end_date = make_aware(datetime.now() + timedelta(days=30))
-    
-    events = Event.objects.filter(
-        photographer=request.user,
-        start_datetime__gte=start_date,
-        end_datetime__lte=end_date,
-        event_type=event_type
+        events = get_ics_queryset(subscription.photographer)
+        name = f'PhotoHub: {subscription.photographer.get_full_name()}'
+        response = StreamingHttpResponse(iter_ics_cached(events, cache, cache_key, name=name), content_type=content_type)
+    response['Content-Disposition'] = 'inline; filename="photohub.ics"'
+    return response
+
+@login_required
+def event_export(request):
+    """
+    Выгрузка событий фотографа в CSV: ?start=2030-01-01&end=2030-12-31 ограничивает
+    период по дате начала, ?gzip=1 сжимает файл на лету
+    """
+    form = EventExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    queryset = get_export_queryset(request.user, *form.get_period())
+    return export_response(iter_events_csv(queryset), 'events.csv', 'text/csv; charset=utf-8',
+                           form.cleaned_data['gzip'])
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def ics_subscription(request):
+    """
+    Возвращает адрес подписки на календарь; POST выпускает новый токен,
+    старый адрес при этом перестает работать
+    """
+    subscription = CalendarSubscription.for_user(request.user, regenerate=request.method == 'POST')
+    url = request.build_absolute_uri(reverse('calendar:ics_feed', args=[subscription.token]))
+    return JsonResponse({'url': url})
+
+@login_required
+def free_slots(request):
+    """
+    Свободное время в выбранных студиях, когда свободен и сам фотограф:
+    ?studio=1&studio=2&duration=180&start=2030-01-01&end=2030-01-31&work_start=10:00&work_end=20:00
+    """
+    form = FreeSlotForm(request.GET, user=request.user)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    data = form.cleaned_data
+    slots = find_free_slots(
+        request.user, list(data['studio']), data['start'], data['end'],
+        data['work_start'], data['work_end'], data['duration'],
     )
-    
-    event_list = []
-    for event in events:
-        event_dict = {
-            'id': event.id,
-            'title': event.title,
-            'start': event.start_datetime.isoformat(),
-            'end': event.end_datetime.isoformat(),
-            'allDay': event.is_all_day,
-            'color': event.color,
-            'url': reverse('calendar:event_detail', args=[event.id]),
-            'extendedProps': {
-                'event_type': event.event_type,
-                'event_type_display': event.event_type_display,
-                'description': event.description,
-                'client': event.client.get_full_name() if event.client else None,
-                'studio': event.studio.name if event.studio else None,
-            }
-        }
-        event_list.append(event_dict)
-    
-    return JsonResponse(event_list, safe=False)
+    return JsonResponse({'slots': slots})
 
+@login_required
+async def event_stream(request):
+    """
+    Поток Server-Sent Events с изменениями событий фотографа для открытых вкладок календаря.
+    Работает только под ASGI: под WSGI соединение заняло бы поток воркера, поэтому
+    отвечаем 204, и браузер не переподключается, а календарь обходится без обновлений
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    response = StreamingHttpResponse(iter_live_events(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Отключаем буферизацию ответа в nginx
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def agenda_json(request):
+    """
+    Страница списка событий в JSON: ?scope=upcoming|past&client=&studio=&event_type=&cursor=.
+    Следующая страница запрашивается с cursor из ответа, пока он не равен null
+    """
+    form, events, next_cursor = _agenda_page(request)
+    if events is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({'events': serialize_agenda(events), 'next_cursor': next_cursor})
+
+@login_required
+@require_http_methods(['POST'])
+def bulk_events_json(request):
+    """
+    Массовая операция над событиями в JSON: operation=shift|studio|color|delete,
+    ids=1,2,3 и/или фильтр (date_from, date_to, event_type, filter_studio, filter_client)
+    и параметры операции (shift_minutes, studio, color)
+    """
+    form = BulkEventForm(request.POST, user=request.user)
+    count = _apply_bulk_form(form, request.user) if form.is_valid() else None
+    if count is None:
+        return JsonResponse({'errors': form.errors}, status=400)
+    return JsonResponse({'count': count})
@@ -0,0 +1,32 @@
+"""
+Виджеты форм календаря
+"""
+from copy import copy
+
+from django import forms
+
+
+class AutocompleteSelect(forms.Select):
+    """
+    Выпадающий список, варианты которого подгружаются с сервера по мере ввода
+    (static/calendar_app/js/autocomplete.js). В HTML попадает только выбранный
+    вариант, поэтому размер формы не зависит от числа клиентов и студий, а
+    проверку значения по-прежнему выполняет ModelChoiceField
+    """
+    class Media:
+        js = ('calendar_app/js/autocomplete.js',)
+
+    def __init__(self, url, attrs=None):
+        super().__init__({**(attrs or {}), 'data-autocomplete-url': url})
+
+    def optgroups(self, name, value, attrs=None):
+        choices = self.choices
+        if hasattr(choices, 'queryset'):
+            selected = [pk for pk in value if str(pk).isdigit()]
+            choices = copy(choices)
+            choices.queryset = choices.queryset.filter(pk__in=selected) if selected else choices.queryset.none()
+        original, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = original
@@ -0,0 +1,101 @@
+"""
+Ближайшие дни рождения клиентов.
+
+База хранит день рождения как число ММДД (колонка birth_day), и период
+"ближайшие N дней" превращается в диапазоны этого числа по каждому году
+периода: 1220-1231 и 0101-0105 для периода через Новый год. Диапазоны
+проверяются по индексу client_birthday (фотограф, birth_day), поэтому
+запрос не перебирает всех клиентов фотографа.
+
+Родившиеся 29 февраля в невисокосный год поздравляются 28 февраля:
+период, который заканчивается 28 февраля такого года, захватывает и 0229.
+"""
+import calendar
+from datetime import date, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+LEAP_DAY = 229
+
+# Самый длинный период поиска, дней
+MAX_BIRTHDAY_DAYS = 366
+
+
+def month_day(value):
+    return value.month * 100 + value.day
+
+
+def get_birthday_segments(today, days):
+    """
+    Диапазоны ММДД периода [today, today + days]: [(год, от, до)], по одному на каждый год периода
+    """
+    end = today + timedelta(days=min(days, MAX_BIRTHDAY_DAYS))
+    segments = []
+    start = today
+    while start <= end:
+        last_day = min(end, date(start.year, 12, 31))
+        last = month_day(last_day)
+        if last == 228 and not calendar.isleap(start.year):
+            last = LEAP_DAY
+        segments.append((start.year, month_day(start), last))
+        start = date(start.year + 1, 1, 1)
+    return segments
+
+
+def get_birthday_filter(segments):
+    """
+    Условие на клиентов с днем рождения в одном из диапазонов
+    """
+    condition = Q()
+    for year, first, last in segments:
+        condition |= Q(birth_day__range=(first, last))
+    return condition
+
+
+def get_next_birthday(birth_date, today):
+    """
+    Ближайший день рождения не раньше today (29 февраля в невисокосный год - 28 февраля)
+    """
+    for year in (today.year, today.year + 1):
+        day = birth_date.day
+        if birth_date.month == 2 and day == 29 and not calendar.isleap(year):
+            day = 28
+        birthday = date(year, birth_date.month, day)
+        if birthday >= today:
+            return birthday
+    return None
+
+
+def set_next_birthday(client, today):
+    """
+    Задает клиенту next_birthday, days_left и age (сколько исполнится)
+    """
+    client.next_birthday = get_next_birthday(client.birth_date, today)
+    client.days_left = (client.next_birthday - today).days
+    client.age = client.next_birthday.year - client.birth_date.year
+    return client
+
+
+def get_upcoming_birthdays(queryset, days, today=None):
+    """
+    Клиенты queryset с днем рождения в ближайшие days дней, самые близкие первыми
+    (с заданными set_next_birthday полями)
+    """
+    today = today or timezone.localdate()
+    clients = list(queryset.filter(get_birthday_filter(get_birthday_segments(today, days))))
+    for client in clients:
+        set_next_birthday(client, today)
+    clients.sort(key=lambda client: (client.days_left, client.last_name, client.first_name, client.pk))
+    return clients
+
+
+def serialize_birthday(client):
+    return {
+        'id': client.pk,
+        'name': client.get_full_name(),
+        'birth_date': client.birth_date.isoformat(),
+        'date': client.next_birthday.isoformat(),
+        'days': client.days_left,
+        'age': client.age,
+    }
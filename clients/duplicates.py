@@ -0,0 +1,251 @@
+"""
+Поиск и объединение дубликатов клиентов.
+
+Сравнивать каждого клиента с каждым - O(n²), поэтому клиенты сначала
+раскладываются по блокам с общими ключами: номер телефона (phone_digits -
+последние 10 цифр), локальная часть email без точек и меток "+..." и
+фонетический ключ имени, одинаковый для "Петров", "Петроф" и "Petrov".
+Оцениваются только пары внутри блоков; слишком большие блоки (общий
+адрес вроде info@ или пустое имя) пропускаются. Клиенты читаются одним
+запросом кортежами, поэтому фотограф со 100 тыс. клиентов обрабатывается
+за секунды.
+
+Найденные пары с оценкой не ниже MIN_SCORE сохраняются в ClientDuplicate.
+Пары, совпавшие только по имени (без общих контактов), не набирают
+MIN_SCORE, поэтому для них порог свой - MIN_NAME_SCORE: имя с опечаткой
+и ничего противоречащего (другого телефона или даты рождения).
+Отклоненные фотографом пары при следующем поиске не предлагаются снова.
+"""
+import re
+from collections import defaultdict, namedtuple
+from difflib import SequenceMatcher
+from itertools import combinations
+
+from django.db import transaction
+from django.utils import timezone
+
+from calendar_app.client_stats import refresh_client_stats
+from calendar_app.live import publish
+from calendar_app.models import Event
+from calendar_app.signals import invalidate_feeds
+from sync.fields import NextSyncVersion
+from .models import Client, ClientDuplicate
+
+# Пары с меньшей оценкой не предлагаются
+MIN_SCORE = 0.6
+
+# Порог для пар, совпавших только по имени: сходство имен не ниже 0.875 без противоречий
+MIN_NAME_SCORE = 0.35
+
+# Совпадения контактов; пары без них оцениваются по MIN_NAME_SCORE
+CONTACT_REASONS = {'телефон', 'email'}
+
+# Больше клиентов в блоке не сравниваем: такой ключ ничего не говорит о совпадении
+MAX_BLOCK_SIZE = 50
+
+# Короткие локальные части email (a@, ok@) совпадают случайно
+MIN_EMAIL_LOCAL = 4
+
+# Поля, которые переходят от дубликата, если у остающегося клиента они пустые
+MERGE_FIELDS = ('email', 'phone_number', 'birth_date', 'address')
+
+TRANSLIT = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r',
+    'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'c', 'ч': 'ch', 'ш': 'sh', 'щ': 'sh',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+})
+
+# Сочетания латиницы, которые звучат одним звуком
+PHONETIC_DIGRAPHS = (
+    ('shch', 's'), ('sch', 's'), ('sh', 's'), ('ch', 'c'), ('zh', 's'), ('kh', 'k'), ('ts', 'c'), ('ph', 'f'), ('x', 'ks'),
+)
+
+# Согласные, которые часто путают или пишут по-разному: б/п, в/ф, г/к/х, д/т, з/с, ц/с
+PHONETIC_GROUPS = str.maketrans('bpvfwgkhqdtzc', 'ppffkkkkkttss')
+
+Candidate = namedtuple('Candidate', ['id', 'name', 'phone', 'email', 'email_local', 'birth_date'])
+
+
+def transliterate(value):
+    return re.sub(r'[^a-z ]', '', ' '.join(value.lower().split()).translate(TRANSLIT))
+
+
+def phonetic_key(value):
+    """
+    Грубый фонетический ключ слова: первая буква и согласные без повторов
+    """
+    value = re.sub(r'[^a-z]', '', transliterate(value))
+    if not value:
+        return ''
+    for digraph, sound in PHONETIC_DIGRAPHS:
+        value = value.replace(digraph, sound)
+    value = value.translate(PHONETIC_GROUPS)
+    consonants = re.sub(r'[aeiouy]', '', value[1:])
+    key = value[0] + re.sub(r'(.)\1+', r'\1', consonants)
+    return key[:6]
+
+
+def name_key(first_name, last_name):
+    """
+    Ключ имени, не зависящий от порядка имени и фамилии
+    """
+    return ' '.join(sorted(filter(None, (phonetic_key(first_name), phonetic_key(last_name)))))
+
+
+def email_local_part(email):
+    """
+    Локальная часть email без точек и метки после "+": ivan.petrov+photo@ -> ivanpetrov
+    """
+    local = email.lower().partition('@')[0].partition('+')[0].replace('.', '')
+    return local if len(local) >= MIN_EMAIL_LOCAL else ''
+
+
+def load_candidates(user):
+    """
+    Клиенты фотографа для сравнения (один запрос)
+    """
+    rows = Client.objects.filter(photographer=user).order_by('pk').values_list(
+        'pk', 'first_name', 'last_name', 'phone_digits', 'email', 'birth_date',
+    )
+    for pk, first_name, last_name, phone_digits, email, birth_date in rows.iterator(chunk_size=5000):
+        email = email.lower()
+        yield Candidate(
+            id=pk,
+            name=' '.join(sorted(transliterate(f'{first_name} {last_name}').split())),
+            phone=phone_digits if len(phone_digits or '') == 10 else '',
+            email=email,
+            email_local=email_local_part(email),
+            birth_date=birth_date,
+        ), name_key(first_name, last_name)
+
+
+def get_blocks(candidates):
+    """
+    Блоки клиентов с общим ключом; в блок попадают только ключи, найденные у двух и более клиентов
+    """
+    blocks = defaultdict(list)
+    for candidate, key in candidates:
+        if candidate.phone:
+            blocks['phone', candidate.phone].append(candidate)
+        if candidate.email_local:
+            blocks['email', candidate.email_local].append(candidate)
+        if key:
+            blocks['name', key].append(candidate)
+    return [block for block in blocks.values() if 1 < len(block) <= MAX_BLOCK_SIZE]
+
+
+def score_pair(a, b):
+    """
+    Оценка сходства двух клиентов от 0 до 1 и список совпадений
+    """
+    score, reasons = 0.0, []
+    if a.phone and a.phone == b.phone:
+        score += 0.45
+        reasons.append('телефон')
+    elif a.phone and b.phone:
+        score -= 0.1
+    if a.email and a.email == b.email:
+        score += 0.45
+        reasons.append('email')
+    elif a.email_local and a.email_local == b.email_local:
+        score += 0.3
+        reasons.append('email')
+    similarity = SequenceMatcher(None, a.name, b.name).ratio()
+    score += 0.4 * similarity
+    if similarity >= 0.8:
+        reasons.append('имя')
+    if a.birth_date and b.birth_date:
+        if a.birth_date == b.birth_date:
+            score += 0.15
+            reasons.append('дата рождения')
+        else:
+            score -= 0.3
+    return max(0.0, min(score, 1.0)), reasons
+
+
+def is_suggested(score, reasons, min_score=MIN_SCORE, min_name_score=MIN_NAME_SCORE):
+    if CONTACT_REASONS.intersection(reasons):
+        return score >= min_score
+    return 'имя' in reasons and score >= min_name_score
+
+
+def find_duplicates(user, min_score=MIN_SCORE, min_name_score=MIN_NAME_SCORE):
+    """
+    Пары возможных дубликатов: [(id клиента, id дубликата, оценка, совпадения)], самые похожие первыми
+    """
+    pairs = set()
+    for block in get_blocks(load_candidates(user)):
+        pairs.update(combinations(block, 2))
+    suggestions = []
+    for a, b in pairs:
+        score, reasons = score_pair(a, b)
+        if is_suggested(score, reasons, min_score, min_name_score):
+            # Раньше созданный клиент (меньший id) остается после объединения
+            first, second = (a, b) if a.id < b.id else (b, a)
+            suggestions.append((first.id, second.id, round(score, 3), ', '.join(reasons)))
+    suggestions.sort(key=lambda suggestion: (-suggestion[2], suggestion[0], suggestion[1]))
+    return suggestions
+
+
+def update_duplicate_suggestions(user, min_score=MIN_SCORE, batch_size=1000, min_name_score=MIN_NAME_SCORE):
+    """
+    Заменяет предложения фотографа новыми; отклоненные пары остаются отклоненными.
+    Возвращает число предложений
+    """
+    suggestions = find_duplicates(user, min_score, min_name_score)
+    with transaction.atomic():
+        dismissed = set(
+            ClientDuplicate.objects.filter(photographer=user, dismissed=True).values_list('client_id', 'duplicate_id')
+        )
+        ClientDuplicate.objects.filter(photographer=user, dismissed=False).delete()
+        created = ClientDuplicate.objects.bulk_create(
+            [
+                ClientDuplicate(
+                    photographer=user, client_id=client_id, duplicate_id=duplicate_id, score=score, reasons=reasons,
+                )
+                for client_id, duplicate_id, score, reasons in suggestions
+                if (client_id, duplicate_id) not in dismissed
+            ],
+            batch_size=batch_size,
+        )
+    return len(created)
+
+
+def merge_clients(target, duplicates):
+    """
+    Объединяет дубликаты с клиентом target: события переносятся одним UPDATE,
+    пустые поля target дополняются из дубликатов, примечания склеиваются,
+    дубликаты удаляются. Возвращает число перенесенных событий
+    """
+    duplicate_ids = [
+        client.pk for client in duplicates
+        if client.pk != target.pk and client.photographer_id == target.photographer_id
+    ]
+    if not duplicate_ids:
+        return 0
+    with transaction.atomic():
+        clients = {
+            client.pk: client
+            for client in Client.objects.select_for_update().filter(pk__in=[target.pk] + duplicate_ids).order_by('pk')
+        }
+        target = clients[target.pk]
+        duplicates = [clients[pk] for pk in duplicate_ids if pk in clients]
+
+        moved = Event.objects.filter(client_id__in=[client.pk for client in duplicates]).update(
+            client=target, updated_at=timezone.now(), sync_version=NextSyncVersion(),
+        )
+        for field in MERGE_FIELDS:
+            values = [getattr(client, field) for client in duplicates if getattr(client, field)]
+            if values and not getattr(target, field):
+                setattr(target, field, values[0])
+        notes = [target.notes] + [client.notes for client in duplicates if client.notes and client.notes not in target.notes]
+        target.notes = '\n'.join(note for note in notes if note)[:Client._meta.get_field('notes').max_length]
+        target.save()
+
+        Client.objects.filter(pk__in=[client.pk for client in duplicates]).delete()
+        refresh_client_stats([target.pk])
+        user_id = target.photographer_id
+        invalidate_feeds(user_id)
+        transaction.on_commit(lambda: publish(user_id, {'type': 'refetch'}))
+    return moved
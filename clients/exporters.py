@@ -0,0 +1,57 @@
+"""
+Потоковая выгрузка клиентов фотографа в CSV и vCard.
+
+Колонки CSV совпадают с колонками импорта (CSV_COLUMNS), поэтому
+выгруженный файл можно загрузить обратно. Клиенты читаются кортежами
+values_list порциями по EXPORT_CHUNK_SIZE, без создания моделей.
+"""
+from calendar_app.ics import escape_text, fold_line
+from photohub.export import EXPORT_CHUNK_SIZE, iter_csv
+from .importers import CSV_COLUMNS
+from .models import Client
+
+
+def get_export_queryset(user):
+    return Client.objects.filter(photographer=user).order_by('last_name', 'first_name', 'pk').values_list(*CSV_COLUMNS)
+
+
+def iter_clients_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Строки CSV; дата рождения в формате ГГГГ-ММ-ДД
+    """
+    birth_date = CSV_COLUMNS.index('birth_date')
+    rows = (
+        [value.isoformat() if index == birth_date and value else value for index, value in enumerate(row)]
+        for row in queryset.iterator(chunk_size=chunk_size)
+    )
+    return iter_csv(CSV_COLUMNS, rows)
+
+
+def vcard_lines(first_name, last_name, email, phone_number, birth_date, address, notes):
+    lines = [
+        'BEGIN:VCARD',
+        'VERSION:3.0',
+        f'N:{escape_text(last_name)};{escape_text(first_name)};;;',
+        f'FN:{escape_text(f"{first_name} {last_name}".strip())}',
+    ]
+    if email:
+        lines.append(f'EMAIL;TYPE=INTERNET:{email}')
+    if phone_number:
+        lines.append(f'TEL;TYPE=CELL:{phone_number}')
+    if birth_date:
+        lines.append(f'BDAY:{birth_date.isoformat()}')
+    if address:
+        # Адрес хранится одной строкой и выгружается как улица
+        lines.append(f'ADR:;;{escape_text(address)};;;;')
+    if notes:
+        lines.append(f'NOTE:{escape_text(notes)}')
+    lines.append('END:VCARD')
+    return lines
+
+
+def iter_clients_vcard(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Контакты в формате vCard 3.0, по одной карточке на клиента
+    """
+    for row in queryset.iterator(chunk_size=chunk_size):
+        yield ''.join(fold_line(line) for line in vcard_lines(*row))
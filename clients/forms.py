@@ -1,10 +1,37 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db.models import F
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from .models import Client
-from datetime import date, timedelta
+from .search import search_clients
+from datetime import date, datetime, time, timedelta
 from dateutil.relativedelta import relativedelta
 
+# Минимальный возраст клиента
+MIN_CLIENT_AGE = 14
+
+
+def normalize_phone_number(phone_number):
+    """
+    Номер телефона с "+" в начале
+    """
+    if phone_number and not phone_number.startswith('+'):
+        phone_number = '+' + phone_number
+    return phone_number
+
+
+def validate_birth_date(birth_date, today=None):
+    """
+    Проверка возраста клиента
+    """
+    if birth_date:
+        today = today or date.today()
+        age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
+        if age < MIN_CLIENT_AGE:
+            raise ValidationError("Клиент должен быть не младше 14 лет.")
+    return birth_date
+
 
 class ClientForm(forms.ModelForm):
     """
@@ -27,24 +54,77 @@ class ClientForm(forms.ModelForm):
         """
         Проверка формата номера телефона
         """
-        phone_number = self.cleaned_data.get('phone_number')
-        if phone_number and not phone_number.startswith('+'):
-            phone_number = '+' + phone_number
-        return phone_number
+        return normalize_phone_number(self.cleaned_data.get('phone_number'))
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        max_birth_date = date.today() - relativedelta(years=14)
+        max_birth_date = date.today() - relativedelta(years=MIN_CLIENT_AGE)
         self.fields['birth_date'].widget.attrs['max'] = max_birth_date.strftime('%Y-%m-%d')
 
     def clean_birth_date(self):
-        birth_date = self.cleaned_data.get('birth_date')
-        if birth_date:
-            today = date.today()
-            age = today.year - birth_date.year - ((today.month, today.day) < (birth_date.month, birth_date.day))
-            if age < 14:
-                raise ValidationError("Клиент должен быть не младше 14 лет.")
-        return birth_date
+        return validate_birth_date(self.cleaned_data.get('birth_date'))
 
 
+class ClientImportForm(forms.Form):
+    """
+    Форма загрузки файла для импорта клиентов (.csv или .vcf)
+    """
+    file = forms.FileField(
+        label=_('Файл'),
+        widget=forms.FileInput(attrs={'class': 'form-control', 'accept': '.csv,.vcf,.vcard'})
+    )
 
+    def clean_file(self):
+        """
+        Проверка формата файла
+        """
+        file = self.cleaned_data.get('file')
+        if file and not file.name.lower().endswith(('.csv', '.vcf', '.vcard')):
+            raise forms.ValidationError(_('Поддерживаются только файлы .csv и .vcf'))
+        return file
+
+
+class ClientFilterForm(forms.Form):
+    """
+    Поиск, фильтры и сортировка списка клиентов (GET-параметры)
+    """
+    SORT_CHOICES = [
+        ('', _('Сначала новые')),
+        ('last_shoot', _('По последней съемке')),
+        ('next_shoot', _('По следующей съемке')),
+    ]
+    # Порядок совпадает с индексами client_last_shoot и client_next_shoot
+    SORT_ORDERINGS = {
+        'last_shoot': (F('last_shoot_at').desc(nulls_last=True), '-id'),
+        'next_shoot': (F('next_shoot_at').asc(nulls_last=True), 'id'),
+    }
+
+    query = forms.CharField(label=_('Поиск'), required=False)
+    sort = forms.ChoiceField(label=_('Сортировка'), choices=SORT_CHOICES, required=False)
+    upcoming = forms.BooleanField(label=_('Есть запланированная съемка'), required=False)
+    last_shoot_before = forms.DateField(
+        label=_('Последняя съемка раньше'), required=False, widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    min_shoots = forms.IntegerField(label=_('Съемок не меньше'), required=False, min_value=1)
+    favorite_studio = forms.IntegerField(label=_('Любимая студия'), required=False, widget=forms.HiddenInput)
+
+    def filter(self, queryset):
+        """
+        Клиенты queryset, подходящие под фильтры, в выбранном порядке.
+        Некорректные фильтры не попадают в cleaned_data и не применяются
+        """
+        data = self.cleaned_data
+        if data.get('query'):
+            queryset = search_clients(queryset, data['query'])
+        if data.get('upcoming'):
+            queryset = queryset.filter(next_shoot_at__isnull=False)
+        if data.get('last_shoot_before'):
+            before = timezone.make_aware(datetime.combine(data['last_shoot_before'], time.min))
+            queryset = queryset.filter(last_shoot_at__lt=before)
+        if data.get('min_shoots'):
+            queryset = queryset.filter(shoot_count__gte=data['min_shoots'])
+        if data.get('favorite_studio'):
+            queryset = queryset.filter(favorite_studio_id=data['favorite_studio'])
+        if data.get('sort'):
+            queryset = queryset.order_by(*self.SORT_ORDERINGS[data['sort']])
+        return queryset
@@ -0,0 +1,256 @@
+"""
+Пакетный импорт клиентов из CSV и vCard (.vcf).
+
+Файл читается потоком, строки проверяются теми же правилами, что и в
+ClientForm (поля формы, нормализация телефона, возраст, формат номера),
+но без создания формы на каждую строку. Дубликаты отбрасываются по email
+и номеру телефона: ключи существующих клиентов загружаются одним запросом
+в множества, в которые добавляются и ключи уже принятых строк файла.
+Клиенты вставляются через bulk_create порциями внутри одной транзакции,
+поэтому память зависит от размера порции и числа клиентов, а не от
+размера файла.
+"""
+import csv
+import re
+from datetime import date
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from calendar_app.importers import ENCODING_ERROR, format_errors, iter_ics_lines, text_stream, unescape_text  # noqa: F401
+from .forms import ClientForm, normalize_phone_number, validate_birth_date
+from .models import Client
+from .search import normalize_phone
+
+IMPORT_BATCH_SIZE = 1000
+
+# Больше ошибок не запоминаем: для файла из одних ошибок список не должен расти без предела
+MAX_STORED_ERRORS = 1000
+
+CSV_COLUMNS = ('first_name', 'last_name', 'email', 'phone_number', 'birth_date', 'address', 'notes')
+
+# Заголовки колонок, которые встречаются в таблицах и экспорте контактов
+CSV_ALIASES = {
+    'имя': 'first_name',
+    'фамилия': 'last_name',
+    'phone': 'phone_number',
+    'телефон': 'phone_number',
+    'e-mail': 'email',
+    'почта': 'email',
+    'дата рождения': 'birth_date',
+    'birthday': 'birth_date',
+    'адрес': 'address',
+    'примечания': 'notes',
+    'заметки': 'notes',
+}
+
+# Знаки форматирования номера телефона: +7 (916) 123-45-67
+PHONE_FORMATTING = re.compile(r'[\s()\-.]')
+
+
+def clean_phone(value):
+    """
+    Номер без форматирования; 8 в начале российского номера заменяется на +7
+    """
+    value = PHONE_FORMATTING.sub('', value or '')
+    if len(value) == 11 and value.startswith('8') and value.isdigit():
+        value = '+7' + value[1:]
+    return normalize_phone_number(value)
+
+
+class ClientImporter:
+    """
+    Импорт клиентов фотографа.
+
+    progress - необязательная функция progress(processed, created, errors),
+    вызывается после каждой вставленной порции.
+    """
+    def __init__(self, user, batch_size=IMPORT_BATCH_SIZE, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.progress = progress
+        self.processed = 0
+        self.created = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+        self.fields = ClientForm.base_fields
+        self.phone_field = Client._meta.get_field('phone_number')
+        self._emails = None
+        self._phones = None
+
+    def load_keys(self):
+        """
+        Email и номера существующих клиентов (один запрос)
+        """
+        self._emails, self._phones = set(), set()
+        rows = Client.objects.filter(photographer=self.user).values_list('email', 'phone_digits')
+        for email, phone_digits in rows.iterator(chunk_size=5000):
+            if email:
+                self._emails.add(email.lower())
+            if phone_digits:
+                self._phones.add(phone_digits)
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_STORED_ERRORS:
+            self.errors.append((line, message))
+
+    def build_client(self, line, data):
+        """
+        Проверяет одну запись и возвращает несохраненного клиента или None.
+        data - словарь с ключами CSV_COLUMNS (значения - строки или уже разобранные даты)
+        """
+        cleaned = {}
+        try:
+            for name in CSV_COLUMNS:
+                value = data.get(name) or ''
+                if name == 'phone_number':
+                    value = clean_phone(value)
+                cleaned[name] = self.fields[name].clean(value.strip() if isinstance(value, str) else value)
+            if cleaned['phone_number']:
+                self.phone_field.run_validators(cleaned['phone_number'])
+            validate_birth_date(cleaned['birth_date'])
+        except ValidationError as error:
+            self.error(line, format_errors(error))
+            return None
+
+        email = cleaned['email'].lower()
+        phone = normalize_phone(cleaned['phone_number'])
+        if (email and email in self._emails) or (phone and phone in self._phones):
+            self.duplicates += 1
+            return None
+        if email:
+            self._emails.add(email)
+        if phone:
+            self._phones.add(phone)
+        return Client(photographer=self.user, **cleaned)
+
+    def run(self, records):
+        """
+        Импортирует записи вида (номер строки, словарь данных).
+        Возвращает число созданных клиентов
+        """
+        if self._emails is None:
+            self.load_keys()
+        batch = []
+        with transaction.atomic():
+            for line, data in records:
+                self.processed += 1
+                client = self.build_client(line, data)
+                if client is not None:
+                    batch.append(client)
+                if len(batch) >= self.batch_size:
+                    self.flush(batch)
+                    batch = []
+            self.flush(batch)
+        return self.created
+
+    def flush(self, batch):
+        if batch:
+            Client.objects.bulk_create(batch, batch_size=self.batch_size)
+            self.created += len(batch)
+        if self.progress:
+            self.progress(self.processed, self.created, self.error_count)
+
+    def import_csv(self, stream):
+        return self.run(iter_csv_records(stream))
+
+    def import_vcard(self, stream):
+        return self.run(iter_vcard_records(stream))
+
+    def import_file(self, uploaded_file):
+        """
+        Импорт загруженного файла; формат определяется по расширению
+        """
+        if uploaded_file.name.lower().endswith(('.vcf', '.vcard')):
+            return self.import_vcard(uploaded_file)
+        return self.import_csv(uploaded_file)
+
+
+def iter_csv_records(stream):
+    """
+    Читает CSV построчно. Поддерживаются разделители "," и ";" и русские заголовки колонок
+    """
+    stream = text_stream(stream)
+    header = stream.readline()
+    delimiter = ';' if header.count(';') > header.count(',') else ','
+    columns = [column.strip().lower() for column in next(csv.reader([header], delimiter=delimiter))]
+    columns = [CSV_ALIASES.get(column, column) for column in columns]
+    reader = csv.DictReader(stream, fieldnames=columns, delimiter=delimiter)
+    for line, row in enumerate(reader, start=2):
+        yield line, {key: row.get(key) for key in CSV_COLUMNS}
+
+
+def parse_vcard_date(value):
+    """
+    BDAY в форматах 19900131, 1990-01-31; дата без года (--0131) пропускается
+    """
+    digits = value.replace('-', '')
+    if value.startswith('--') or len(digits) < 8:
+        return None
+    try:
+        return date(int(digits[:4]), int(digits[4:6]), int(digits[6:8]))
+    except ValueError:
+        return value
+
+
+def split_vcard_value(value):
+    """
+    Составное значение vCard (N, ADR): части через ";" с учетом экранирования
+    """
+    return [unescape_text(part) for part in re.split(r'(?<!\\);', value)]
+
+
+def iter_vcard_records(stream):
+    """
+    Читает контакты из потока vCard (версии 2.1, 3.0 и 4.0)
+    """
+    card = None
+    for line, content in iter_ics_lines(stream):
+        name_part, _, value = content.partition(':')
+        name, *raw_params = name_part.split(';')
+        # Группа свойства (item1.EMAIL) не важна
+        name = name.rpartition('.')[2].upper()
+        params = ';'.join(raw_params).upper()
+
+        if name == 'BEGIN' and value.upper() == 'VCARD':
+            card = {'line': line}
+        elif name == 'END' and value.upper() == 'VCARD' and card is not None:
+            yield card.pop('line'), vcard_to_record(card)
+            card = None
+        elif card is None:
+            continue
+        elif name == 'TEL':
+            # Мобильный номер приоритетнее остальных
+            if 'TEL' not in card or ('CELL' in params and not card.get('TEL_CELL')):
+                card['TEL'] = value
+                card['TEL_CELL'] = 'CELL' in params
+        elif name in ('N', 'FN', 'EMAIL', 'BDAY', 'ADR', 'NOTE') and name not in card:
+            card[name] = value
+
+
+def vcard_to_record(card):
+    """
+    Преобразует vCard в запись импорта. Имя берется из N, а если его нет - из FN
+    """
+    last_name, first_name = '', ''
+    if card.get('N'):
+        parts = split_vcard_value(card['N']) + ['', '']
+        last_name, first_name = parts[0], parts[1]
+    if not first_name and not last_name and card.get('FN'):
+        first_name, _, last_name = unescape_text(card['FN']).strip().partition(' ')
+    address = ''
+    if card.get('ADR'):
+        # Абонентский ящик; дополнение; улица; город; регион; индекс; страна
+        address = ', '.join(part.strip() for part in split_vcard_value(card['ADR'])[2:] if part.strip())
+    birth_date = parse_vcard_date(card['BDAY']) if card.get('BDAY') else None
+    return {
+        'first_name': first_name,
+        'last_name': last_name,
+        'email': card.get('EMAIL', ''),
+        'phone_number': card.get('TEL', ''),
+        'birth_date': birth_date,
+        'address': address,
+        'notes': unescape_text(card.get('NOTE', '')),
+    }
@@ -0,0 +1,34 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.duplicates import MIN_NAME_SCORE, MIN_SCORE, update_duplicate_suggestions
+
+
+class Command(BaseCommand):
+    help = 'Поиск возможных дубликатов клиентов и обновление предложений об объединении'
+
+    def add_arguments(self, parser):
+        parser.add_argument('emails', nargs='*', help='Email фотографов (по умолчанию - все фотографы с клиентами)')
+        parser.add_argument('--min-score', type=float, default=MIN_SCORE, help='Наименьшая оценка сходства пары')
+        parser.add_argument(
+            '--min-name-score', type=float, default=MIN_NAME_SCORE,
+            help='Наименьшая оценка пары, совпавшей только по имени',
+        )
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.filter(clients__isnull=False).distinct()
+        if options['emails']:
+            users = get_user_model().objects.filter(email__in=options['emails'])
+            missing = set(options['emails']) - set(users.values_list('email', flat=True))
+            if missing:
+                raise CommandError(f'Пользователи не найдены: {", ".join(sorted(missing))}')
+
+        for user in users.order_by('pk'):
+            started = time.monotonic()
+            count = update_duplicate_suggestions(
+                user, min_score=options['min_score'], min_name_score=options['min_name_score'],
+            )
+            self.stdout.write(f'{user.email}: предложений {count} за {time.monotonic() - started:.1f} с')
+        self.stdout.write(self.style.SUCCESS('Поиск дубликатов завершен'))
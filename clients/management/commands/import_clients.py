@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.importers import ENCODING_ERROR, ClientImporter
+
+
+class Command(BaseCommand):
+    help = 'Импорт клиентов фотографа из файла .csv или .vcf'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email фотографа')
+        parser.add_argument('path', help='Путь к файлу .csv или .vcf')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Размер порции для bulk_create')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'Пользователь {options["email"]} не найден')
+
+        def progress(processed, created, errors):
+            self.stdout.write(f'Обработано: {processed}, создано: {created}, ошибок: {errors}')
+
+        importer = ClientImporter(user, batch_size=options['batch_size'], progress=progress)
+        try:
+            with open(options['path'], 'rb') as file:
+                if options['path'].lower().endswith(('.vcf', '.vcard')):
+                    importer.import_vcard(file)
+                else:
+                    importer.import_csv(file)
+        except UnicodeDecodeError:
+            raise CommandError(ENCODING_ERROR)
+
+        for line, message in importer.errors:
+            self.stderr.write(f'Строка {line}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано клиентов: {importer.created} из {importer.processed}, дубликатов: {importer.duplicates}'
+        ))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import sync.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_alter_client_first_name_alter_client_last_name_and_more'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='sync_version',
+            field=models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['photographer', 'sync_version'], name='client_sync'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 21:30
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_sync_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(models.F('photographer'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('first_name'), name='text_pattern_ops'), name='client_first_name_prefix'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(models.F('photographer'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('last_name'), name='text_pattern_ops'), name='client_last_name_prefix'),
+        ),
+    ]
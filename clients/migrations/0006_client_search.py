@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-18 21:50
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.contrib.postgres.operations import BtreeGinExtension, TrigramExtension
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_client_name_prefix_indexes'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='client',
+            name='search_text',
+            field=models.GeneratedField(db_persist=True, editable=False, expression=django.db.models.functions.text.Lower(django.db.models.functions.text.Concat(models.F('first_name'), models.Value(' '), models.F('last_name'), models.Value(' '), models.F('email'))), output_field=models.TextField()),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='phone_digits',
+            field=models.GeneratedField(db_persist=True, editable=False, expression=django.db.models.functions.text.Right(models.Func(models.F('phone_number'), models.Value('\\D'), models.Value(''), models.Value('g'), function='REGEXP_REPLACE'), 10), output_field=models.CharField(max_length=10)),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=django.contrib.postgres.indexes.GinIndex(models.F('photographer'), django.contrib.postgres.indexes.OpClass(models.F('search_text'), name='gin_trgm_ops'), django.contrib.postgres.indexes.OpClass(models.F('phone_digits'), name='gin_trgm_ops'), name='client_search_trgm'),
+        ),
+    ]
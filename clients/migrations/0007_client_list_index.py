@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_client_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(fields=['photographer', 'created_at', 'id'], name='client_list'),
+        ),
+    ]
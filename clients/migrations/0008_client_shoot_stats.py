@@ -0,0 +1,47 @@
+# Generated by Django 5.2 on 2026-10-18 23:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0007_client_list_index'),
+        ('studios', '0005_studio_name_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='shoot_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='число съемок'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='last_shoot_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='последняя съемка'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='next_shoot_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='следующая съемка'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='favorite_studio',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='studios.studio', verbose_name='любимая студия'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(models.F('photographer'), models.OrderBy(models.F('last_shoot_at'), descending=True, nulls_last=True), models.OrderBy(models.F('id'), descending=True), name='client_last_shoot'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(models.F('photographer'), models.OrderBy(models.F('next_shoot_at'), nulls_last=True), models.F('id'), name='client_next_shoot'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('next_shoot_at__isnull', False)), fields=['next_shoot_at'], name='client_next_shoot_due'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 23:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_client_shoot_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientDuplicate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='сходство')),
+                ('reasons', models.CharField(blank=True, max_length=255, verbose_name='совпадения')),
+                ('dismissed', models.BooleanField(default=False, verbose_name='отклонено')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='дата создания')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clients.client', verbose_name='клиент')),
+                ('duplicate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='clients.client', verbose_name='возможный дубликат')),
+                ('photographer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='client_duplicates', to=settings.AUTH_USER_MODEL, verbose_name='фотограф')),
+            ],
+            options={
+                'verbose_name': 'возможный дубликат клиента',
+                'verbose_name_plural': 'возможные дубликаты клиентов',
+                'ordering': ['-score', 'id'],
+                'indexes': [models.Index(condition=models.Q(('dismissed', False)), fields=['photographer', '-score', 'id'], name='client_duplicate_list')],
+                'constraints': [models.UniqueConstraint(fields=('client', 'duplicate'), name='client_duplicate_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 00:10
+
+import django.db.models.functions.datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0009_clientduplicate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='birth_day',
+            field=models.GeneratedField(db_persist=True, editable=False, expression=models.CombinedExpression(models.CombinedExpression(django.db.models.functions.datetime.ExtractMonth('birth_date'), '*', models.Value(100)), '+', django.db.models.functions.datetime.ExtractDay('birth_date')), output_field=models.PositiveSmallIntegerField()),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='birthday_reminder_year',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='напоминание о дне рождения'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('birth_day__isnull', False)), fields=['photographer', 'birth_day'], name='client_birthday'),
+        ),
+        migrations.AddIndex(
+            model_name='client',
+            index=models.Index(condition=models.Q(('birth_day__isnull', False)), fields=['birth_day'], name='client_birthday_due'),
+        ),
+    ]
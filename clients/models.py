@@ -1,7 +1,14 @@
 from django.db import models
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Concat, ExtractDay, ExtractMonth, Lower, Right, Upper
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import RegexValidator
 from users.models import CustomUser
+from sync.fields import sync_version_field
+
+# Поля, которые пишут фоновые процессы, а не формы: статистика съемок и отметка о поздравлении
+MAINTAINED_FIELDS = ('shoot_count', 'last_shoot_at', 'next_shoot_at', 'favorite_studio', 'birthday_reminder_year')
 
 
 class Client(models.Model):
@@ -27,15 +34,141 @@ class Client(models.Model):
     notes = models.TextField(_('примечания'), blank=True, max_length=500)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     updated_at = models.DateTimeField(_('дата обновления'), auto_now=True)
+    sync_version = sync_version_field()
+    # Поисковые колонки вычисляет база: имя, фамилия и email в нижнем регистре
+    # и номер телефона без кода страны - последние 10 цифр
+    search_text = models.GeneratedField(
+        expression=Lower(Concat(F('first_name'), Value(' '), F('last_name'), Value(' '), F('email'))),
+        output_field=models.TextField(),
+        db_persist=True,
+        editable=False,
+    )
+    phone_digits = models.GeneratedField(
+        expression=Right(Func(F('phone_number'), Value(r'\D'), Value(''), Value('g'), function='REGEXP_REPLACE'), 10),
+        output_field=models.CharField(max_length=10),
+        db_persist=True,
+        editable=False,
+    )
+    # День рождения как ММДД (0131, 1231): по нему ищутся ближайшие дни рождения (clients.birthdays)
+    birth_day = models.GeneratedField(
+        expression=ExtractMonth('birth_date') * 100 + ExtractDay('birth_date'),
+        output_field=models.PositiveSmallIntegerField(),
+        db_persist=True,
+        editable=False,
+    )
+    # Год дня рождения, о котором фотограф уже получил напоминание
+    birthday_reminder_year = models.PositiveSmallIntegerField(
+        _('напоминание о дне рождения'), null=True, blank=True, editable=False
+    )
+    # Статистика съемок поддерживается по изменениям событий (calendar_app.client_stats)
+    shoot_count = models.PositiveIntegerField(_('число съемок'), default=0, editable=False)
+    last_shoot_at = models.DateTimeField(_('последняя съемка'), null=True, blank=True, editable=False)
+    next_shoot_at = models.DateTimeField(_('следующая съемка'), null=True, blank=True, editable=False)
+    favorite_studio = models.ForeignKey(
+        'studios.Studio',
+        on_delete=models.SET_NULL,
+        related_name='+',
+        verbose_name=_('любимая студия'),
+        null=True,
+        blank=True,
+        editable=False,
+    )
     
     class Meta:
         verbose_name = _('клиент')
         verbose_name_plural = _('клиенты')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['photographer', 'sync_version'], name='client_sync'),
+            models.Index(fields=['photographer', 'created_at', 'id'], name='client_list'),
+            # Поиск по началу имени и фамилии (автодополнение): istartswith сравнивает UPPER(...) LIKE 'ЗАПРОС%'
+            models.Index(
+                F('photographer'), OpClass(Upper('first_name'), name='text_pattern_ops'), name='client_first_name_prefix',
+            ),
+            models.Index(
+                F('photographer'), OpClass(Upper('last_name'), name='text_pattern_ops'), name='client_last_name_prefix',
+            ),
+            # Поиск клиентов фотографа по подстроке и с опечатками (pg_trgm, photographer - через btree_gin)
+            GinIndex(
+                F('photographer'),
+                OpClass(F('search_text'), name='gin_trgm_ops'),
+                OpClass(F('phone_digits'), name='gin_trgm_ops'),
+                name='client_search_trgm',
+            ),
+            # Список клиентов по последней и следующей съемке; клиенты без съемок - в конце
+            models.Index(
+                F('photographer'), F('last_shoot_at').desc(nulls_last=True), F('id').desc(), name='client_last_shoot',
+            ),
+            models.Index(
+                F('photographer'), F('next_shoot_at').asc(nulls_last=True), F('id'), name='client_next_shoot',
+            ),
+            models.Index(
+                fields=['photographer', 'birth_day'], condition=Q(birth_day__isnull=False), name='client_birthday',
+            ),
+            # Напоминания о днях рождения всех фотографов (calendar_app.reminders)
+            models.Index(fields=['birth_day'], condition=Q(birth_day__isnull=False), name='client_birthday_due'),
+            # Клиенты, чья следующая съемка уже прошла (rebuild_client_stats --due)
+            models.Index(fields=['next_shoot_at'], condition=Q(next_shoot_at__isnull=False), name='client_next_shoot_due'),
+        ]
         
     def __str__(self):
         return f"{self.first_name} {self.last_name}"
+
+    def save(self, *args, **kwargs):
+        # Статистику съемок и отметку о напоминании пишут фоновые процессы:
+        # сохранение формы не должно вернуть значения, прочитанные до их изменения
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and not field.generated and field.name not in MAINTAINED_FIELDS
+            ]
+        super().save(*args, **kwargs)
     
     def get_full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+
+
+class ClientDuplicate(models.Model):
+    """
+    Предложение объединить двух клиентов фотографа (находит команда find_duplicate_clients).
+    client - более ранняя запись, по умолчанию она остается после объединения
+    """
+    photographer = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='client_duplicates',
+        verbose_name=_('фотограф')
+    )
+    client = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('клиент')
+    )
+    duplicate = models.ForeignKey(
+        Client,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name=_('возможный дубликат')
+    )
+    score = models.FloatField(_('сходство'))
+    reasons = models.CharField(_('совпадения'), max_length=255, blank=True)
+    dismissed = models.BooleanField(_('отклонено'), default=False)
+    created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('возможный дубликат клиента')
+        verbose_name_plural = _('возможные дубликаты клиентов')
+        ordering = ['-score', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'duplicate'], name='client_duplicate_unique'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['photographer', '-score', 'id'], condition=Q(dismissed=False), name='client_duplicate_list',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.client} — {self.duplicate} ({self.score:.2f})"
@@ -0,0 +1,55 @@
+"""
+Поиск клиентов фотографа.
+
+Имя, фамилия и email собраны базой в колонку search_text, номер телефона
+нормализован в phone_digits (последние 10 цифр). Обе колонки вместе с
+photographer покрыты одним GIN-индексом client_search_trgm (pg_trgm и
+btree_gin), поэтому поиск не просматривает всех клиентов фотографа.
+
+Запрос из цифр ищется как часть номера телефона, текст - как подстрока
+search_text или похожее слово (word_similarity pg_trgm допускает опечатки).
+Результаты упорядочены по сходству с запросом.
+"""
+import re
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db.models import Q
+
+# Запрос, похожий на номер телефона: цифры и знаки форматирования
+PHONE_QUERY = re.compile(r'^[\d\s()+-]+$')
+
+# Меньше цифр триграммный индекс не ускоряет
+MIN_PHONE_DIGITS = 3
+
+
+def normalize_phone(value):
+    """
+    Цифры номера без кода страны, как в колонке phone_digits. У начала
+    номера ("+7 916", "8916") код страны тоже отбрасывается; 10 цифр с
+    ведущей 8 - полный номер без кода (812...), они не меняются
+    """
+    digits = re.sub(r'\D', '', value)
+    value = value.strip()
+    if len(digits) == 11 and digits[0] in '78':
+        digits = digits[1:]
+    elif value.startswith('+7') or (value.startswith('8') and len(digits) < 10):
+        digits = digits[1:]
+    return digits
+
+
+def search_clients(queryset, query):
+    """
+    Клиенты из queryset, подходящие под запрос, самые похожие первыми
+    """
+    query = ' '.join(query.split()).lower()
+    if not query:
+        return queryset
+    if PHONE_QUERY.match(query):
+        digits = normalize_phone(query)
+        if len(digits) >= MIN_PHONE_DIGITS:
+            return queryset.filter(phone_digits__contains=digits)
+    return queryset.filter(
+        Q(search_text__contains=query) | Q(search_text__trigram_word_similar=query)
+    ).annotate(
+        similarity=TrigramWordSimilarity(query, 'search_text'),
+    ).order_by('-similarity', 'last_name', 'first_name', 'pk')
@@ -1,8 +1,20 @@
-from django.test import TestCase
+import gzip
+import io
+from datetime import date, timedelta
+
+from django.test import RequestFactory, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from .models import Client
+from calendar_app.models import Event
+from photohub.pagination import EstimatedCountPaginator, paginate
+from .birthdays import get_birthday_segments, get_upcoming_birthdays
+from .duplicates import find_duplicates, name_key, update_duplicate_suggestions
+from .exporters import get_export_queryset, iter_clients_csv, iter_clients_vcard
+from .importers import ClientImporter
+from .models import Client, ClientDuplicate
+from .search import normalize_phone, search_clients
 
 User = get_user_model()
 
@@ -188,3 +200,448 @@ class ClientViewsTest(TestCase):
         self.assertRedirects(response, self.client_list_url)
         self.assertFalse(Client.objects.filter(id=self.client_model.id).exists())
 
+
+class ClientAutocompleteTest(TestCase):
+    """
+    Тесты автодополнения клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        Client.objects.create(photographer=self.user, first_name='Иван', last_name='Петров')
+        Client.objects.create(photographer=self.user, first_name='Петр', last_name='Иванов')
+        Client.objects.create(photographer=self.user, first_name='Анна', last_name='Сидорова')
+        Client.objects.create(photographer=self.other, first_name='Иван', last_name='Чужой')
+        self.url = reverse('clients:client_autocomplete')
+
+    def test_prefix_search(self):
+        """
+        Тест поиска по началу имени или фамилии только среди своих клиентов
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(self.url, {'q': 'ива'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Петр Иванов', 'Иван Петров'])
+
+        response = self.client.get(self.url, {'q': 'иван пет'})
+        self.assertEqual([result['text'] for result in response.json()['results']], ['Иван Петров'])
+
+        response = self.client.get(self.url, {'q': 'ова'})
+        self.assertEqual(response.json()['results'], [])
+
+class ClientSearchTest(TestCase):
+    """
+    Тесты поиска клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.ivan = Client.objects.create(
+            photographer=self.user, first_name='Иван', last_name='Петров',
+            email='ivan@example.com', phone_number='+79161234567'
+        )
+        self.anna = Client.objects.create(
+            photographer=self.user, first_name='Анна', last_name='Сидорова', phone_number='9035550011'
+        )
+        Client.objects.create(
+            photographer=self.other, first_name='Иван', last_name='Петров', phone_number='+79161234567'
+        )
+
+    def search(self, query):
+        return list(search_clients(Client.objects.filter(photographer=self.user), query))
+
+    def test_search_text(self):
+        """
+        Тест поиска по подстроке, email и с опечаткой
+        """
+        self.assertEqual(self.search('петр'), [self.ivan])
+        self.assertEqual(self.search('ivan@'), [self.ivan])
+        self.assertEqual(self.search('Сидорава'), [self.anna])
+        self.assertEqual(self.search('Смирнов'), [])
+
+    def test_search_phone(self):
+        """
+        Тест поиска по номеру телефона в любом формате
+        """
+        self.ivan.refresh_from_db()
+        self.assertEqual(self.ivan.phone_digits, '9161234567')
+        self.assertEqual(self.search('8 (916) 123-45-67'), [self.ivan])
+        self.assertEqual(self.search('555-00'), [self.anna])
+        # Начало номера с кодом страны
+        self.assertEqual(self.search('+7 916'), [self.ivan])
+        self.assertEqual(self.search('8916123'), [self.ivan])
+        self.assertEqual(normalize_phone('8125551234'), '8125551234')
+
+    def test_client_list_search(self):
+        """
+        Тест поиска в списке клиентов
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('clients:client_list'), {'query': 'иван'})
+        self.assertEqual(list(response.context['clients']), [self.ivan])
+
+class ClientPaginationTest(TestCase):
+    """
+    Тесты постраничного вывода списка клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        Client.objects.bulk_create([
+            Client(photographer=self.user, first_name=f'Клиент{index}', last_name='Тестов') for index in range(30)
+        ])
+        self.queryset = Client.objects.filter(photographer=self.user)
+        self.factory = RequestFactory()
+
+    def test_cursor_pages(self):
+        """
+        Тест прокрутки по курсору: порции не пересекаются и покрывают весь список
+        """
+        page = paginate(self.factory.get('/'), self.queryset, '-created_at', page_size=12)
+        self.assertEqual(len(page['object_list']), 12)
+        self.assertTrue(page['is_paginated'])
+        seen = [client.pk for client in page['object_list']]
+        cursor = page['next_cursor']
+        while cursor:
+            with self.assertNumQueries(1):
+                page = paginate(self.factory.get('/', {'cursor': cursor}), self.queryset, '-created_at', page_size=12)
+            seen.extend(client.pk for client in page['object_list'])
+            cursor = page['next_cursor']
+        self.assertEqual(seen, list(self.queryset.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+        # Поврежденный курсор дает первую порцию
+        page = paginate(self.factory.get('/', {'cursor': 'broken'}), self.queryset, '-created_at', page_size=12)
+        self.assertEqual([client.pk for client in page['object_list']], seen[:12])
+
+    def test_estimated_count(self):
+        """
+        Тест подсчета: точно до предела, дальше оценка без проверки верхней границы страниц
+        """
+        paginator = EstimatedCountPaginator(self.queryset.order_by('pk'), 10)
+        self.assertEqual(paginator.count, 30)
+        self.assertFalse(paginator.page(3).has_next())
+
+        paginator = EstimatedCountPaginator(self.queryset.order_by('pk'), 10)
+        paginator.count_limit = 5
+        self.assertGreater(paginator.count, 5)
+        self.assertTrue(paginator.page(2).has_next())
+        self.assertFalse(paginator.page(3).has_next())
+        self.assertEqual(list(paginator.page(10).object_list), [])
+
+
+class ClientImportTest(TestCase):
+    """
+    Тесты пакетного импорта клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        Client.objects.create(
+            photographer=self.user, first_name='Иван', last_name='Петров',
+            email='Ivan@Example.com', phone_number='+79161234567'
+        )
+
+    def test_import_csv(self):
+        """
+        Тест импорта CSV: проверка строк, нормализация телефона и отбрасывание дубликатов
+        """
+        rows = ['Имя;Фамилия;Телефон;E-mail;Дата рождения']
+        for i in range(25):
+            rows.append(f'Клиент;{i};+7 (900) 000-00-{i:02d};client{i}@example.com;1990-01-{i + 1:02d}')
+        rows.append('Иван;Петров;;ivan@example.com;')
+        rows.append('Ваня;Петров;8 916 123-45-67;;')
+        rows.append('Клиент;0;;client0@example.com;')
+        rows.append(';Без имени;;;')
+        rows.append('Ребенок;Маленький;;;2020-01-01')
+        rows.append('Неверный;Телефон;12345;;')
+        data = io.BytesIO('\n'.join(rows).encode('utf-8'))
+
+        progress = []
+        importer = ClientImporter(self.user, batch_size=10, progress=lambda *args: progress.append(args))
+        # ключи существующих клиентов, точка сохранения транзакции и три порции
+        with self.assertNumQueries(1 + 2 + 3):
+            importer.import_csv(data)
+
+        self.assertEqual(importer.processed, 31)
+        self.assertEqual(importer.created, 25)
+        self.assertEqual(importer.duplicates, 3)
+        self.assertEqual([line for line, message in importer.errors], [30, 31, 32])
+        client = Client.objects.get(email='client5@example.com')
+        self.assertEqual(client.phone_number, '+79000000005')
+        self.assertEqual(client.birth_date, date(1990, 1, 6))
+        self.assertEqual(progress[-1], (31, 25, 3))
+
+    def test_import_cp1251(self):
+        """
+        Тест CSV с русскими заголовками, сохраненного Excel в cp1251
+        """
+        rows = ['Имя;Фамилия;Телефон', 'Анна;Сидорова;+7 903 555-00-11']
+        importer = ClientImporter(self.user)
+        importer.import_csv(io.BytesIO('\n'.join(rows).encode('cp1251')))
+        self.assertEqual((importer.created, importer.errors), (1, []))
+        self.assertTrue(Client.objects.filter(first_name='Анна', last_name='Сидорова').exists())
+
+    def test_import_vcard(self):
+        """
+        Тест импорта vCard с перенесенными строками и несколькими телефонами
+        """
+        data = io.BytesIO((
+            'BEGIN:VCARD\r\n'
+            'VERSION:3.0\r\n'
+            'N:Сидорова;Анна;;;\r\n'
+            'FN:Анна Сидорова\r\n'
+            'TEL;TYPE=HOME:+74950000000\r\n'
+            'item1.TEL;TYPE=CELL:+7 903 555-00-11\r\n'
+            'EMAIL:anna@example.com\r\n'
+            'BDAY:1995-05-20\r\n'
+            'ADR;TYPE=HOME:;;Тверская, 1;Москва;;125009;Россия\r\n'
+            'NOTE:Любит съемки\r\n'
+            ' на природе\r\n'
+            'END:VCARD\r\n'
+            'BEGIN:VCARD\r\n'
+            'VERSION:4.0\r\n'
+            'FN:Иван Петров\r\n'
+            'TEL:89161234567\r\n'
+            'END:VCARD\r\n'
+        ).encode('utf-8'))
+
+        importer = ClientImporter(self.user)
+        importer.import_vcard(data)
+
+        self.assertEqual((importer.created, importer.duplicates, importer.errors), (1, 1, []))
+        anna = Client.objects.get(email='anna@example.com')
+        self.assertEqual((anna.first_name, anna.last_name), ('Анна', 'Сидорова'))
+        self.assertEqual(anna.phone_number, '+79035550011')
+        self.assertEqual(anna.birth_date, date(1995, 5, 20))
+        self.assertEqual(anna.address, 'Тверская, 1, Москва, 125009, Россия')
+        self.assertEqual(anna.notes, 'Любит съемкина природе')
+
+    def test_export_round_trip(self):
+        """
+        Тест выгрузки клиентов в CSV и vCard одним запросом и загрузки выгруженных файлов обратно
+        """
+        Client.objects.create(
+            photographer=self.user, first_name='Анна', last_name='Сидорова', email='anna@example.com',
+            phone_number='+79035550011', birth_date=date(1995, 5, 20), address='Москва, Тверская; 1',
+            notes='Любит съемки, ' + ' '.join(['на природе'] * 10),
+        )
+        with self.assertNumQueries(1):
+            csv_body = ''.join(iter_clients_csv(get_export_queryset(self.user)))
+        with self.assertNumQueries(1):
+            vcard_body = ''.join(iter_clients_vcard(get_export_queryset(self.user)))
+        self.assertTrue(csv_body.startswith('\ufefffirst_name,last_name,email'))
+        self.assertIn('BDAY:1995-05-20', vcard_body)
+
+        for body, method in ((csv_body, 'import_csv'), (vcard_body, 'import_vcard')):
+            Client.objects.all().delete()
+            importer = ClientImporter(self.user)
+            getattr(importer, method)(io.BytesIO(body.encode('utf-8')))
+            self.assertEqual((importer.created, importer.errors), (2, []))
+            anna = Client.objects.get(email='anna@example.com')
+            self.assertEqual(anna.phone_number, '+79035550011')
+            self.assertEqual(anna.birth_date, date(1995, 5, 20))
+            self.assertEqual(anna.address, 'Москва, Тверская; 1')
+            self.assertEqual(anna.notes, 'Любит съемки, ' + ' '.join(['на природе'] * 10))
+
+    def test_export_view(self):
+        """
+        Тест представления выгрузки: только свои клиенты, сжатие gzip
+        """
+        other = User.objects.create_user(username='other', password='testpassword', is_photographer=True)
+        Client.objects.create(photographer=other, first_name='Чужой', last_name='Клиент')
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('clients:client_export'), {'format': 'vcf', 'gzip': '1'})
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('clients.vcf.gz', response['Content-Disposition'])
+        body = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(body.count('BEGIN:VCARD'), 1)
+        self.assertIn('N:Петров;Иван;;;', body)
+
+
+class ClientDuplicateTest(TestCase):
+    """
+    Тесты поиска и объединения дубликатов клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.ivan = Client.objects.create(photographer=self.user, first_name='Иван', last_name='Петров',
+                                          phone_number='+79161234567')
+        self.latin = Client.objects.create(photographer=self.user, first_name='Ivan', last_name='Petrov',
+                                           phone_number='89161234567', email='ivan.petrov@mail.ru')
+        self.typo = Client.objects.create(photographer=self.user, first_name='Петроф', last_name='Иван',
+                                          email='ivanpetrov+foto@gmail.com')
+        # Тезка с другим телефоном и датой рождения - не дубликат Ивана
+        self.namesake = Client.objects.create(photographer=self.user, first_name='Иван', last_name='Петров',
+                                              phone_number='+79990000000', birth_date=date(1980, 1, 1))
+        self.anna = Client.objects.create(photographer=self.user, first_name='Анна', last_name='Сидорова')
+
+    def test_name_key(self):
+        """
+        Тест фонетического ключа: транслитерация, похожие согласные и порядок слов
+        """
+        self.assertEqual(name_key('Иван', 'Петров'), name_key('Petrov', 'Ivan'))
+        self.assertEqual(name_key('Петроф', 'Иван'), name_key('Иван', 'Петров'))
+        self.assertEqual(name_key('Александр', 'Цветков'), name_key('Alexander', 'Tsvetkov'))
+        self.assertNotEqual(name_key('Иван', 'Петров'), name_key('Иван', 'Сидоров'))
+
+    def test_find_duplicates(self):
+        """
+        Тест поиска пар по блокам телефона, email и имени одним запросом
+        """
+        with self.assertNumQueries(1):
+            suggestions = find_duplicates(self.user)
+        pairs = [(client_id, duplicate_id) for client_id, duplicate_id, score, reasons in suggestions]
+        # Петроф Иван без телефона и даты рождения совпадает с обоими Иванами Петровыми только по имени
+        self.assertEqual(pairs, [
+            (self.ivan.pk, self.latin.pk), (self.latin.pk, self.typo.pk),
+            (self.ivan.pk, self.typo.pk), (self.typo.pk, self.namesake.pk),
+        ])
+        self.assertEqual(suggestions[0][3], 'телефон, имя')
+        self.assertEqual(suggestions[2][3], 'имя')
+
+    def test_name_only_typo(self):
+        """
+        Тест дубликата только по имени с опечаткой: найден, если ничто не противоречит
+        """
+        typo = Client.objects.create(photographer=self.user, first_name='Ана', last_name='Сидорова',
+                                     birth_date=date(1995, 5, 20))
+        other = Client.objects.create(photographer=self.user, first_name='Анна', last_name='Сидарова',
+                                      birth_date=date(1990, 1, 1))
+        pairs = {(client_id, duplicate_id) for client_id, duplicate_id, score, reasons in find_duplicates(self.user)}
+        self.assertIn((self.anna.pk, typo.pk), pairs)
+        self.assertIn((self.anna.pk, other.pk), pairs)
+        # Разные даты рождения
+        self.assertNotIn((typo.pk, other.pk), pairs)
+
+    def test_dismissed_pairs_stay_dismissed(self):
+        """
+        Тест того, что отклоненная пара не предлагается при следующем поиске
+        """
+        self.assertEqual(update_duplicate_suggestions(self.user), 4)
+        ClientDuplicate.objects.filter(client=self.ivan).update(dismissed=True)
+
+        self.assertEqual(update_duplicate_suggestions(self.user), 2)
+        self.assertEqual(ClientDuplicate.objects.filter(dismissed=True).count(), 2)
+
+    def test_merge(self):
+        """
+        Тест объединения: события переносятся, пустые поля дополняются, дубликат удаляется
+        """
+        start = timezone.now() - timedelta(days=3)
+        for days in range(2):
+            Event.objects.create(photographer=self.user, title='Съемка', client=self.latin,
+                                 start_datetime=start + timedelta(days=days))
+        update_duplicate_suggestions(self.user)
+        suggestion = ClientDuplicate.objects.get(client=self.ivan, duplicate=self.latin)
+        self.client.force_login(self.user)
+
+        response = self.client.post(reverse('clients:client_merge', kwargs={'pk': suggestion.pk}))
+
+        self.assertRedirects(response, reverse('clients:client_duplicates'))
+        self.assertFalse(Client.objects.filter(pk=self.latin.pk).exists())
+        self.assertEqual(Event.objects.filter(client=self.ivan).count(), 2)
+        self.ivan.refresh_from_db()
+        self.assertEqual(self.ivan.email, 'ivan.petrov@mail.ru')
+        self.assertEqual(self.ivan.shoot_count, 2)
+        # Предложения с удаленным клиентом удаляются вместе с ним
+        self.assertFalse(ClientDuplicate.objects.filter(client_id=self.latin.pk).exists())
+
+
+class ClientBirthdayTest(TestCase):
+    """
+    Тесты ближайших дней рождения клиентов
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.clients = {
+            name: Client.objects.create(photographer=self.user, first_name=name, last_name='Клиент', birth_date=birth_date)
+            for name, birth_date in (
+                ('Декабрь', date(1990, 12, 30)),
+                ('Январь', date(1985, 1, 2)),
+                ('Позже', date(1985, 1, 10)),
+                ('Високосный', date(2000, 2, 29)),
+                ('Март', date(1999, 3, 1)),
+            )
+        }
+        Client.objects.create(photographer=self.user, first_name='Без', last_name='Даты')
+
+    def test_segments(self):
+        """
+        Тест диапазонов ММДД через Новый год и для 29 февраля
+        """
+        self.assertEqual(get_birthday_segments(date(2026, 12, 28), 7), [(2026, 1228, 1231), (2027, 101, 104)])
+        self.assertEqual(get_birthday_segments(date(2027, 2, 25), 3), [(2027, 225, 229)])
+        self.assertEqual(get_birthday_segments(date(2028, 2, 25), 3), [(2028, 225, 228)])
+
+    def test_upcoming_across_new_year(self):
+        """
+        Тест периода через Новый год одним запросом, ближайшие первыми
+        """
+        with self.assertNumQueries(1):
+            clients = get_upcoming_birthdays(Client.objects.filter(photographer=self.user), 7, today=date(2026, 12, 28))
+        self.assertEqual([client.first_name for client in clients], ['Декабрь', 'Январь'])
+        self.assertEqual((clients[1].next_birthday, clients[1].days_left, clients[1].age), (date(2027, 1, 2), 5, 42))
+
+    def test_leap_day(self):
+        """
+        Тест дня рождения 29 февраля: в невисокосный год - 28 февраля
+        """
+        queryset = Client.objects.filter(photographer=self.user)
+        clients = get_upcoming_birthdays(queryset, 0, today=date(2027, 2, 28))
+        self.assertEqual([(client.first_name, client.next_birthday) for client in clients],
+                         [('Високосный', date(2027, 2, 28))])
+        clients = get_upcoming_birthdays(queryset, 1, today=date(2028, 2, 28))
+        self.assertEqual([(client.first_name, client.next_birthday) for client in clients],
+                         [('Високосный', date(2028, 2, 29))])
+        self.assertEqual(get_upcoming_birthdays(queryset, 0, today=date(2028, 2, 28)), [])
+
+    def test_api(self):
+        """
+        Тест API ближайших дней рождения и проверки параметра days
+        """
+        self.client.force_login(self.user)
+        url = reverse('clients:upcoming_birthdays_json')
+        response = self.client.get(url, {'days': '366'})
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(self.client.get(url, {'days': '1000'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'days': 'много'}).status_code, 400)
+
@@ -6,6 +6,13 @@ app_name = 'clients'
 urlpatterns = [
     path('', views.ClientListView.as_view(), name='client_list'),
     path('add/', views.ClientCreateView.as_view(), name='client_add'),
+    path('import/', views.ClientImportView.as_view(), name='client_import'),
+    path('export/', views.client_export, name='client_export'),
+    path('duplicates/', views.ClientDuplicateListView.as_view(), name='client_duplicates'),
+    path('duplicates/<int:pk>/merge/', views.client_merge, name='client_merge'),
+    path('duplicates/<int:pk>/dismiss/', views.client_duplicate_dismiss, name='client_duplicate_dismiss'),
+    path('api/birthdays/', views.upcoming_birthdays_json, name='upcoming_birthdays_json'),
+    path('autocomplete/', views.client_autocomplete, name='client_autocomplete'),
     path('<int:pk>/', views.ClientDetailView.as_view(), name='client_detail'),
     path('<int:pk>/edit/', views.ClientUpdateView.as_view(), name='client_edit'),
     path('<int:pk>/delete/', views.ClientDeleteView.as_view(), name='client_delete'),
@@ -1,15 +1,29 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.views.decorators.http import require_POST
 from django.urls import reverse_lazy
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.http import JsonResponse
 from django.db.models import Q
 
-from .models import Client
-from .forms import ClientForm
+from photohub.export import export_response
+from photohub.pagination import PaginatedListMixin
+from .models import Client, ClientDuplicate
+from .birthdays import MAX_BIRTHDAY_DAYS, get_upcoming_birthdays, serialize_birthday
+from .duplicates import merge_clients
+from .forms import ClientFilterForm, ClientForm, ClientImportForm
+from .exporters import get_export_queryset, iter_clients_csv, iter_clients_vcard
+from .importers import ENCODING_ERROR, ClientImporter
 
-class ClientListView(LoginRequiredMixin, ListView):
+# Сколько вариантов возвращает автодополнение
+AUTOCOMPLETE_LIMIT = 20
+
+# Период ближайших дней рождения по умолчанию, дней
+BIRTHDAY_DAYS = 30
+
+class ClientListView(LoginRequiredMixin, PaginatedListMixin, ListView):
     """
     Представление для отображения списка клиентов
     """
@@ -17,32 +31,68 @@ class ClientListView(LoginRequiredMixin, ListView):
     template_name = 'clients/client_list.html'
     context_object_name = 'clients'
     
+    def get_filter_form(self):
+        if not hasattr(self, 'filter_form'):
+            self.filter_form = ClientFilterForm(self.request.GET)
+            self.filter_form.is_valid()
+        return self.filter_form
+
+    def get_keyset_ordering(self):
+        """
+        Результаты поиска упорядочены по сходству, а сортировка по съемкам
+        допускает пустые даты, поэтому такие списки листаются только по номеру страницы
+        """
+        data = self.get_filter_form().cleaned_data
+        if data.get('query') or data.get('sort'):
+            return None
+        return super().get_keyset_ordering()
+    
     def get_queryset(self):
         """
-        Фильтрация клиентов по текущему пользователю и поисковому запросу
+        Фильтрация клиентов по текущему пользователю, поисковому запросу и статистике съемок
         """
         queryset = Client.objects.filter(photographer=self.request.user)
-        
-        # Поиск по запросу
-        query = self.request.GET.get('query')
-        if query:
-            queryset = queryset.filter(
-                Q(first_name__icontains=query) | 
-                Q(last_name__icontains=query) | 
-                Q(email__icontains=query) | 
-                Q(phone_number__icontains=query)
-            )
-            
-        return queryset
+        return self.get_filter_form().filter(queryset)
     
     def get_context_data(self, **kwargs):
         """
-        Добавляем форму поиска в контекст
+        Добавляем форму поиска и фильтров в контекст
         """
         context = super().get_context_data(**kwargs)
-
+        context['filter_form'] = self.get_filter_form()
         return context
 
+class ClientImportView(LoginRequiredMixin, FormView):
+    """
+    Представление для импорта клиентов из файла .csv или .vcf
+    """
+    form_class = ClientImportForm
+    template_name = 'clients/client_import.html'
+    success_url = reverse_lazy('clients:client_list')
+
+    # Сколько ошибок показывать пользователю
+    max_reported_errors = 10
+
+    def form_valid(self, form):
+        """
+        Импортируем клиентов и сообщаем о результате
+        """
+        importer = ClientImporter(self.request.user)
+        try:
+            importer.import_file(form.cleaned_data['file'])
+        except UnicodeDecodeError:
+            form.add_error('file', ENCODING_ERROR)
+            return self.form_invalid(form)
+
+        messages.success(self.request, f'Импортировано клиентов: {importer.created} из {importer.processed}.')
+        if importer.duplicates:
+            messages.info(self.request, f'Пропущено дубликатов: {importer.duplicates}')
+        for line, message in importer.errors[:self.max_reported_errors]:
+            messages.warning(self.request, f'Строка {line}: {message}')
+        if importer.error_count > self.max_reported_errors:
+            messages.warning(self.request, f'И еще ошибок: {importer.error_count - self.max_reported_errors}')
+        return super().form_valid(form)
+
 class ClientDetailView(LoginRequiredMixin, DetailView):
     """
     Представление для отображения деталей клиента
@@ -53,9 +103,9 @@ class ClientDetailView(LoginRequiredMixin, DetailView):
     
     def get_queryset(self):
         """
-        Фильтрация клиентов по текущему пользователю
+        Фильтрация клиентов по текущему пользователю; статистика съемок хранится в самом клиенте
         """
-        return Client.objects.filter(photographer=self.request.user)
+        return Client.objects.filter(photographer=self.request.user).select_related('favorite_studio')
 
 class ClientCreateView(LoginRequiredMixin, CreateView):
     """
@@ -116,4 +166,85 @@ class ClientDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(self.request, 'Клиент успешно удален!')
         return super().delete(request, *args, **kwargs)
 
+class ClientDuplicateListView(LoginRequiredMixin, PaginatedListMixin, ListView):
+    """
+    Предложения объединить возможные дубликаты клиентов, самые похожие первыми
+    """
+    model = ClientDuplicate
+    template_name = 'clients/client_duplicates.html'
+    context_object_name = 'duplicates'
+    keyset_ordering = None
+
+    def get_queryset(self):
+        return ClientDuplicate.objects.filter(
+            photographer=self.request.user, dismissed=False
+        ).select_related('client', 'duplicate').order_by('-score', 'id')
+
+@login_required
+@require_POST
+def client_merge(request, pk):
+    """
+    Объединяет пару из предложения: остается client, а при keep=duplicate - duplicate
+    """
+    suggestion = get_object_or_404(ClientDuplicate, pk=pk, photographer=request.user)
+    target, duplicate = suggestion.client, suggestion.duplicate
+    if request.POST.get('keep') == 'duplicate':
+        target, duplicate = duplicate, target
+    moved = merge_clients(target, [duplicate])
+    messages.success(request, f'Клиенты объединены, перенесено событий: {moved}')
+    return redirect('clients:client_duplicates')
+
+@login_required
+@require_POST
+def client_duplicate_dismiss(request, pk):
+    """
+    Отклоняет предложение: пара больше не предлагается
+    """
+    suggestion = get_object_or_404(ClientDuplicate, pk=pk, photographer=request.user)
+    suggestion.dismissed = True
+    suggestion.save(update_fields=['dismissed'])
+    messages.info(request, 'Предложение отклонено')
+    return redirect('clients:client_duplicates')
+
+@login_required
+def client_autocomplete(request):
+    """
+    Клиенты фотографа для выпадающего списка в форме события: ?q=Ива Пет.
+    Каждое слово должно совпадать с началом имени или фамилии; поиск идет
+    по индексам client_first_name_prefix и client_last_name_prefix
+    """
+    queryset = Client.objects.filter(photographer=request.user)
+    for term in request.GET.get('q', '').split()[:3]:
+        queryset = queryset.filter(Q(first_name__istartswith=term) | Q(last_name__istartswith=term))
+    clients = queryset.order_by('last_name', 'first_name', 'pk').values('pk', 'first_name', 'last_name')
+    return JsonResponse({'results': [
+        {'id': client['pk'], 'text': f"{client['first_name']} {client['last_name']}"}
+        for client in clients[:AUTOCOMPLETE_LIMIT]
+    ]})
+
+@login_required
+def client_export(request):
+    """
+    Выгрузка всех клиентов фотографа: ?format=csv (по умолчанию) или ?format=vcf;
+    ?gzip=1 сжимает файл на лету
+    """
+    queryset = get_export_queryset(request.user)
+    compress = request.GET.get('gzip') == '1'
+    if request.GET.get('format') == 'vcf':
+        return export_response(iter_clients_vcard(queryset), 'clients.vcf', 'text/vcard; charset=utf-8', compress)
+    return export_response(iter_clients_csv(queryset), 'clients.csv', 'text/csv; charset=utf-8', compress)
+
+@login_required
+def upcoming_birthdays_json(request):
+    """
+    Клиенты с днем рождения в ближайшие ?days=30 дней (сегодняшние - первыми)
+    """
+    try:
+        days = int(request.GET.get('days') or BIRTHDAY_DAYS)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректное число дней'}, status=400)
+    if not 0 <= days <= MAX_BIRTHDAY_DAYS:
+        return JsonResponse({'error': f'Число дней должно быть от 0 до {MAX_BIRTHDAY_DAYS}'}, status=400)
+    clients = get_upcoming_birthdays(Client.objects.filter(photographer=request.user), days)
+    return JsonResponse({'results': [serialize_birthday(client) for client in clients]})
 
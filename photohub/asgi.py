@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Живое обновление календаря (calendar:live) работает только под ASGI, например:
+    uvicorn photohub.asgi:application --workers 4
 """
 
 import os
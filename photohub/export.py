@@ -0,0 +1,77 @@
+"""
+Потоковая выгрузка данных в файл (CSV, vCard).
+
+Строки читаются курсором на стороне сервера (iterator(chunk_size=...)) и
+сразу превращаются в текст, который отдается через StreamingHttpResponse
+кусками около BUFFER_SIZE байт. Сжатие gzip (?gzip=1) выполняется на лету
+тем же потоком, поэтому память не растет с числом строк.
+"""
+import csv
+import zlib
+
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Примерный размер куска ответа
+BUFFER_SIZE = 64 * 1024
+
+
+class Echo:
+    """
+    Файлоподобный объект для csv.writer: возвращает строку вместо записи
+    """
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    """
+    Строки CSV; BOM в начале нужен, чтобы Excel открыл файл в UTF-8
+    """
+    writer = csv.writer(Echo())
+    yield '﻿' + writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_buffered(chunks, size=BUFFER_SIZE):
+    """
+    Склеивает короткие строки в куски байтов около size
+    """
+    buffer, length = [], 0
+    for chunk in chunks:
+        data = chunk.encode('utf-8')
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks, level=6):
+    """
+    Сжатие потока байтов в формат gzip
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(chunks, filename, content_type, compress=False):
+    """
+    Ответ-вложение с потоком строк chunks; при compress - файл .gz
+    """
+    body = iter_buffered(chunks)
+    if compress:
+        body = iter_gzip(body)
+        filename += '.gz'
+        content_type = 'application/gzip'
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,183 @@
+"""
+Постраничный вывод списков.
+
+Два режима для одного и того же списка:
+
+- по номеру страницы (?page=N): число строк считается точно только до
+  COUNT_LIMIT (COUNT по подзапросу с LIMIT), дальше берется оценка
+  планировщика из EXPLAIN, поэтому подсчет не читает всю выборку;
+- по курсору (?cursor=...) для бесконечной прокрутки: следующая порция
+  выбирается условием по ключу сортировки (поле, id) от последней строки,
+  а не OFFSET, и стоит одинаково на любой глубине списка.
+
+Курсор следующей порции (next_cursor) выдается в обоих режимах, так что
+прокрутка может начаться с первой страницы.
+"""
+import json
+
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.http import Http404
+from django.utils.functional import cached_property
+
+DEFAULT_PAGE_SIZE = 24
+
+# До скольких строк число результатов считается точно
+COUNT_LIMIT = 1000
+
+CURSOR_SALT = 'photohub.pagination'
+
+
+def estimate_count(queryset):
+    """
+    Оценка числа строк выборки планировщиком PostgreSQL (без выполнения запроса)
+    """
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    def has_next(self):
+        # Число страниц может быть оценкой, поэтому следующая страница проверяется по лишней строке
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator, который не считает точно больше COUNT_LIMIT строк
+    """
+    count_limit = COUNT_LIMIT
+
+    @cached_property
+    def count(self):
+        exact = self.object_list[:self.count_limit + 1].count()
+        if exact <= self.count_limit:
+            return exact
+        return max(estimate_count(self.object_list), exact)
+
+    @cached_property
+    def is_estimated(self):
+        return self.count > self.count_limit
+
+    def validate_number(self, number):
+        if not self.is_estimated:
+            return super().validate_number(number)
+        # Оценка может оказаться меньше настоящего числа строк, поэтому верхняя граница не проверяется
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = EstimatedPage(rows[:self.per_page], number, self)
+        page.has_more = len(rows) > self.per_page
+        return page
+
+
+def get_keyset_ordering(ordering):
+    """
+    Поле, направление и порядок ключа (поле, id): '-created_at' -> ('created_at', True, ('-created_at', '-id'))
+    """
+    field = ordering.lstrip('-')
+    pk = '-id' if ordering.startswith('-') else 'id'
+    return field, ordering.startswith('-'), (ordering, pk)
+
+
+def dump_cursor(obj, ordering):
+    field, _, _ = get_keyset_ordering(ordering)
+    value = obj._meta.get_field(field).value_to_string(obj)
+    return signing.Signer(salt=CURSOR_SALT).sign_object([ordering, value, obj.pk])
+
+
+def load_cursor(cursor, ordering, model):
+    """
+    Ключ (значение поля, id) из курсора или None, если курсор поврежден или от другой сортировки
+    """
+    field, _, _ = get_keyset_ordering(ordering)
+    try:
+        cursor_ordering, value, pk = signing.Signer(salt=CURSOR_SALT).unsign_object(cursor)
+        if cursor_ordering != ordering:
+            return None
+        return model._meta.get_field(field).to_python(value), int(pk)
+    except (signing.BadSignature, ValidationError, TypeError, ValueError):
+        return None
+
+
+def get_keyset_page(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Возвращает (объекты порции, курсор следующей порции или None).
+    Условие по полю сортировки продублировано отдельно, чтобы индекс
+    ограничивал диапазон, а OR по id проверялся только на его границе
+    """
+    field, descending, order_by = get_keyset_ordering(ordering)
+    queryset = queryset.order_by(*order_by)
+    key = load_cursor(cursor, ordering, queryset.model) if cursor else None
+    if key is not None:
+        value, pk = key
+        if descending:
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(id__lt=pk), **{f'{field}__lte': value})
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(id__gt=pk), **{f'{field}__gte': value})
+    objects = list(queryset[:page_size + 1])
+    next_cursor = dump_cursor(objects[page_size - 1], ordering) if len(objects) > page_size else None
+    return objects[:page_size], next_cursor
+
+
+def paginate(request, queryset, ordering=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Страница списка по ?page= или ?cursor=. ordering - поле сортировки
+    списка; None отключает курсоры (например, для результатов,
+    упорядоченных по релевантности). Возвращает словарь для контекста
+    шаблона: paginator, page_obj, is_paginated, object_list, next_cursor
+    """
+    if ordering is not None:
+        queryset = queryset.order_by(*get_keyset_ordering(ordering)[2])
+        cursor = request.GET.get('cursor')
+        if cursor:
+            objects, next_cursor = get_keyset_page(queryset, ordering, cursor, page_size)
+            return {
+                'paginator': None, 'page_obj': None, 'is_paginated': True,
+                'object_list': objects, 'next_cursor': next_cursor,
+            }
+
+    paginator = EstimatedCountPaginator(queryset, page_size)
+    try:
+        page = paginator.page(request.GET.get('page') or 1)
+    except InvalidPage as error:
+        raise Http404(str(error))
+    next_cursor = None
+    if ordering is not None and page.has_next():
+        next_cursor = dump_cursor(page.object_list[-1], ordering)
+    return {
+        'paginator': paginator, 'page_obj': page, 'is_paginated': page.has_other_pages(),
+        'object_list': page.object_list, 'next_cursor': next_cursor,
+    }
+
+
+class PaginatedListMixin:
+    """
+    Постраничный вывод для ListView по номеру страницы и по курсору
+    """
+    paginate_by = DEFAULT_PAGE_SIZE
+    keyset_ordering = '-created_at'
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginate(self.request, queryset, self.get_keyset_ordering(), page_size)
+        self.next_cursor = page['next_cursor']
+        return page['paginator'], page['page_obj'], page['object_list'], page['is_paginated']
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['next_cursor'] = getattr(self, 'next_cursor', None)
+        return context
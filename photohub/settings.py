@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     # Custom apps
     'users',
@@ -54,6 +55,7 @@ INSTALLED_APPS = [
     'references',
     'clients',
     'calendar_app',
+    'sync',
 
     'debug_toolbar'
 ]
@@ -104,6 +106,61 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Лента календаря кэшируется отдельно. По умолчанию используется локальная
+# память процесса (подходит для разработки и тестов). Счетчик поколений,
+# по которому сбрасываются кэш и ETag ленты, должен быть общим для всех
+# процессов сервера, поэтому в production задайте общий бэкенд (иначе
+# проверка calendar_app.W001 предупредит при запуске), например:
+#   CALENDAR_FEED_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#   CALENDAR_FEED_CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CALENDAR_FEED_CACHE_BACKEND = os.getenv(
+    'CALENDAR_FEED_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'calendar_feed': {
+        'BACKEND': CALENDAR_FEED_CACHE_BACKEND,
+        'LOCATION': os.getenv('CALENDAR_FEED_CACHE_LOCATION', 'calendar-feed'),
+        'TIMEOUT': int(os.getenv('CALENDAR_FEED_CACHE_TIMEOUT', 300)),
+    },
+}
+
+# Ограничение размера для локальной памяти; Redis и Memcached вытесняют
+# записи сами согласно своим настройкам maxmemory
+if CALENDAR_FEED_CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['calendar_feed']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CALENDAR_FEED_CACHE_MAX_ENTRIES', 5000)),
+    }
+
+# Живое обновление календаря (Server-Sent Events, требует ASGI-сервер).
+# LocalBroker доставляет сообщения только внутри одного процесса; для
+# нескольких воркеров задайте брокер на Redis (нужен пакет redis):
+#   CALENDAR_LIVE_BACKEND=calendar_app.live.RedisBroker
+#   CALENDAR_LIVE_REDIS_URL=redis://127.0.0.1:6379/2
+CALENDAR_LIVE = {
+    'BACKEND': os.getenv('CALENDAR_LIVE_BACKEND', 'calendar_app.live.LocalBroker'),
+    'OPTIONS': {},
+}
+if CALENDAR_LIVE['BACKEND'].endswith('RedisBroker'):
+    CALENDAR_LIVE['OPTIONS'] = {'url': os.getenv('CALENDAR_LIVE_REDIS_URL', 'redis://127.0.0.1:6379/2')}
+
+# Напоминания о событиях (команда send_reminders) отправляются за столько часов до начала
+CALENDAR_REMINDER_LEAD_HOURS = int(os.getenv('CALENDAR_REMINDER_LEAD_HOURS', 24))
+
+# Письмо фотографу о днях рождения клиентов (та же команда) приходит за столько дней
+# (от 0 до 364, проверка calendar_app.E001)
+CLIENT_BIRTHDAY_REMINDER_DAYS = int(os.getenv('CLIENT_BIRTHDAY_REMINDER_DAYS', 3))
+
+# Дельта-синхронизация: записи об удаленных объектах хранятся столько дней;
+# клиент с более старым курсором получает полную выгрузку заново
+SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 90))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
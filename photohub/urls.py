@@ -26,6 +26,7 @@ urlpatterns = [
     path('studios/', include('studios.urls', namespace='studios')),
     path('references/', include('references.urls', namespace='references')),
     path('calendar/', include('calendar_app.urls', namespace='calendar')),
+    path('sync/', include('sync.urls', namespace='sync')),
     path("__debug__/", include("debug_toolbar.urls")),
 ]
 
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import sync.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('references', '0002_initial'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='referencecategory',
+            name='sync_version',
+            field=models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации'),
+        ),
+        migrations.AddField(
+            model_name='reference',
+            name='sync_version',
+            field=models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации'),
+        ),
+        migrations.AddIndex(
+            model_name='referencecategory',
+            index=models.Index(fields=['photographer', 'sync_version'], name='reference_category_sync'),
+        ),
+        migrations.AddIndex(
+            model_name='reference',
+            index=models.Index(fields=['photographer', 'sync_version'], name='reference_sync'),
+        ),
+    ]
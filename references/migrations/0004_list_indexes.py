@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('references', '0003_sync_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='referencecategory',
+            index=models.Index(fields=['photographer', 'name', 'id'], name='reference_category_name'),
+        ),
+        migrations.AddIndex(
+            model_name='reference',
+            index=models.Index(fields=['photographer', 'created_at', 'id'], name='reference_list'),
+        ),
+        migrations.AddIndex(
+            model_name='reference',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='reference_category_list'),
+        ),
+    ]
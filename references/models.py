@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from users.models import CustomUser
+from sync.fields import sync_version_field
 
 class ReferenceCategory(models.Model):
     """
@@ -15,11 +16,16 @@ class ReferenceCategory(models.Model):
     name = models.CharField(_('название'), max_length=50)
     description = models.TextField(_('описание'), blank=True, max_length=500)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+    sync_version = sync_version_field()
     
     class Meta:
         verbose_name = _('категория референсов')
         verbose_name_plural = _('категории референсов')
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['photographer', 'sync_version'], name='reference_category_sync'),
+            models.Index(fields=['photographer', 'name', 'id'], name='reference_category_name'),
+        ]
         
     def __str__(self):
         return self.name
@@ -47,11 +53,17 @@ class Reference(models.Model):
     description = models.TextField(_('описание'), blank=True, max_length=500)
     source_url = models.URLField(_('источник'), blank=True, max_length=500)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+    sync_version = sync_version_field()
     
     class Meta:
         verbose_name = _('референс')
         verbose_name_plural = _('референсы')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['photographer', 'sync_version'], name='reference_sync'),
+            models.Index(fields=['photographer', 'created_at', 'id'], name='reference_list'),
+            models.Index(fields=['category', 'created_at', 'id'], name='reference_category_list'),
+        ]
         
     def __str__(self):
         return self.title
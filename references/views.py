@@ -6,16 +6,18 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q
 
+from photohub.pagination import PaginatedListMixin, paginate
 from .models import ReferenceCategory, Reference
 from .forms import CategoryForm, ReferenceForm, ReferenceSearchForm
 
-class CategoryListView(LoginRequiredMixin, ListView):
+class CategoryListView(LoginRequiredMixin, PaginatedListMixin, ListView):
     """
     Представление для отображения списка категорий референсов
     """
     model = ReferenceCategory
     template_name = 'references/category_list.html'
     context_object_name = 'categories'
+    keyset_ordering = 'name'
     
     def get_queryset(self):
         """
@@ -83,7 +85,7 @@ class CategoryDeleteView(LoginRequiredMixin, DeleteView):
         messages.success(self.request, 'Категория успешно удалена!')
         return super().delete(request, *args, **kwargs)
 
-class ReferenceListView(LoginRequiredMixin, ListView):
+class ReferenceListView(LoginRequiredMixin, PaginatedListMixin, ListView):
     """
     Представление для отображения списка референсов
     """
@@ -105,7 +107,7 @@ class ReferenceListView(LoginRequiredMixin, ListView):
         context['categories'] = ReferenceCategory.objects.filter(photographer=self.request.user)
         return context
 
-class ReferencesByCategoryView(LoginRequiredMixin, ListView):
+class ReferencesByCategoryView(LoginRequiredMixin, PaginatedListMixin, ListView):
     """
     Представление для отображения референсов по категории
     """
@@ -279,9 +281,11 @@ def reference_search(request):
         if category:
             references = references.filter(category=category)
 
+    page = paginate(request, references, '-created_at')
     return render(request, 'references/reference_search.html', {
         'form': form,
-        'references': references,
+        'references': page['object_list'],
+        **page,
         'categories': ReferenceCategory.objects.filter(photographer=request.user)
     })
 
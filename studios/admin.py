@@ -31,7 +31,7 @@ class StudioAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
-        return qs.filter(is_public=True) | qs.filter(created_by=request.user)
+        return qs.visible_to(request.user)
     
     def save_model(self, request, obj, form, change):
         """
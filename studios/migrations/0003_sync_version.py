@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import sync.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studios', '0002_initial'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studio',
+            name='sync_version',
+            field=models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации'),
+        ),
+        migrations.AddField(
+            model_name='studioimage',
+            name='sync_version',
+            field=models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации'),
+        ),
+        migrations.AddIndex(
+            model_name='studio',
+            index=models.Index(fields=['created_by', 'sync_version'], name='studio_sync'),
+        ),
+        migrations.AddIndex(
+            model_name='studio',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['sync_version'], name='studio_public_sync'),
+        ),
+        migrations.AddIndex(
+            model_name='studioimage',
+            index=models.Index(fields=['studio', 'sync_version'], name='studio_image_sync'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studios', '0004_studio_name_trgm'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studio',
+            index=models.Index(fields=['name', 'id'], name='studio_name'),
+        ),
+    ]
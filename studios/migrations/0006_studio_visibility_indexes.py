@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('studios', '0005_studio_name_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studio',
+            index=models.Index(condition=models.Q(is_public=True), fields=['name', 'id'], name='studio_public'),
+        ),
+        migrations.AddIndex(
+            model_name='studio',
+            index=models.Index(condition=models.Q(is_public=False), fields=['created_by', 'name', 'id'], name='studio_private_owner'),
+        ),
+    ]
@@ -1,6 +1,32 @@
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Upper
 from django.utils.translation import gettext_lazy as _
 from users.models import CustomUser
+from sync.fields import NextSyncVersion, sync_version_field
+
+class StudioQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Публичные студии и студии пользователя одним условием. Вторая ветка условия
+        ограничена непубличными студиями, чтобы каждая ветка OR совпадала с условием
+        своего частичного индекса (studio_public, studio_private_owner)
+        """
+        return self.filter(Q(is_public=True) | Q(is_public=False, created_by=user))
+
+    def with_images(self):
+        """
+        Путь главного изображения (main_image) и число изображений (image_count)
+        подзапросами в том же запросе, без запроса на каждую студию
+        """
+        images = StudioImage.objects.filter(studio=OuterRef('pk'))
+        return self.annotate(
+            main_image=Subquery(images.order_by('-is_main', 'created_at').values('image')[:1]),
+            image_count=Coalesce(
+                Subquery(images.order_by().values('studio').annotate(count=Count('pk')).values('count')), 0
+            ),
+        )
 
 class Studio(models.Model):
     """
@@ -33,11 +59,24 @@ class Studio(models.Model):
     )
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
     updated_at = models.DateTimeField(_('дата обновления'), auto_now=True)
+    sync_version = sync_version_field()
+
+    objects = StudioQuerySet.as_manager()
     
     class Meta:
         verbose_name = _('студия/локация')
         verbose_name_plural = _('студии/локации')
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['created_by', 'sync_version'], name='studio_sync'),
+            models.Index(fields=['sync_version'], condition=models.Q(is_public=True), name='studio_public_sync'),
+            models.Index(fields=['name', 'id'], name='studio_name'),
+            # Ветки условия StudioQuerySet.visible_to
+            models.Index(fields=['name', 'id'], condition=models.Q(is_public=True), name='studio_public'),
+            models.Index(fields=['created_by', 'name', 'id'], condition=models.Q(is_public=False), name='studio_private_owner'),
+            # Поиск по подстроке названия (автодополнение): icontains сравнивает UPPER(name) LIKE '%ЗАПРОС%'
+            GinIndex(OpClass(Upper('name'), name='gin_trgm_ops'), name='studio_name_trgm'),
+        ]
         
     def __str__(self):
         return self.name
@@ -51,6 +90,13 @@ class Studio(models.Model):
         address_parts.append(self.building)
         return ', '.join(address_parts)
 
+    def get_main_image_url(self):
+        """Адрес главного изображения из аннотации with_images()"""
+        main_image = getattr(self, 'main_image', None)
+        if not main_image:
+            return ''
+        return StudioImage._meta.get_field('image').storage.url(main_image)
+
 class StudioImage(models.Model):
     """
     Модель для хранения изображений фотостудий и мест для съемок
@@ -65,11 +111,15 @@ class StudioImage(models.Model):
     caption = models.CharField(_('подпись'), max_length=255, blank=True)
     is_main = models.BooleanField(_('главное изображение'), default=False)
     created_at = models.DateTimeField(_('дата создания'), auto_now_add=True)
+    sync_version = sync_version_field()
     
     class Meta:
         verbose_name = _('изображение студии')
         verbose_name_plural = _('изображения студий')
         ordering = ['-is_main', 'created_at']
+        indexes = [
+            models.Index(fields=['studio', 'sync_version'], name='studio_image_sync'),
+        ]
         
     def __str__(self):
         return f"{self.studio.name} - {self.caption if self.caption else 'Изображение'}"
@@ -77,6 +127,6 @@ class StudioImage(models.Model):
     def save(self, *args, **kwargs):
         """Если изображение отмечено как главное, снимаем этот флаг с других изображений студии"""
         if self.is_main:
-            StudioImage.objects.filter(studio=self.studio, is_main=True).update(is_main=False)
+            StudioImage.objects.filter(studio=self.studio, is_main=True).update(is_main=False, sync_version=NextSyncVersion())
         super().save(*args, **kwargs)
 
@@ -1,3 +1,150 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.test import TestCase, RequestFactory
+from django.urls import reverse
+
+from calendar_app.views import CalendarView
+from .admin import StudioAdmin
+from .models import Studio, StudioImage
+from .views import StudioDetailView, StudioListView, studio_autocomplete, studio_search
+
+User = get_user_model()
+
+
+class StudioVisibilityTest(TestCase):
+    """
+    Тесты выборки доступных пользователю студий и числа запросов страниц студий
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.public = Studio.objects.create(
+            name='Loft', city='Москва', street='Тверская', building='1', is_public=True, created_by=self.other
+        )
+        self.own = Studio.objects.create(
+            name='Белый зал', city='Москва', street='Арбат', building='2', is_public=False, created_by=self.user
+        )
+        self.own_public = Studio.objects.create(
+            name='Парк', city='Москва', street='Садовая', building='3', is_public=True, created_by=self.user,
+            location_type='outdoor',
+        )
+        Studio.objects.create(
+            name='Чужой зал', city='Москва', street='Арбат', building='4', is_public=False, created_by=self.other
+        )
+        for studio in (self.public, self.own, self.own_public):
+            StudioImage.objects.create(studio=studio, image=f'studios/{studio.pk}-1.jpg')
+            StudioImage.objects.create(studio=studio, image=f'studios/{studio.pk}-main.jpg', is_main=True)
+        self.factory = RequestFactory()
+
+    def get_request(self, path, data=None):
+        request = self.factory.get(path, data)
+        request.user = self.user
+        return request
+
+    def test_visible_to(self):
+        """
+        Тест одного условия видимости: публичные студии и свои, без чужих непубличных
+        """
+        studios = Studio.objects.visible_to(self.user)
+        self.assertEqual(list(studios), [self.public, self.own, self.own_public])
+        self.assertEqual(list(Studio.objects.visible_to(self.other).values_list('name', flat=True)), ['Loft', 'Парк', 'Чужой зал'])
+
+    def test_with_images(self):
+        """
+        Тест главного изображения и числа изображений в том же запросе
+        """
+        with self.assertNumQueries(1):
+            studios = list(Studio.objects.visible_to(self.user).with_images())
+            images = [(studio.image_count, studio.get_main_image_url()) for studio in studios]
+        self.assertEqual(images, [
+            (2, f'/media/studios/{self.public.pk}-main.jpg'),
+            (2, f'/media/studios/{self.own.pk}-main.jpg'),
+            (2, f'/media/studios/{self.own_public.pk}-main.jpg'),
+        ])
+        studio = Studio.objects.with_images().get(pk=Studio.objects.create(
+            name='Пустой', city='Москва', street='Арбат', building='5', created_by=self.user
+        ).pk)
+        self.assertEqual((studio.image_count, studio.get_main_image_url()), (0, ''))
+
+    def test_list_view_queries(self):
+        """
+        Тест списка студий: число строк и страница, изображения без запросов на каждую студию
+        """
+        view = StudioListView()
+        view.setup(self.get_request(reverse('studios:studio_list')))
+        view.object_list = view.get_queryset()
+        with self.assertNumQueries(2):
+            context = view.get_context_data()
+            images = [(studio.name, studio.image_count, studio.get_main_image_url()) for studio in context['studios']]
+        self.assertEqual([name for name, _, _ in images], ['Loft', 'Белый зал', 'Парк'])
+        self.assertTrue(all(count == 2 and url.endswith('-main.jpg') for _, count, url in images))
+
+    def test_detail_view_queries(self):
+        """
+        Тест страницы студии: студия и ее изображения, чужая непубличная студия не видна
+        """
+        view = StudioDetailView()
+        view.setup(self.get_request(reverse('studios:studio_detail', kwargs={'pk': self.public.pk})), pk=self.public.pk)
+        with self.assertNumQueries(2):
+            view.object = view.get_object()
+            context = view.get_context_data(object=view.object)
+            images = list(context['images'])
+        self.assertEqual(images[0].image.name, f'studios/{self.public.pk}-main.jpg')
+        self.assertNotIn('occupancy_url', context)
+
+        hidden = Studio.objects.get(name='Чужой зал')
+        self.assertFalse(view.get_queryset().filter(pk=hidden.pk).exists())
+
+    def test_search_view_queries(self):
+        """
+        Тест поиска студий: число строк и страница с изображениями
+        """
+        request = self.get_request(reverse('studios:studio_search'), {'query': 'москва', 'location_type': 'studio'})
+        with mock.patch('studios.views.render', lambda request, template, context: context):
+            with self.assertNumQueries(2):
+                context = studio_search(request)
+                images = [(studio.name, studio.image_count) for studio in context['studios']]
+        self.assertEqual(images, [('Loft', 2), ('Белый зал', 2)])
+
+    def test_autocomplete_queries(self):
+        """
+        Тест автодополнения: один запрос
+        """
+        with self.assertNumQueries(1):
+            response = studio_autocomplete(self.get_request(reverse('studios:studio_autocomplete'), {'q': 'зал'}))
+        self.assertEqual([result['id'] for result in json.loads(response.content)['results']], [self.own.pk])
+
+    def test_calendar_studios_queries(self):
+        """
+        Тест списка студий на странице календаря: один запрос
+        """
+        view = CalendarView()
+        view.setup(self.get_request(reverse('calendar:calendar')))
+        context = view.get_context_data()
+        with self.assertNumQueries(1):
+            studios = list(context['studios'])
+        self.assertEqual(studios, [self.public, self.own, self.own_public])
+
+    def test_admin_queryset(self):
+        """
+        Тест списка студий в админке: обычный пользователь видит доступные студии, администратор - все
+        """
+        admin = StudioAdmin(Studio, AdminSite())
+        request = self.get_request('/admin/studios/studio/')
+        with self.assertNumQueries(1):
+            self.assertEqual(admin.get_queryset(request).count(), 3)
+        request.user = User.objects.create_superuser(username='admin', email='admin@example.com', password='testpassword')
+        self.assertEqual(admin.get_queryset(request).count(), 4)
@@ -7,8 +7,11 @@ urlpatterns = [
     path('', views.StudioListView.as_view(), name='studio_list'),
     path('add/', views.StudioCreateView.as_view(), name='studio_add'),
     path('search/', views.studio_search, name='studio_search'),
+    path('autocomplete/', views.studio_autocomplete, name='studio_autocomplete'),
     path('<int:pk>/', views.StudioDetailView.as_view(), name='studio_detail'),
     path('<int:pk>/edit/', views.StudioUpdateView.as_view(), name='studio_edit'),
+    path('<int:pk>/occupancy/', views.StudioOccupancyView.as_view(), name='studio_occupancy'),
+    path('<int:pk>/occupancy.json', views.studio_occupancy_json, name='studio_occupancy_json'),
     path('<int:pk>/delete/', views.StudioDeleteView.as_view(), name='studio_delete'),
     path('<int:studio_id>/add-image/', views.StudioImageCreateView.as_view(), name='studio_add_image'),
     path('image/<int:pk>/delete/', views.StudioImageDeleteView.as_view(), name='studio_image_delete'),
@@ -4,25 +4,32 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponseRedirect
-from django.db.models import Q
+from django.http import HttpResponseRedirect, JsonResponse
+from django.db.models import Case, Q, Value, When
 
 from .models import Studio, StudioImage
+from photohub.pagination import PaginatedListMixin, paginate
+from calendar_app.occupancy import get_studio_occupancy, parse_period
+from sync.fields import NextSyncVersion
 from .forms import StudioForm, StudioImageForm, StudioSearchForm
 
-class StudioListView(LoginRequiredMixin, ListView):
+# Сколько вариантов возвращает автодополнение
+AUTOCOMPLETE_LIMIT = 20
+
+class StudioListView(LoginRequiredMixin, PaginatedListMixin, ListView):
     """
     Представление для отображения списка студий и мест для съемок
     """
     model = Studio
     template_name = 'studios/studio_list.html'
     context_object_name = 'studios'
+    keyset_ordering = 'name'
     
     def get_queryset(self):
         """
         Показываем публичные студии и студии, созданные пользователем
         """
-        return Studio.objects.filter(is_public=True) | Studio.objects.filter(created_by=self.request.user)
+        return Studio.objects.visible_to(self.request.user).with_images()
     
     def get_context_data(self, **kwargs):
         """
@@ -44,7 +51,7 @@ class StudioDetailView(LoginRequiredMixin, DetailView):
         """
         Показываем публичные студии и студии, созданные пользователем
         """
-        return Studio.objects.filter(is_public=True) | Studio.objects.filter(created_by=self.request.user)
+        return Studio.objects.visible_to(self.request.user)
     
     def get_context_data(self, **kwargs):
         """
@@ -52,6 +59,32 @@ class StudioDetailView(LoginRequiredMixin, DetailView):
         """
         context = super().get_context_data(**kwargs)
         context['images'] = self.object.images.all()
+        # Загрузку студии видит только ее владелец
+        if self.object.created_by_id == self.request.user.pk:
+            context['occupancy_url'] = reverse('studios:studio_occupancy', kwargs={'pk': self.object.pk})
+        return context
+
+class StudioOccupancyView(LoginRequiredMixin, DetailView):
+    """
+    Представление для отображения загрузки студии по дням, неделям и часам недели.
+    Данные страница получает из studio_occupancy_json
+    """
+    model = Studio
+    template_name = 'studios/studio_occupancy.html'
+    context_object_name = 'studio'
+
+    def get_queryset(self):
+        """
+        Загрузку видит только создатель студии
+        """
+        return Studio.objects.filter(created_by=self.request.user)
+
+    def get_context_data(self, **kwargs):
+        """
+        Добавляем адрес данных о загрузке в контекст
+        """
+        context = super().get_context_data(**kwargs)
+        context['occupancy_json_url'] = reverse('studios:studio_occupancy_json', kwargs={'pk': self.object.pk})
         return context
 
 class StudioCreateView(LoginRequiredMixin, CreateView):
@@ -137,7 +170,7 @@ class StudioImageCreateView(LoginRequiredMixin, CreateView):
         Получаем студию и проверяем права доступа
         """
         self.studio = get_object_or_404(Studio, pk=kwargs['studio_id'])
-        if not self.studio.is_public and self.studio.created_by != request.user:
+        if not self.studio.is_public and self.studio.created_by_id != request.user.pk:
             messages.error(request, 'У вас нет прав для добавления изображений к этой студии!')
             return redirect('studios:studio_list')
         return super().dispatch(request, *args, **kwargs)
@@ -197,7 +230,7 @@ def set_main_image(request, pk):
         return redirect('studios:studio_list')
     
     # Снимаем флаг главного изображения со всех изображений студии
-    StudioImage.objects.filter(studio=image.studio).update(is_main=False)
+    StudioImage.objects.filter(studio=image.studio).update(is_main=False, sync_version=NextSyncVersion())
     
     # Устанавливаем текущее изображение как главное
     image.is_main = True
@@ -206,13 +239,33 @@ def set_main_image(request, pk):
     messages.success(request, 'Главное изображение успешно установлено!')
     return redirect('studios:studio_detail', pk=image.studio.pk)
 
+@login_required
+def studio_autocomplete(request):
+    """
+    Доступные студии для выпадающего списка в форме события: ?q=loft.
+    Подстрока ищется по триграммному индексу studio_name_trgm, совпадения
+    с началом названия идут первыми
+    """
+    query = request.GET.get('q', '').strip()
+    studios = Studio.objects.visible_to(request.user)
+    if query:
+        studios = studios.filter(name__icontains=query).alias(
+            prefix_match=Case(When(name__istartswith=query, then=Value(0)), default=Value(1)),
+        ).order_by('prefix_match', 'name', 'pk')
+    else:
+        studios = studios.order_by('name', 'pk')
+    return JsonResponse({'results': [
+        {'id': studio['pk'], 'text': f"{studio['name']}, {studio['city']}"}
+        for studio in studios.values('pk', 'name', 'city')[:AUTOCOMPLETE_LIMIT]
+    ]})
+
 @login_required
 def studio_search(request):
     """
     Представление для поиска студий
     """
     form = StudioSearchForm(request.GET)
-    studios = Studio.objects.filter(is_public=True) | Studio.objects.filter(created_by=request.user)
+    studios = Studio.objects.visible_to(request.user).with_images()
     
     if form.is_valid():
         query = form.cleaned_data.get('query')
@@ -233,8 +286,23 @@ def studio_search(request):
         if city:
             studios = studios.filter(city__icontains=city)
     
+    page = paginate(request, studios, 'name')
     return render(request, 'studios/studio_search.html', {
         'form': form,
-        'studios': studios
+        'studios': page['object_list'],
+        **page,
     })
 
+
+@login_required
+def studio_occupancy_json(request, pk):
+    """
+    Загрузка студии за период ?start=YYYY-MM-DD&end=YYYY-MM-DD (по умолчанию последний год).
+    Данные читаются из сводки StudioOccupancy, а не из событий
+    """
+    studio = get_object_or_404(Studio, pk=pk, created_by=request.user)
+    try:
+        start, end = parse_period(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Некорректный период'}, status=400)
+    return JsonResponse(get_studio_occupancy(studio.pk, start, end))
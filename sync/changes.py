@@ -0,0 +1,136 @@
+"""
+Дельта-синхронизация для мобильных и офлайн-клиентов.
+
+Клиент передает непрозрачный курсор, полученный в прошлый раз, и получает
+только строки с версией больше курсора: измененные объекты каждой модели и
+записи Tombstone об удаленных. Каждая модель читается одним запросом по
+индексу (владелец, sync_version) с ограничением limit + 1, поэтому ответ
+без изменений стоит несколько индексных запросов без чтения строк.
+
+Версии выдаются при записи, а не при фиксации, поэтому ответ ограничен
+версией get_sync_cap(): строки незафиксированных транзакций с меньшими
+версиями появятся позже, и курсор не должен их перешагнуть.
+
+Клиент применяет сначала deleted, затем changed: удаленный объект в
+changed не попадает, а студия, ставшая приватной, приходит в deleted для
+всех и затем в changed для владельца.
+"""
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+from calendar_app.models import Event
+from clients.models import Client
+from references.models import Reference, ReferenceCategory
+from studios.models import Studio, StudioImage
+from .fields import get_sync_cap
+from .models import Tombstone
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+CURSOR_SALT = 'sync.cursor'
+
+SyncSource = namedtuple('SyncSource', ['key', 'model', 'fields', 'visible'])
+
+SYNC_SOURCES = (
+    SyncSource('events', Event, (
+        'id', 'title', 'event_type', 'start_datetime', 'end_datetime', 'is_all_day', 'color',
+        'description', 'client_id', 'studio_id', 'recurrence_rule', 'updated_at', 'sync_version',
+    ), lambda user: Q(photographer=user)),
+    SyncSource('clients', Client, (
+        'id', 'first_name', 'last_name', 'email', 'birth_date', 'phone_number', 'address', 'notes',
+        'updated_at', 'sync_version',
+    ), lambda user: Q(photographer=user)),
+    SyncSource('studios', Studio, (
+        'id', 'name', 'location_type', 'city', 'district', 'street', 'building', 'website',
+        'description', 'is_public', 'created_by_id', 'updated_at', 'sync_version',
+    ), lambda user: Q(created_by=user) | Q(is_public=True)),
+    SyncSource('studio_images', StudioImage, (
+        'id', 'studio_id', 'image', 'caption', 'is_main', 'created_at', 'sync_version',
+    ), lambda user: Q(studio__created_by=user) | Q(studio__is_public=True)),
+    SyncSource('reference_categories', ReferenceCategory, (
+        'id', 'name', 'description', 'created_at', 'sync_version',
+    ), lambda user: Q(photographer=user)),
+    SyncSource('references', Reference, (
+        'id', 'category_id', 'title', 'image', 'description', 'source_url', 'created_at', 'sync_version',
+    ), lambda user: Q(photographer=user)),
+)
+
+SYNC_KEYS = {source.model: source.key for source in SYNC_SOURCES}
+
+
+def record_tombstones(model, object_ids, owner_id):
+    """
+    Записи об удалении объектов одного владельца, удаленных без сигналов, одним INSERT
+    """
+    Tombstone.objects.bulk_create(
+        Tombstone(model=SYNC_KEYS[model], object_id=object_id, owner_id=owner_id) for object_id in object_ids
+    )
+
+
+def dump_cursor(version):
+    return signing.dumps(version, salt=CURSOR_SALT)
+
+
+def load_cursor(cursor):
+    """
+    Версия из курсора или None, если курсор поврежден или старше хранимых записей об удалениях
+    """
+    try:
+        return int(signing.loads(cursor, salt=CURSOR_SALT, max_age=settings.SYNC_TOMBSTONE_DAYS * 24 * 60 * 60))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def serialize_row(source, row):
+    """
+    Пути к файлам заменяются их URL
+    """
+    if 'image' in row:
+        storage = source.model._meta.get_field('image').storage
+        row['image'] = storage.url(row['image']) if row['image'] else None
+    return row
+
+
+def get_changes(user, since=0, limit=DEFAULT_LIMIT):
+    """
+    Изменения и удаления с версией больше since, не больше limit записей.
+    Возвращает словарь с новым курсором, флагом has_more и записями по моделям.
+    Курсор продвигается не дальше версии, до которой все транзакции зафиксированы
+    """
+    cap = get_sync_cap()
+    candidates = []
+    for source in SYNC_SOURCES:
+        rows = source.model.objects.filter(
+            source.visible(user), sync_version__gt=since, sync_version__lte=cap
+        ).order_by('sync_version').values(*source.fields)[:limit + 1]
+        candidates.extend((row['sync_version'], source, row) for row in rows)
+
+    tombstones = Tombstone.objects.filter(
+        Q(owner=user) | Q(owner__isnull=True), sync_version__gt=since, sync_version__lte=cap
+    ).order_by('sync_version').values_list('sync_version', 'model', 'object_id')[:limit + 1]
+    candidates.extend((version, None, (model, object_id)) for version, model, object_id in tombstones)
+
+    candidates.sort(key=lambda candidate: candidate[0])
+    page = candidates[:limit]
+
+    changed = {source.key: [] for source in SYNC_SOURCES}
+    deleted = {source.key: [] for source in SYNC_SOURCES}
+    for version, source, row in page:
+        if source is None:
+            model, object_id = row
+            deleted[model].append(object_id)
+        else:
+            changed[source.key].append(serialize_row(source, row))
+
+    # Неполная страница содержит все видимые изменения до cap
+    has_more = len(candidates) > limit
+    return {
+        'cursor': dump_cursor(page[-1][0] if has_more else max(since, cap)),
+        'has_more': has_more,
+        'changed': changed,
+        'deleted': deleted,
+    }
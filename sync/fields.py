@@ -0,0 +1,80 @@
+"""
+Версия синхронизации.
+
+Каждая синхронизируемая строка хранит sync_version - значение общей для
+всех моделей последовательности PostgreSQL, которое выдается заново при
+каждом сохранении. В отличие от updated_at, версии уникальны и строго
+возрастают, поэтому курсор синхронизации - одно число.
+
+Версия выдается при записи, а видна читателю после фиксации транзакции,
+поэтому транзакция с меньшей версией может зафиксироваться позже чтения
+изменений с большей. Чтобы курсор ее не перешагнул, версии выдаются
+функцией photohub_next_sync_version(): перед первой версией в транзакции
+она берет разделяемую advisory-блокировку с ключом "последняя выданная
+версия" и держит ее до конца транзакции. Все версии транзакции больше
+ключа ее блокировки, поэтому наименьший ключ среди блокировок других
+сеансов ограничивает версии, которые еще могут появиться (get_sync_cap).
+Последовательность должна выдавать версии без кэша по сеансам (CACHE 1).
+"""
+from django.db import connection, models
+from django.utils.translation import gettext_lazy as _
+
+SYNC_SEQUENCE = 'photohub_sync_seq'
+SYNC_VERSION_FUNCTION = 'photohub_next_sync_version'
+
+# Последняя выданная версия (0, пока версий не было)
+LAST_VERSION_SQL = (
+    f'SELECT CASE WHEN is_called THEN last_value ELSE last_value - 1 END FROM {SYNC_SEQUENCE}'
+)
+
+# Флаг транзакции: блокировка уже взята
+SYNC_CLAIM_SETTING = 'photohub.sync_claimed'
+
+CREATE_SYNC_VERSION_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION {SYNC_VERSION_FUNCTION}() RETURNS bigint
+LANGUAGE plpgsql VOLATILE AS $$
+BEGIN
+    IF current_setting('{SYNC_CLAIM_SETTING}', true) IS DISTINCT FROM 'on' THEN
+        PERFORM pg_advisory_xact_lock_shared(({LAST_VERSION_SQL}));
+        PERFORM set_config('{SYNC_CLAIM_SETTING}', 'on', true);
+    END IF;
+    RETURN nextval('{SYNC_SEQUENCE}');
+END
+$$
+"""
+
+DROP_SYNC_VERSION_FUNCTION = f'DROP FUNCTION IF EXISTS {SYNC_VERSION_FUNCTION}()'
+
+# Наименьший ключ advisory-блокировки (bigint) среди транзакций других сеансов
+IN_FLIGHT_VERSION_SQL = """
+SELECT MIN((classid::bigint << 32) | objid::bigint) FROM pg_locks
+WHERE locktype = 'advisory' AND objsubid = 1 AND pid <> pg_backend_pid()
+    AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+"""
+
+
+class NextSyncVersion(models.Func):
+    """
+    Следующая версия синхронизации (nextval() с блокировкой транзакции)
+    """
+    template = f'{SYNC_VERSION_FUNCTION}()'
+    output_field = models.BigIntegerField()
+
+
+def sync_version_field():
+    return models.BigIntegerField(_('версия синхронизации'), db_default=NextSyncVersion(), editable=False)
+
+
+def get_sync_cap():
+    """
+    Наибольшая версия, до которой не осталось незафиксированных транзакций:
+    строки с версией не больше нее уже видны новым запросам, и новых таких
+    версий не появится. Последняя версия читается до блокировок: транзакция,
+    взявшая блокировку позже, получит версию больше нее
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(LAST_VERSION_SQL)
+        last_version = cursor.fetchone()[0]
+        cursor.execute(IN_FLIGHT_VERSION_SQL)
+        in_flight = cursor.fetchone()[0]
+    return last_version if in_flight is None else min(last_version, in_flight)
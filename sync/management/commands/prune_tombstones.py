@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from sync.models import Tombstone
+
+
+class Command(BaseCommand):
+    help = 'Удаление записей об удаленных объектах старше SYNC_TOMBSTONE_DAYS'
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(days=settings.SYNC_TOMBSTONE_DAYS)
+        count, _ = Tombstone.objects.filter(deleted_at__lt=threshold).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {count}'))
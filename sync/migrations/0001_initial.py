@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 19:55
+
+import django.db.models.deletion
+import sync.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            f'CREATE SEQUENCE IF NOT EXISTS {sync.fields.SYNC_SEQUENCE}',
+            f'DROP SEQUENCE IF EXISTS {sync.fields.SYNC_SEQUENCE}',
+        ),
+        # Функция нужна до первого столбца с db_default=NextSyncVersion();
+        # в базах, где миграция уже применена, ее создает 0002
+        migrations.RunSQL(
+            sync.fields.CREATE_SYNC_VERSION_FUNCTION,
+            sync.fields.DROP_SYNC_VERSION_FUNCTION,
+        ),
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50, verbose_name='модель')),
+                ('object_id', models.BigIntegerField(verbose_name='id объекта')),
+                ('sync_version', models.BigIntegerField(db_default=sync.fields.NextSyncVersion(), editable=False, verbose_name='версия синхронизации')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, verbose_name='дата удаления')),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to=settings.AUTH_USER_MODEL, verbose_name='владелец')),
+            ],
+            options={
+                'verbose_name': 'удаленный объект',
+                'verbose_name_plural': 'удаленные объекты',
+                'ordering': ['sync_version'],
+                'indexes': [models.Index(fields=['owner', 'sync_version'], name='tombstone_owner_version'), models.Index(fields=['deleted_at'], name='tombstone_deleted_at')],
+            },
+        ),
+    ]
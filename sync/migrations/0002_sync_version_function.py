@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-19 10:40
+
+import sync.fields
+from django.db import migrations
+
+SYNC_TABLES = (
+    'calendar_app_event',
+    'clients_client',
+    'references_reference',
+    'references_referencecategory',
+    'studios_studio',
+    'studios_studioimage',
+    'sync_tombstone',
+)
+
+
+def set_defaults(default):
+    return ';\n'.join(
+        f'ALTER TABLE {table} ALTER COLUMN sync_version SET DEFAULT {default}' for table in SYNC_TABLES
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calendar_app', '0011_event_sync_version'),
+        ('clients', '0004_sync_version'),
+        ('references', '0003_sync_version'),
+        ('studios', '0003_sync_version'),
+        ('sync', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sync.fields.CREATE_SYNC_VERSION_FUNCTION,
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            set_defaults(f'{sync.fields.SYNC_VERSION_FUNCTION}()'),
+            set_defaults(f"nextval('{sync.fields.SYNC_SEQUENCE}')"),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+from users.models import CustomUser
+
+from .fields import sync_version_field
+
+
+class Tombstone(models.Model):
+    """
+    Запись об удаленном объекте для дельта-синхронизации клиентов.
+    Пустой владелец означает объект, который видели все пользователи (публичная студия)
+    """
+    model = models.CharField(_('модель'), max_length=50)
+    object_id = models.BigIntegerField(_('id объекта'))
+    owner = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='tombstones',
+        verbose_name=_('владелец'),
+        null=True,
+        blank=True
+    )
+    sync_version = sync_version_field()
+    deleted_at = models.DateTimeField(_('дата удаления'), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('удаленный объект')
+        verbose_name_plural = _('удаленные объекты')
+        ordering = ['sync_version']
+        indexes = [
+            models.Index(fields=['owner', 'sync_version'], name='tombstone_owner_version'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
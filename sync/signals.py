@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from calendar_app.models import Event
+from calendar_app.signals import bulk_deleting
+from clients.models import Client
+from references.models import Reference, ReferenceCategory
+from studios.models import Studio, StudioImage
+from .changes import SYNC_KEYS
+from .fields import NextSyncVersion
+from .models import Tombstone
+
+
+def tombstone_owner(sender, instance):
+    """
+    Кому нужно сообщить об удалении: владельцу или всем (None) для публичных студий.
+    Возвращает False, если сообщать некому
+    """
+    if sender is Studio:
+        return None if instance.is_public else instance.created_by_id
+    if sender is StudioImage:
+        studio = Studio.objects.filter(pk=instance.studio_id).values_list('created_by_id', 'is_public').first()
+        if studio is None:
+            return False
+        created_by_id, is_public = studio
+        return None if is_public else created_by_id
+    return instance.photographer_id
+
+
+@receiver(pre_save, sender=Event)
+@receiver(pre_save, sender=Client)
+@receiver(pre_save, sender=Studio)
+@receiver(pre_save, sender=StudioImage)
+@receiver(pre_save, sender=Reference)
+@receiver(pre_save, sender=ReferenceCategory)
+def bump_sync_version(sender, instance, **kwargs):
+    """
+    Выдает измененной строке новую версию; при вставке версию задает значение по умолчанию в базе
+    """
+    if instance.pk and not instance._state.adding:
+        instance.sync_version = NextSyncVersion()
+
+
+@receiver(post_delete, sender=Event)
+@receiver(post_delete, sender=Client)
+@receiver(post_delete, sender=Studio)
+@receiver(post_delete, sender=StudioImage)
+@receiver(post_delete, sender=Reference)
+@receiver(post_delete, sender=ReferenceCategory)
+def record_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Запоминает удаленный объект для дельта-синхронизации.
+    При удалении пользователя его собственные записи не нужны: они удалились бы вместе с ним
+    """
+    if sender is Event and bulk_deleting.get():
+        # Записи создает массовое удаление одним bulk_create (record_tombstones)
+        return
+    owner_id = tombstone_owner(sender, instance)
+    if owner_id is False:
+        return
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if owner_id is not None and origin_model is get_user_model():
+        return
+    Tombstone.objects.create(model=SYNC_KEYS[sender], object_id=instance.pk, owner_id=owner_id)
+
+
+@receiver(pre_save, sender=Studio)
+def studio_visibility_changing(sender, instance, **kwargs):
+    """
+    Студия, ставшая приватной, удаляется у всех остальных пользователей.
+    Запись создается до обновления студии, поэтому у владельца студия
+    снова появится следующей по версии записью
+    """
+    instance._was_public = None
+    if instance.pk:
+        instance._was_public = Studio.objects.filter(pk=instance.pk).values_list('is_public', flat=True).first()
+        if instance._was_public and not instance.is_public:
+            Tombstone.objects.create(model=SYNC_KEYS[Studio], object_id=instance.pk, owner_id=None)
+
+
+@receiver(post_save, sender=Studio)
+def studio_visibility_changed(sender, instance, created, **kwargs):
+    """
+    Изображения студии, ставшей публичной, должны дойти до всех пользователей
+    """
+    if not created and instance._was_public is False and instance.is_public:
+        StudioImage.objects.filter(studio=instance).update(sync_version=NextSyncVersion())
@@ -0,0 +1,166 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from calendar_app.models import Event
+from clients.models import Client
+from studios.models import Studio
+from .changes import dump_cursor, get_changes, load_cursor
+from .fields import LAST_VERSION_SQL
+from .models import Tombstone
+
+User = get_user_model()
+
+
+class DeltaSyncTest(TestCase):
+    """
+    Тесты дельта-синхронизации
+    """
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpassword',
+            is_photographer=True
+        )
+        self.client_model = Client.objects.create(photographer=self.user, first_name='John', last_name='Doe')
+        self.studio = Studio.objects.create(
+            name='Loft',
+            city='Москва',
+            street='Тверская',
+            building='1',
+            is_public=True,
+            created_by=self.user
+        )
+        self.url = reverse('sync:changes')
+        self.client.force_login(self.user)
+
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        return self.client.get(self.url, params).json()
+
+    def test_full_and_delta(self):
+        """
+        Тест полной выгрузки и выгрузки только изменений после курсора
+        """
+        data = self.sync()
+        self.assertEqual([row['id'] for row in data['changed']['clients']], [self.client_model.pk])
+        self.assertEqual([row['id'] for row in data['changed']['studios']], [self.studio.pk])
+        self.assertFalse(data['has_more'])
+        self.assertFalse(data['reset'])
+
+        # Без изменений ответ пустой
+        empty = self.sync(data['cursor'])
+        self.assertEqual(sum(len(rows) for rows in empty['changed'].values()), 0)
+
+        self.client_model.notes = 'VIP'
+        self.client_model.save()
+        delta = self.sync(data['cursor'])
+        self.assertEqual([row['notes'] for row in delta['changed']['clients']], ['VIP'])
+        self.assertEqual(delta['changed']['studios'], [])
+
+    def test_tombstones(self):
+        """
+        Тест передачи удалений только тем, кто видел объект
+        """
+        cursor = self.sync()['cursor']
+        event = Event.objects.create(
+            photographer=self.user,
+            title='Съемка',
+            start_datetime=timezone.now() + timedelta(days=1),
+        )
+        event_id = event.pk
+        event.delete()
+        self.client_model.delete()
+
+        data = self.sync(cursor)
+        self.assertEqual(data['deleted']['events'], [event_id])
+        self.assertEqual(len(data['deleted']['clients']), 1)
+        # Созданное и удаленное после курсора событие приходит только как удаленное
+        self.assertEqual(data['changed']['events'], [])
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.sync(dump_cursor(0))['deleted']['clients'], [])
+
+    def test_studio_made_private(self):
+        """
+        Тест студии, ставшей приватной: у других удаляется, у владельца остается
+        """
+        cursor = dump_cursor(0)
+        self.assertEqual(len(get_changes(self.other, 0)['changed']['studios']), 1)
+        self.studio.is_public = False
+        self.studio.save()
+
+        other = get_changes(self.other, 0)
+        self.assertEqual(other['changed']['studios'], [])
+        self.assertEqual(other['deleted']['studios'], [self.studio.pk])
+
+        owner = self.sync(cursor)
+        self.assertEqual(owner['deleted']['studios'], [self.studio.pk])
+        self.assertEqual([row['id'] for row in owner['changed']['studios']], [self.studio.pk])
+
+    def test_pagination(self):
+        """
+        Тест постраничной выгрузки по курсору
+        """
+        for i in range(5):
+            Client.objects.create(photographer=self.user, first_name=f'Client {i}', last_name='Doe')
+        seen = []
+        data = self.sync(limit=3)
+        seen.extend(row['id'] for rows in data['changed'].values() for row in rows)
+        self.assertTrue(data['has_more'])
+        while data['has_more']:
+            data = self.sync(data['cursor'], limit=3)
+            seen.extend(row['id'] for rows in data['changed'].values() for row in rows)
+        self.assertEqual(len(seen), 7)
+
+    def test_in_flight_transaction(self):
+        """
+        Тест курсора при незафиксированной транзакции другого сеанса: версии
+        после ее блокировки не отдаются, пока она не завершится
+        """
+        cursor = self.sync()['cursor']
+        other = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            # Так же, как photohub_next_sync_version() перед первой версией транзакции
+            with other.cursor() as db:
+                db.execute(LAST_VERSION_SQL)
+                db.execute('SELECT pg_advisory_lock_shared(%s)', [db.fetchone()[0]])
+            self.client_model.notes = 'VIP'
+            self.client_model.save()
+            held = self.sync(cursor)
+            self.assertEqual(held['changed']['clients'], [])
+            self.assertEqual(load_cursor(held['cursor']), load_cursor(cursor))
+        finally:
+            other.close()
+
+        released = self.sync(held['cursor'])
+        self.assertEqual([row['notes'] for row in released['changed']['clients']], ['VIP'])
+
+    def test_bad_cursor(self):
+        """
+        Тест поврежденного курсора: полная выгрузка с флагом reset
+        """
+        data = self.sync('garbage')
+        self.assertTrue(data['reset'])
+        self.assertEqual(len(data['changed']['clients']), 1)
+
+    def test_user_deletion(self):
+        """
+        Тест удаления пользователя вместе с его объектами без записей об удалении
+        """
+        self.client_model.photographer = self.other
+        self.client_model.save()
+        self.other.delete()
+        self.assertFalse(Tombstone.objects.filter(model='clients').exists())
@@ -0,0 +1,26 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+
+from .changes import DEFAULT_LIMIT, MAX_LIMIT, get_changes, load_cursor
+
+
+@login_required
+@never_cache
+def sync_changes(request):
+    """
+    Изменения с прошлой синхронизации: ?cursor=<курсор из прошлого ответа>&limit=500.
+    Без курсора отдается полная выгрузка; пока has_more, клиент запрашивает
+    следующую страницу с новым курсором. reset означает, что курсор устарел
+    и локальные данные нужно заменить полной выгрузкой
+    """
+    since, reset = 0, False
+    if request.GET.get('cursor'):
+        since = load_cursor(request.GET['cursor'])
+        if since is None:
+            since, reset = 0, True
+    try:
+        limit = min(max(int(request.GET.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+    except ValueError:
+        limit = DEFAULT_LIMIT
+    return JsonResponse(dict(get_changes(request.user, since, limit), reset=reset))